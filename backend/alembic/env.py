@@ -11,6 +11,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import Base
 from models import *
 
+# The application's DATABASE_URL wins over the URL in alembic.ini
+if os.getenv("DATABASE_URL"):
+    context.config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
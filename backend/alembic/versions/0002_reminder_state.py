@@ -0,0 +1,33 @@
+"""reminder state and appointment change indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('reminder_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('watermark', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_appointments_created_at'), 'appointments', ['created_at'], unique=False)
+    op.create_index(op.f('ix_appointments_updated_at'), 'appointments', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_appointments_updated_at'), table_name='appointments')
+    op.drop_index(op.f('ix_appointments_created_at'), table_name='appointments')
+    op.drop_table('reminder_state')
@@ -0,0 +1,40 @@
+"""outbound dead letters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 16:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('outbound_dead_letters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=50), nullable=False),
+    sa.Column('customer_id', sa.String(length=255), nullable=False),
+    sa.Column('message_type', sa.String(length=50), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbound_dead_letters_id'), 'outbound_dead_letters', ['id'], unique=False)
+    op.create_index(op.f('ix_outbound_dead_letters_organization_id'), 'outbound_dead_letters', ['organization_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_outbound_dead_letters_organization_id'), table_name='outbound_dead_letters')
+    op.drop_index(op.f('ix_outbound_dead_letters_id'), table_name='outbound_dead_letters')
+    op.drop_table('outbound_dead_letters')
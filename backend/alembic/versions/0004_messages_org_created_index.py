@@ -0,0 +1,24 @@
+"""messages (organization_id, created_at) index for the hot tier
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 17:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messages_organization_id_created_at', 'messages', ['organization_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_organization_id_created_at', table_name='messages')
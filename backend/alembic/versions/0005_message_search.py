@@ -0,0 +1,72 @@
+"""full-text search index over messages.content
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 18:40:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Frozen copies of the DDL in search.py as of this revision
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, organization_id, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, organization_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+    # Index the rows that already exist
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TABLE IF EXISTS messages_fts",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING GIN (content_tsv)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_messages_content_tsv",
+    "ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv",
+]
+
+
+def upgrade() -> None:
+    # FTS5 table and triggers on SQLite, generated tsvector + GIN on Postgres
+    dialect = op.get_bind().dialect.name
+    statements = SQLITE_DDL if dialect == "sqlite" else POSTGRES_DDL if dialect == "postgresql" else []
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    statements = SQLITE_DROP if dialect == "sqlite" else POSTGRES_DROP if dialect == "postgresql" else []
+    for statement in statements:
+        op.execute(statement)
@@ -0,0 +1,50 @@
+"""messages.external_id with a per-tenant, per-channel unique index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# The search triggers from 0005, frozen as of this revision
+SQLITE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, organization_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+]
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('external_id', sa.String(length=255), nullable=True))
+    op.create_index('uq_messages_organization_id_channel_external_id', 'messages',
+                    ['organization_id', 'channel', 'external_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_messages_organization_id_channel_external_id', table_name='messages')
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('external_id')
+    # SQLite's batch mode recreates the table, which drops the search triggers
+    if op.get_bind().dialect.name == "sqlite":
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
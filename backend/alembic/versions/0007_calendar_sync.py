@@ -0,0 +1,53 @@
+"""calendar free/busy mirror and sync state
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 20:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('configurations', sa.Column('calendar_config', sa.JSON(), nullable=True))
+    op.create_table('calendar_busy_intervals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('calendar_id', sa.String(length=255), nullable=False),
+    sa.Column('event_id', sa.String(length=255), nullable=False),
+    sa.Column('start', sa.DateTime(), nullable=False),
+    sa.Column('end', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_calendar_busy_intervals_id'), 'calendar_busy_intervals', ['id'], unique=False)
+    op.create_index('uq_calendar_busy_intervals_event', 'calendar_busy_intervals', ['organization_id', 'calendar_id', 'event_id'], unique=True)
+    op.create_index('ix_calendar_busy_intervals_organization_id_start', 'calendar_busy_intervals', ['organization_id', 'start'], unique=False)
+    op.create_table('calendar_sync_state',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('calendar_id', sa.String(length=255), nullable=False),
+    sa.Column('sync_token', sa.Text(), nullable=True),
+    sa.Column('synced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('full_synced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('organization_id', 'calendar_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('calendar_sync_state')
+    op.drop_index('ix_calendar_busy_intervals_organization_id_start', table_name='calendar_busy_intervals')
+    op.drop_index('uq_calendar_busy_intervals_event', table_name='calendar_busy_intervals')
+    op.drop_index(op.f('ix_calendar_busy_intervals_id'), table_name='calendar_busy_intervals')
+    op.drop_table('calendar_busy_intervals')
+    with op.batch_alter_table('configurations') as batch_op:
+        batch_op.drop_column('calendar_config')
@@ -0,0 +1,24 @@
+"""appointments (organization_id, appointment_date) index for calendar views
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 20:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_appointments_organization_id_appointment_date', 'appointments', ['organization_id', 'appointment_date', 'status', 'service_type_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_organization_id_appointment_date', table_name='appointments')
@@ -0,0 +1,37 @@
+"""metric_sketches for mergeable per-day metric sketches
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 22:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('metric_sketches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=50), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_metric_sketches_organization_id_metric_day_channel', 'metric_sketches', ['organization_id', 'metric', 'day', 'channel'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_metric_sketches_organization_id_metric_day_channel', table_name='metric_sketches')
+    op.drop_table('metric_sketches')
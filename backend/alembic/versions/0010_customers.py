@@ -0,0 +1,61 @@
+"""customers and customer_handles directory, appointments.customer_id
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-20 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('customers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=True),
+    sa.Column('phone', sa.String(length=50), nullable=True),
+    sa.Column('email', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_customers_organization_id_phone', 'customers', ['organization_id', 'phone'], unique=True)
+    op.create_index('uq_customers_organization_id_email', 'customers', ['organization_id', 'email'], unique=True)
+    op.create_table('customer_handles',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=50), nullable=False),
+    sa.Column('handle', sa.String(length=255), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ),
+    sa.PrimaryKeyConstraint('organization_id', 'channel', 'handle')
+    )
+    op.create_index(op.f('ix_customer_handles_customer_id'), 'customer_handles', ['customer_id'], unique=False)
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.add_column(sa.Column('customer_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_appointments_customer_id_customers', 'customers', ['customer_id'], ['id'])
+    op.create_index('ix_appointments_organization_id_customer_id', 'appointments',
+                    ['organization_id', 'customer_id', 'appointment_date'])
+    # Existing rows are linked by `python customers.py --backfill`
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_organization_id_customer_id', table_name='appointments')
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_constraint('fk_appointments_customer_id_customers', type_='foreignkey')
+        batch_op.drop_column('customer_id')
+    op.drop_index(op.f('ix_customer_handles_customer_id'), table_name='customer_handles')
+    op.drop_table('customer_handles')
+    op.drop_index('uq_customers_organization_id_email', table_name='customers')
+    op.drop_index('uq_customers_organization_id_phone', table_name='customers')
+    op.drop_table('customers')
@@ -0,0 +1,42 @@
+"""change_versions table and per-row change_version for conditional GETs
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('change_versions',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('collection', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('reset_version', sa.Integer(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('organization_id', 'collection')
+    )
+    # Rows written before tracking keep version 0; they are in the full list every delta starts from
+    for table in ('documents', 'service_types', 'appointments'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('change_version', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_appointments_organization_id_change_version', 'appointments',
+                    ['organization_id', 'change_version'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_organization_id_change_version', table_name='appointments')
+    for table in ('appointments', 'service_types', 'documents'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('change_version')
+    op.drop_table('change_versions')
@@ -0,0 +1,31 @@
+"""archived_message_keys keeps the external_id of archived messages unique
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-22 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('archived_message_keys',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=50), nullable=False),
+    sa.Column('external_id', sa.String(length=255), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('organization_id', 'channel', 'external_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('archived_message_keys')
@@ -0,0 +1,350 @@
+"""Cold archive tier for old messages.
+
+Messages older than the hot window are moved out of the `messages` table into
+append-only, gzip-compressed NDJSON segments, one per tenant per month:
+
+    {ARCHIVE_DIR}/org_{id}/{YYYY-MM}.ndjson.gz
+    {ARCHIVE_DIR}/org_{id}/index.json    per-month id/time range and channel/day counts
+    {ARCHIVE_DIR}/org_{id}/{YYYY-MM}.customers.json    customer ids with messages that month
+
+Each archive run appends a new gzip member to the month's segment, so segments
+are never rewritten. The index records the segment's committed length
+(`size`): a run that crashed after appending but before saving the index
+leaves a tail that readers ignore and the next run truncates before writing
+the same rows again. The per-month customer lists are kept out of the index,
+which analytics reads on every call (parsed once per change and cached); a
+thread fetch reads them to decompress only months the customer wrote in.
+A list may name a customer whose rows an interrupted run never committed,
+which only costs that fetch a needless read. The external_id keys of archived
+rows move to `archived_message_keys`, so provider retries of them are still
+dropped. Thread fetch, export and analytics read both tiers through the
+functions below.
+
+    python archive.py --keep-months 3
+"""
+import argparse
+import gzip
+import io
+import itertools
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import ArchivedMessageKey, Message
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", 3))
+
+MESSAGE_COLUMNS = [column.name for column in Message.__table__.columns]
+DATETIME_COLUMNS = {column.name for column in Message.__table__.columns
+                    if column.type.python_type is datetime}
+
+def _org_dir(org_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"org_{org_id}")
+
+def _month_start(key: str) -> datetime:
+    return datetime.strptime(key, "%Y-%m")
+
+def _next_month(value: datetime) -> datetime:
+    return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1, day=1)
+
+def _previous_month(value: datetime) -> datetime:
+    return (value.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+def archive_cutoff(now: datetime = None, keep_months: int = KEEP_MONTHS) -> datetime:
+    """Start of the oldest month that stays in the hot table."""
+    cutoff = (now or datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(keep_months - 1):
+        cutoff = _previous_month(cutoff)
+    return cutoff
+
+# org id -> (mtime_ns, size) of index.json and its parsed contents
+_index_cache: Dict[int, Tuple[Tuple[int, int], Dict[str, dict]]] = {}
+
+def _read_index(org_id: int) -> Dict[str, dict]:
+    path = os.path.join(_org_dir(org_id), "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def load_index(org_id: int) -> Dict[str, dict]:
+    """A tenant's index, re-parsed only when the file changed; treat it as read-only."""
+    try:
+        stat = os.stat(os.path.join(_org_dir(org_id), "index.json"))
+    except FileNotFoundError:
+        _index_cache.pop(org_id, None)
+        return {}
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _index_cache.get(org_id)
+    if cached is None or cached[0] != version:
+        cached = _index_cache[org_id] = (version, _read_index(org_id))
+    return cached[1]
+
+def _save_index(org_id: int, index: Dict[str, dict]) -> None:
+    path = os.path.join(_org_dir(org_id), "index.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+def _encode(row) -> str:
+    record = {}
+    for name in MESSAGE_COLUMNS:
+        value = getattr(row, name)
+        record[name] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def _decode(line: str) -> dict:
+    record = json.loads(line)
+    for name in DATETIME_COLUMNS:
+        if record.get(name):
+            record[name] = datetime.fromisoformat(record[name])
+    return record
+
+def _segment_path(org_id: int, month: str) -> str:
+    return os.path.join(_org_dir(org_id), f"{month}.ndjson.gz")
+
+def _customers_path(org_id: int, month: str) -> str:
+    return os.path.join(_org_dir(org_id), f"{month}.customers.json")
+
+def _load_customers(org_id: int, month: str) -> Optional[set]:
+    """Customer ids archived in a month, or None if the month has no list (read it to find out)."""
+    path = _customers_path(org_id, month)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return set(json.load(f))
+
+def _save_customers(org_id: int, month: str, customers: set) -> None:
+    path = _customers_path(org_id, month)
+    with open(path + ".tmp", "w") as f:
+        json.dump(sorted(customers), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+def _committed_size(org_id: int, month: str, entry: dict) -> int:
+    # Indexes written before sizes were recorded cover the whole file
+    if "size" in entry:
+        return entry["size"]
+    path = _segment_path(org_id, month)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+class _CommittedBytes(io.RawIOBase):
+    """The first `size` bytes of a segment, hiding a tail left by an interrupted run."""
+
+    def __init__(self, raw, size: int):
+        self.raw = raw
+        self.left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(min(len(buffer), self.left))
+        buffer[:len(data)] = data
+        self.left -= len(data)
+        return len(data)
+
+# Writing
+def archive_organization_month(db: Session, org_id: int, month: str, batch_size: int = 5000) -> int:
+    """Move one tenant-month from the hot table into its segment; safe to re-run."""
+    os.makedirs(_org_dir(org_id), exist_ok=True)
+    # A private copy: the cached one must not see changes that may never be saved
+    index = _read_index(org_id)
+    entry = index.get(month) or {"count": 0, "min_id": None, "max_id": 0, "min_created_at": None,
+                                 "max_created_at": None, "channels": {}, "days": {}, "size": 0}
+    start = _month_start(month)
+    end = _next_month(start)
+    in_month = (Message.organization_id == org_id, Message.created_at >= start, Message.created_at < end)
+
+    # Rows up to max_id were written by an earlier, possibly interrupted, run
+    rows = db.execute(
+        select(*[getattr(Message, name) for name in MESSAGE_COLUMNS])
+        .where(*in_month, Message.id > entry["max_id"]).order_by(Message.id)
+        .execution_options(yield_per=batch_size)
+    )
+    written = 0
+    first = next(iter(rows), None)
+    if first is not None:
+        committed = _committed_size(org_id, month, entry)
+        customers = _load_customers(org_id, month) or set()
+        # Indexes from before the lists moved out of them
+        customers.update(key for key in entry.pop("customers", {}) if key is not None)
+        with open(_segment_path(org_id, month), "ab") as raw:
+            # Rows past max_id appended by an interrupted run are about to be written again
+            raw.truncate(committed)
+            with gzip.GzipFile(fileobj=raw, mode="ab", compresslevel=6) as segment:
+                for row in itertools.chain([first], rows):
+                    segment.write((_encode(row) + "\n").encode("utf-8"))
+                    created = row.created_at.isoformat() if row.created_at else None
+                    entry["count"] += 1
+                    entry["min_id"] = row.id if entry["min_id"] is None else min(entry["min_id"], row.id)
+                    entry["max_id"] = max(entry["max_id"], row.id)
+                    if created:
+                        entry["min_created_at"] = min(filter(None, [entry["min_created_at"], created]))
+                        entry["max_created_at"] = max(filter(None, [entry["max_created_at"], created]))
+                        entry["days"][created[:10]] = entry["days"].get(created[:10], 0) + 1
+                    entry["channels"][row.channel] = entry["channels"].get(row.channel, 0) + 1
+                    if row.customer_id is not None:
+                        customers.add(row.customer_id)
+                    written += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+            entry["size"] = raw.tell()
+        # Saved before the index, so it covers every committed row
+        _save_customers(org_id, month, customers)
+
+    if written:
+        index[month] = entry
+        _save_index(org_id, index)
+    if entry["max_id"]:
+        archived = (*in_month, Message.id <= entry["max_id"])
+        # The unique key moves with the rows, in the same transaction, so retries still find the original
+        db.execute(insert(ArchivedMessageKey).from_select(
+            ["organization_id", "channel", "external_id", "message_id"],
+            select(Message.organization_id, Message.channel, Message.external_id, Message.id)
+            .where(*archived, Message.external_id.isnot(None))
+        ))
+        db.execute(delete(Message).where(*archived))
+        db.commit()
+    return written
+
+def archive_messages(db: Session, before: datetime) -> int:
+    """Archive every tenant-month that ends on or before `before`."""
+    month = func.strftime("%Y-%m", Message.created_at) if db.bind.dialect.name == "sqlite" \
+        else func.to_char(Message.created_at, "YYYY-MM")
+    pending = db.execute(
+        select(Message.organization_id, month).where(Message.created_at < before).group_by(Message.organization_id, month)
+    ).all()
+    archived = 0
+    for org_id, month_key in pending:
+        if _next_month(_month_start(month_key)) <= before:
+            archived += archive_organization_month(db, org_id, month_key)
+    return archived
+
+# Reading
+def _segments(org_id: int, start: datetime = None, end: datetime = None, newest_first: bool = False) -> List[str]:
+    months = sorted(load_index(org_id), reverse=newest_first)
+    return [
+        month for month in months
+        if (start is None or _next_month(_month_start(month)) > start)
+        and (end is None or _month_start(month) < end)
+    ]
+
+def _read_segment(org_id: int, month: str, entry: dict, newest_first: bool = False) -> Iterator[dict]:
+    with open(_segment_path(org_id, month), "rb") as raw:
+        committed = io.BufferedReader(_CommittedBytes(raw, _committed_size(org_id, month, entry)))
+        with gzip.open(committed, "rt", encoding="utf-8") as segment:
+            records = (_decode(line) for line in segment)
+            if newest_first:
+                records = reversed(list(records))
+            yield from records
+
+def iter_archived_messages(org_id: int, start: datetime = None, end: datetime = None,
+                           newest_first: bool = False) -> Iterator[dict]:
+    index = load_index(org_id)
+    for month in _segments(org_id, start, end, newest_first):
+        for record in _read_segment(org_id, month, index[month], newest_first):
+            created = record.get("created_at")
+            if start is not None and (created is None or created < start):
+                continue
+            if end is not None and created is not None and created >= end:
+                continue
+            yield record
+
+def iter_messages(db: Session, org_id: int, start: datetime = None, end: datetime = None) -> Iterator[dict]:
+    """Every message of a tenant in [start, end), oldest first, across both tiers."""
+    yield from iter_archived_messages(org_id, start, end)
+    criteria = [Message.organization_id == org_id]
+    if start is not None:
+        criteria.append(Message.created_at >= start)
+    if end is not None:
+        criteria.append(Message.created_at < end)
+    rows = db.execute(
+        select(*[getattr(Message, name) for name in MESSAGE_COLUMNS]).where(*criteria)
+        .order_by(Message.created_at, Message.id).execution_options(yield_per=5000)
+    )
+    for row in rows:
+        yield dict(row._mapping)
+
+def get_archived_message(org_id: int, message_id: int) -> Optional[dict]:
+    """An archived message by the id it had in the hot table, or None."""
+    index = load_index(org_id)
+    for month, entry in index.items():
+        if entry["min_id"] is not None and entry["min_id"] <= message_id <= entry["max_id"]:
+            for record in _read_segment(org_id, month, entry):
+                if record["id"] == message_id:
+                    return record
+    return None
+
+def get_customer_thread(db: Session, org_id: int, customer_id: str, limit: int = 100) -> List[dict]:
+    """The newest `limit` messages with a customer, newest first, across both tiers.
+
+    Archived months are read newest first and only while the thread is short;
+    months the index shows no messages for the customer in are skipped.
+    """
+    rows = db.execute(
+        select(*[getattr(Message, name) for name in MESSAGE_COLUMNS])
+        .where(Message.organization_id == org_id, Message.customer_id == customer_id)
+        .order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+    ).all()
+    thread = [dict(row._mapping) for row in rows]
+    index = load_index(org_id) if len(thread) < limit else {}
+    for month in sorted(index, reverse=True):
+        customers = _load_customers(org_id, month)
+        if customers is not None and customer_id not in customers:
+            continue
+        thread.extend(
+            itertools.islice((record for record in _read_segment(org_id, month, index[month], newest_first=True)
+                              if record["customer_id"] == customer_id), limit - len(thread))
+        )
+        if len(thread) >= limit:
+            break
+    return thread
+
+def archived_totals(org_id: Optional[int] = None) -> dict:
+    """Message counts held in the archive, overall and per channel, from the indexes."""
+    if org_id is None:
+        org_ids = [int(name[4:]) for name in os.listdir(ARCHIVE_DIR) if name.startswith("org_")] \
+            if os.path.isdir(ARCHIVE_DIR) else []
+    else:
+        org_ids = [org_id]
+    totals = {"count": 0, "channels": {}}
+    for org in org_ids:
+        for entry in load_index(org).values():
+            totals["count"] += entry["count"]
+            for channel, count in entry["channels"].items():
+                totals["channels"][channel] = totals["channels"].get(channel, 0) + count
+    return totals
+
+def archived_message_count(org_id: int, start: datetime, end: datetime) -> int:
+    """Archived messages of a tenant created on days in [start, end), from the index."""
+    first, last = start.date().isoformat(), end.date().isoformat()
+    index = load_index(org_id)
+    return sum(
+        count
+        for month in _segments(org_id, start, end)
+        for day, count in index[month]["days"].items()
+        if first <= day < last
+    )
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Move old messages to the archive tier")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS,
+                        help="months, including the current one, kept in the hot table")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        cutoff = archive_cutoff(keep_months=args.keep_months)
+        print(f"Archived {archive_messages(db, cutoff)} messages older than {cutoff:%Y-%m-%d}")
+    finally:
+        db.close()
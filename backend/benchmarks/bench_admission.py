@@ -0,0 +1,107 @@
+"""Fairness benchmark for per-tenant admission control.
+
+One abusive tenant keeps many requests in flight while normal tenants send a
+steady trickle. The app behind the middleware shares a fixed pool of slots (a
+stand-in for the worker's DB connections), so without limits the abusive tenant
+starves everyone else.
+
+    python benchmarks/bench_admission.py --seconds 5 --abusive-concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import AdmissionController, TenantAdmissionMiddleware
+
+
+def make_app(pool_size: int, work_seconds: float):
+    pool = asyncio.Semaphore(pool_size)
+
+    async def app(scope, receive, send):
+        async with pool:
+            await asyncio.sleep(work_seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"[]"})
+    return app
+
+
+async def request(app, path):
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    start = time.perf_counter()
+    await app({"type": "http", "path": path, "method": "GET", "headers": []}, receive, send)
+    return status[0], time.perf_counter() - start
+
+
+async def run(limited: bool, args):
+    app = make_app(args.pool, args.work_ms / 1000)
+    controller = AdmissionController()
+    if limited:
+        app = TenantAdmissionMiddleware(app, controller)
+    deadline = time.perf_counter() + args.seconds
+    normal_latencies, normal_status, abusive_status = [], [], []
+
+    async def abusive_loop():
+        while time.perf_counter() < deadline:
+            status, _ = await request(app, "/api/organizations/1/messages")
+            abusive_status.append(status)
+            if status != 200:
+                await asyncio.sleep(0.001)
+
+    async def normal_loop(org_id):
+        while time.perf_counter() < deadline:
+            status, latency = await request(app, f"/api/organizations/{org_id}/messages")
+            normal_status.append(status)
+            if status == 200:
+                normal_latencies.append(latency)
+            await asyncio.sleep(args.think_ms / 1000)
+
+    await asyncio.gather(
+        *[abusive_loop() for _ in range(args.abusive_concurrency)],
+        *[normal_loop(org_id) for org_id in range(2, args.normal_tenants + 2)],
+    )
+    normal_latencies.sort()
+    return {
+        "normal_ok": normal_status.count(200),
+        "normal_total": len(normal_status),
+        "p50": statistics.median(normal_latencies) * 1000 if normal_latencies else float("nan"),
+        "p99": normal_latencies[int(len(normal_latencies) * 0.99) - 1] * 1000 if normal_latencies else float("nan"),
+        "abusive_ok": abusive_status.count(200),
+        "abusive_rejected": len(abusive_status) - abusive_status.count(200),
+        "counters": controller.snapshot().get("1", {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--pool", type=int, default=16, help="shared backend slots")
+    parser.add_argument("--work-ms", type=float, default=5.0)
+    parser.add_argument("--abusive-concurrency", type=int, default=200)
+    parser.add_argument("--normal-tenants", type=int, default=50)
+    parser.add_argument("--think-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'normal ok':>12} {'p50 ms':>8} {'p99 ms':>8} {'abusive ok':>11} {'abusive 429/503':>16}")
+    for limited in (False, True):
+        result = asyncio.run(run(limited, args))
+        print(f"{'limited' if limited else 'open':<10} {result['normal_ok']:>5}/{result['normal_total']:<6} "
+              f"{result['p50']:>8.1f} {result['p99']:>8.1f} {result['abusive_ok']:>11} {result['abusive_rejected']:>16}")
+        if limited:
+            print(f"abusive tenant counters: {result['counters']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Hot-table latency and disk usage before and after archiving old messages.
+
+Seeds two years of messages for a few tenants into a temporary SQLite database,
+times the analytics and recent-message queries, archives everything older than
+the hot window and measures again.
+
+    python benchmarks/bench_archive.py --messages 1000000 --tenants 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'archive_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import insert, text
+
+import archive
+from crud import get_analytics_data, list_organization_messages
+from database import SessionLocal, engine, init_db
+from models import Message, Organization
+from seed_data import INDIAN_MESSAGES
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def db_size(db):
+    db.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return os.path.getsize(engine.url.database)
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(db, org_id):
+    return {
+        "analytics_ms": timed(lambda: get_analytics_data(db, org_id)),
+        "list_messages_ms": timed(lambda: list_organization_messages(db, org_id), repeat=3),
+        "db_mib": db_size(db) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--keep-months", type=int, default=3)
+    args = parser.parse_args()
+
+    init_db()
+    now = datetime.utcnow()
+    db = SessionLocal()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(args.tenants)]
+    db.add_all(orgs)
+    db.commit()
+    batch = []
+    for i in range(args.messages):
+        batch.append({"organization_id": orgs[i % args.tenants].id, "customer_id": str(random.randint(1000, 99999)),
+                      "channel": random.choice(["whatsapp", "telegram"]), "message_type": "text",
+                      "content": random.choice(INDIAN_MESSAGES), "is_from_customer": bool(i % 2),
+                      "response_time": random.uniform(5, 120),
+                      "created_at": now - timedelta(minutes=random.randint(0, 730 * 24 * 60))})
+        if len(batch) == 50_000:
+            db.execute(insert(Message), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Message), batch)
+    db.commit()
+
+    org_id = orgs[0].id
+    before = measure(db, org_id)
+    start = time.perf_counter()
+    moved = archive.archive_messages(db, archive.archive_cutoff(keep_months=args.keep_months))
+    archive_seconds = time.perf_counter() - start
+    after = measure(db, org_id)
+    after["archive_mib"] = dir_size(archive.ARCHIVE_DIR) / 2**20
+    db.close()
+
+    print(f"archived {moved:,} of {args.messages:,} messages in {archive_seconds:.1f}s")
+    print(f"{'':<18} {'before':>10} {'after':>10}")
+    for key in ("analytics_ms", "list_messages_ms", "db_mib"):
+        print(f"{key:<18} {before[key]:>10.1f} {after[key]:>10.1f}")
+    print(f"{'archive_mib':<18} {'':>10} {after['archive_mib']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
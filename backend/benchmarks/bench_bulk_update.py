@@ -0,0 +1,100 @@
+"""Bulk appointment updates against per-row updates.
+
+Seeds a temporary SQLite database with one tenant's appointments (plus other
+tenants as noise), then marks N of them completed: one ORM load-and-commit per
+appointment, per-row ORM updates in a single transaction, and
+crud.bulk_update_appointments by ids and by date window.
+
+    python benchmarks/bench_bulk_update.py --appointments 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bulk_update_bench.db')}")
+
+from sqlalchemy import insert, update
+
+from crud import bulk_update_appointments
+from database import SessionLocal, init_db
+from models import Appointment, Organization, ServiceType
+from schemas import AppointmentBulkUpdate
+
+
+def reset(db, ids):
+    db.execute(update(Appointment).where(Appointment.id.in_(ids)).values(status="confirmed"))
+    db.commit()
+
+
+def per_row_commits(db, org_id, ids):
+    for appointment_id in ids:
+        appointment = db.query(Appointment).filter(
+            Appointment.id == appointment_id, Appointment.organization_id == org_id).first()
+        appointment.status = "completed"
+        db.commit()
+
+
+def per_row_one_transaction(db, org_id, ids):
+    for appointment_id in ids:
+        appointment = db.query(Appointment).filter(
+            Appointment.id == appointment_id, Appointment.organization_id == org_id).first()
+        appointment.status = "completed"
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=10_000)
+    parser.add_argument("--other-tenants", type=int, default=4)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(args.other_tenants + 1)]
+    db.add_all(orgs)
+    db.commit()
+    day = datetime(2030, 1, 7)
+    for org in orgs:
+        service = ServiceType(organization_id=org.id, name="Consultation", duration=30)
+        db.add(service)
+        db.commit()
+        db.execute(insert(Appointment), [
+            {"organization_id": org.id, "service_type_id": service.id, "customer_name": "Bench Customer",
+             "status": "confirmed", "appointment_date": day + timedelta(seconds=random.randint(0, 86399))}
+            for _ in range(args.appointments)
+        ])
+    db.commit()
+    org_id = orgs[0].id
+    ids = [row.id for row in db.query(Appointment.id).filter(Appointment.organization_id == org_id)]
+
+    runs = {
+        "per-row commits": lambda: per_row_commits(db, org_id, ids),
+        "per-row, one txn": lambda: per_row_one_transaction(db, org_id, ids),
+        "bulk by ids": lambda: bulk_update_appointments(db, org_id, AppointmentBulkUpdate(ids=ids, status="completed")),
+        "bulk by window": lambda: bulk_update_appointments(db, org_id, AppointmentBulkUpdate(
+            start=day, end=day + timedelta(days=1), current_status="confirmed", status="completed")),
+    }
+    print(f"marking {len(ids):,} appointments completed")
+    print(f"{'method':<18} {'seconds':>9} {'rows/s':>11}")
+    for name, run in runs.items():
+        reset(db, ids)
+        db.expunge_all()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        done = db.query(Appointment).filter(Appointment.organization_id == org_id,
+                                            Appointment.status == "completed").count()
+        assert done == len(ids), (name, done)
+        print(f"{name:<18} {seconds:>9.3f} {len(ids) / seconds:>11,.0f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
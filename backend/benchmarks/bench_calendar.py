@@ -0,0 +1,122 @@
+"""Free/busy lookup latency and sync cost for large calendars.
+
+Fills a local fake calendar server with thousands of events per organization,
+then measures a full sync, an incremental sync after a small share of events
+change, lookups from the in-memory index, and, as the baseline, answering the
+same lookup by listing events from the provider.
+
+    python benchmarks/bench_calendar.py --events 5000 --tenants 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'calendar_bench.db')}")
+
+from calendar_sync import CalendarSync, HttpCalendarProvider, busy_span
+from database import SessionLocal, init_db
+from fake_providers import FakeCalendarProvider
+from models import Configuration, Organization
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000, help="events per calendar")
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--changed", type=float, default=0.01, help="share of events changed before resync")
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(args.tenants)]
+    db.add_all(orgs)
+    db.commit()
+    org_ids = [org.id for org in orgs]
+    for org_id in org_ids:
+        db.add(Configuration(organization_id=org_id,
+                             calendar_config={"enabled": True, "calendarIds": [f"org{org_id}"]}))
+    db.commit()
+    db.close()
+
+    origin = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    with FakeCalendarProvider(page_size=2500) as fake:
+        events = {}
+        for org_id in org_ids:
+            events[org_id] = []
+            for _ in range(args.events):
+                start = origin + timedelta(minutes=15 * random.randint(0, 4 * 24 * 365))
+                events[org_id].append(fake.add_event(f"org{org_id}", start,
+                                                     start + timedelta(minutes=random.choice([15, 30, 60]))))
+        provider = HttpCalendarProvider(fake.url)
+        sync = CalendarSync(provider)
+
+        full_seconds, _ = timed(sync.sync_all)
+        for org_id in org_ids:
+            for event_id in random.sample(events[org_id], int(args.events * args.changed)):
+                if random.random() < 0.5:
+                    fake.cancel_event(f"org{org_id}", event_id)
+                else:
+                    start = origin + timedelta(minutes=15 * random.randint(0, 4 * 24 * 365))
+                    fake.move_event(f"org{org_id}", event_id, start, start + timedelta(minutes=30))
+        requests_before = fake.requests
+        incremental_seconds, _ = timed(sync.sync_all)
+        incremental_requests = fake.requests - requests_before
+
+        slot_latencies, week_latencies = [], []
+        for _ in range(args.lookups):
+            org_id = random.choice(org_ids)
+            start = origin + timedelta(minutes=15 * random.randint(0, 4 * 24 * 365))
+            elapsed, _ = timed(lambda: sync.is_busy(org_id, start, start + timedelta(minutes=30)))
+            slot_latencies.append(elapsed)
+            elapsed, _ = timed(lambda: sync.free_busy(org_id, start, start + timedelta(days=7)))
+            week_latencies.append(elapsed)
+
+        def provider_lookup(org_id, start, end):
+            page_token, busy = None, False
+            while True:
+                page = provider.list_events({}, f"org{org_id}", page_token=page_token)
+                busy = busy or any((span := busy_span(e)) and span[0] < end and span[1] > start for e in page.events)
+                if not page.next_page_token:
+                    return busy
+                page_token = page.next_page_token
+
+        provider_latencies = []
+        for _ in range(20):
+            org_id = random.choice(org_ids)
+            start = origin + timedelta(minutes=15 * random.randint(0, 4 * 24 * 365))
+            elapsed, _ = timed(lambda: provider_lookup(org_id, start, start + timedelta(minutes=30)))
+            provider_latencies.append(elapsed)
+
+    total = args.events * args.tenants
+    print(f"{args.tenants} calendars x {args.events:,} events")
+    print(f"full sync          {full_seconds:8.2f} s  ({total / full_seconds:,.0f} events/s)")
+    print(f"incremental sync   {incremental_seconds:8.3f} s  ({args.changed:.0%} changed, {incremental_requests} requests)")
+    print(f"{'lookup':<20} {'p50 us':>10} {'p99 us':>10}")
+    for name, samples in (("index is_busy 30m", slot_latencies), ("index free_busy 7d", week_latencies),
+                          ("provider list scan", provider_latencies)):
+        p50, p99 = percentiles(samples)
+        print(f"{name:<20} {p50 * 1e6:>10,.0f} {p99 * 1e6:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Latency of calendar-view appointment queries on tenants with years of bookings.
+
+Seeds a temporary SQLite database, then times day/week detail lists and
+day/week bucket counts with the (organization_id, appointment_date) index,
+without it, and against the old approach of reading the whole history and
+filtering it in the client.
+
+    python benchmarks/bench_calendar_view.py --appointments 1000000 --tenants 5 --years 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'calendar_view_bench.db')}")
+
+from sqlalchemy import insert, text
+
+from crud import appointment_buckets, list_organization_appointments
+from database import SessionLocal, engine, init_db
+from models import Appointment, Organization, ServiceType
+
+STATUSES = ["scheduled", "confirmed", "cancelled", "completed"]
+
+
+def timed(fn, repeat=10):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def seed(db, count, tenants, years):
+    orgs = [Organization(name=f"Tenant {i}") for i in range(tenants)]
+    db.add_all(orgs)
+    db.commit()
+    services = {}
+    for org in orgs:
+        rows = [ServiceType(organization_id=org.id, name=f"Service {i}", duration=30) for i in range(6)]
+        db.add_all(rows)
+        db.commit()
+        services[org.id] = [row.id for row in rows]
+    start = datetime.utcnow() - timedelta(days=365 * years)
+    span_minutes = 365 * years * 24 * 60
+    batch = []
+    for i in range(count):
+        org_id = orgs[i % tenants].id
+        batch.append({"organization_id": org_id, "service_type_id": random.choice(services[org_id]),
+                      "customer_name": "Bench Customer", "status": random.choice(STATUSES),
+                      "appointment_date": start + timedelta(minutes=random.randint(0, span_minutes))})
+        if len(batch) == 50_000:
+            db.execute(insert(Appointment), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Appointment), batch)
+    db.commit()
+    return orgs[0].id
+
+
+def measure(db, org_id, now):
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    return {
+        "day list": timed(lambda: list_organization_appointments(db, org_id, day, day + timedelta(days=1))),
+        "week list": timed(lambda: list_organization_appointments(db, org_id, day, day + timedelta(days=7))),
+        "month by day": timed(lambda: appointment_buckets(db, org_id, day, day + timedelta(days=31))),
+        "year by week": timed(lambda: appointment_buckets(db, org_id, day - timedelta(days=365), day, "week"),
+                              repeat=3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    org_id = seed(db, args.appointments, args.tenants, args.years)
+    now = datetime.utcnow()
+    print(f"{args.appointments:,} appointments over {args.years} years, {args.tenants} tenants")
+
+    indexed = measure(db, org_id, now)
+    db.execute(text("DROP INDEX ix_appointments_organization_id_appointment_date"))
+    db.commit()
+    unindexed = measure(db, org_id, now)
+
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    full_history = timed(lambda: [row for row in list_organization_appointments(db, org_id)
+                                  if day <= row.appointment_date < day + timedelta(days=7)], repeat=3)
+    db.close()
+
+    print(f"{'query':<14} {'indexed ms':>11} {'no index ms':>12}")
+    for name in indexed:
+        print(f"{name:<14} {indexed[name]:>11.2f} {unindexed[name]:>12.2f}")
+    print(f"week view from full history download: {full_history:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
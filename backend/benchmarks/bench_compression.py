@@ -0,0 +1,109 @@
+"""Bytes on the wire and CPU per response for each encoding and format.
+
+Builds payloads shaped like the API's responses (a page of messages, an
+analytics report, a message export) and, for each, reports the encoded size
+and the CPU time per response for identity, gzip at several levels and
+brotli at several qualities (when the `brotli` package is installed), for
+JSON and, when `msgpack` is installed, MessagePack. The level worth running
+is the one after which bytes stop falling much while CPU keeps rising;
+set it with COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY.
+
+    python benchmarks/bench_compression.py --messages 500 --repeat 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import brotli
+from serialization import _isoformat, msgpack
+
+CONTENT = ["Hi, I'd like to book a haircut tomorrow", "Your appointment is confirmed for {} at {}",
+           "Can I move my booking to the evening?", "Thanks!", "What time do you open on Sunday?",
+           "Reminder: you have an appointment at {} tomorrow. Reply C to cancel."]
+
+
+def messages(count, rng):
+    start = datetime(2026, 10, 1, 9)
+    for i in range(count):
+        created = start + timedelta(minutes=7 * i)
+        yield {"id": 100000 + i, "organization_id": 7, "customer_id": f"91{rng.randrange(10**9, 10**10)}",
+               "channel": rng.choice(["whatsapp", "whatsapp", "telegram", "sms"]),
+               "direction": rng.choice(["inbound", "outbound"]),
+               "content": rng.choice(CONTENT).format("Salon Lotus", created.strftime("%H:%M")),
+               "ai_response": None, "status": "delivered", "created_at": created}
+
+
+def analytics(rng):
+    day = datetime(2026, 9, 1)
+    return {"total_messages": 48211, "unique_customers": 3120, "response_rate": 0.974,
+            "buckets": [{"start": (day + timedelta(days=d)).date(), "customers": rng.randrange(50, 400),
+                         "channels": {"whatsapp": rng.randrange(40, 300), "telegram": rng.randrange(0, 60)}}
+                        for d in range(90)],
+            "response_seconds": {"count": 48211, "p50": 41.2, "p90": 388.0, "p99": 2710.5}}
+
+
+def encoders():
+    yield "json", lambda data: json.dumps(data, default=_isoformat, ensure_ascii=False).encode()
+    if msgpack is not None:
+        yield "msgpack", lambda data: msgpack.packb(data, default=_isoformat)
+
+
+def codecs(gzip_levels, brotli_qualities):
+    yield "identity", lambda raw: raw
+    for level in gzip_levels:
+        yield f"gzip-{level}", lambda raw, level=level: zlib.compress(raw, level, wbits=16 + zlib.MAX_WBITS)
+    if brotli is not None:
+        for quality in brotli_qualities:
+            yield f"br-{quality}", lambda raw, quality=quality: brotli.compress(raw, quality=quality)
+
+
+def cpu_ms(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="rows in a list page")
+    parser.add_argument("--export", type=int, default=20000, help="rows in an export")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--gzip-levels", default="1,5,6,9")
+    parser.add_argument("--brotli-qualities", default="1,4,5,11")
+    args = parser.parse_args()
+    rng = random.Random(42)
+    payloads = {"message list": list(messages(args.messages, rng)), "analytics": analytics(rng),
+                "export": list(messages(args.export, rng))}
+    gzip_levels = [int(level) for level in args.gzip_levels.split(",")]
+    brotli_qualities = [int(quality) for quality in args.brotli_qualities.split(",")]
+
+    if brotli is None:
+        print("brotli not installed: gzip only")
+    if msgpack is None:
+        print("msgpack not installed: JSON only")
+    print(f"{'payload':<14} {'format':<8} {'encoding':<9} {'bytes':>10} {'ratio':>7} {'encode ms':>10} "
+          f"{'compress ms':>12}")
+    for name, data in payloads.items():
+        repeat = max(1, args.repeat * args.messages // len(data)) if isinstance(data, list) else args.repeat
+        for fmt, encode in encoders():
+            raw = encode(data)
+            encode_ms = cpu_ms(lambda: encode(data), repeat)
+            for label, compress in codecs(gzip_levels, brotli_qualities):
+                size = len(compress(raw))
+                # Quality 11 is far slower than the rest; a couple of runs is enough
+                runs = min(repeat, 3) if label == "br-11" else repeat
+                compress_ms = cpu_ms(lambda: compress(raw), runs) if label != "identity" else 0.0
+                print(f"{name:<14} {fmt:<8} {label:<9} {size:>10,} {size / len(raw):>7.3f} {encode_ms:>10.2f} "
+                      f"{compress_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Bandwidth and latency of a polling dashboard with and without conditional GETs.
+
+Seeds a tenant with many appointments in a temporary SQLite database, then
+simulates the frontend polling configuration, service types, documents and
+appointments through the full ASGI app. Between polls a writer changes one
+appointment with probability --write-rate. Three clients are compared:
+
+- full: re-downloads everything on every poll, as the frontend did
+- conditional: sends If-None-Match and gets 304 for unchanged collections
+- delta: also passes ?since=<X-Collection-Version> on lists and merges the rows
+
+Bytes are what crossed the wire (headers plus gzip-encoded bodies). Latency is
+per poll of all four URLs. At the end the delta client's merged copy is
+checked against a full download.
+
+    python benchmarks/bench_conditional.py --appointments 5000 --polls 200 --write-rate 0.2
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'conditional_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from fastapi.testclient import TestClient
+
+import crud
+from database import SessionLocal, init_db
+from main import app
+from models import Appointment, Document, Organization, ServiceType
+from schemas import AppointmentBulkUpdate
+from seed_data import INDIAN_CUSTOMERS, create_seed_data
+
+LISTS = ("service-types", "documents", "appointments")
+
+
+def seed(db, appointments):
+    now = datetime.utcnow()
+    org = Organization(name="Busy Clinic")
+    db.add(org)
+    db.flush()
+    services = [ServiceType(organization_id=org.id, name=f"Service {i}", duration=30, price=500.0) for i in range(20)]
+    db.add_all(services)
+    db.add_all(Document(organization_id=org.id, name=f"Policy {i}", type="url", url=f"https://example.com/{i}",
+                        status="processed") for i in range(30))
+    db.flush()
+    db.bulk_insert_mappings(Appointment, [
+        {"organization_id": org.id, "service_type_id": random.choice(services).id, "customer_name": c["name"],
+         "customer_email": c["email"], "customer_phone": c["phone"], "status": "confirmed",
+         "appointment_date": now + timedelta(hours=i), "channel": "whatsapp",
+         "notes": "Prefers morning slots", "created_at": now}
+        for i, c in ((i, random.choice(INDIAN_CUSTOMERS)) for i in range(appointments))
+    ])
+    db.commit()
+    return org.id
+
+
+class Poller:
+    def __init__(self, client, headers, org_id, mode):
+        self.client, self.headers, self.mode = client, headers, mode
+        self.urls = [f"/api/organizations/{org_id}/config"] + [f"/api/organizations/{org_id}/{name}" for name in LISTS]
+        self.etags, self.versions, self.copies = {}, {}, {}
+        self.bytes, self.latencies, self.not_modified = 0, [], 0
+
+    def poll(self):
+        start = time.perf_counter()
+        for url in self.urls:
+            headers, params = dict(self.headers), {}
+            if self.mode != "full" and url in self.etags:
+                headers["If-None-Match"] = self.etags[url]
+            if self.mode == "delta" and url in self.versions:
+                params["since"] = self.versions[url]
+            response = self.client.get(url, headers=headers, params=params)
+            self.bytes += response.num_bytes_downloaded + sum(len(k) + len(v) + 4 for k, v in response.headers.raw)
+            if response.status_code == 304:
+                self.not_modified += 1
+                continue
+            self.etags[url] = response.headers.get("etag")
+            data = response.json()
+            if isinstance(data, list) and "x-delta-since" in response.headers:
+                self.copies[url].update((row["id"], row) for row in data)
+            elif isinstance(data, list):
+                self.copies[url] = {row["id"]: row for row in data}
+            if "x-collection-version" in response.headers:
+                self.versions[url] = int(response.headers["x-collection-version"])
+        self.latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--write-rate", type=float, default=0.2, help="chance of an appointment change per poll")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    init_db()
+    create_seed_data()
+    db = SessionLocal()
+    org_id = seed(db, args.appointments)
+    appointment_ids = [row.id for row in crud.list_organization_appointments(db, org_id)]
+    client = TestClient(app)
+    token = client.post("/api/auth/login", json={"email": "admin@saas.com", "password": "password"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    pollers = [Poller(client, headers, org_id, mode) for mode in ("full", "conditional", "delta")]
+    rng = random.Random(args.seed)
+    writes = 0
+    for _ in range(args.polls):
+        if rng.random() < args.write_rate:
+            crud.bulk_update_appointments(db, org_id, AppointmentBulkUpdate(
+                ids=[rng.choice(appointment_ids)], notes=f"Changed at {datetime.utcnow():%H:%M:%S.%f}"))
+            writes += 1
+        # Same state for every client; order rotated so none always polls a warm cache
+        for poller in rng.sample(pollers, len(pollers)):
+            poller.poll()
+
+    print(f"{args.appointments:,} appointments, {args.polls} polls of {len(pollers[0].urls)} URLs, "
+          f"{writes} appointment changes")
+    print(f"{'client':<12} {'KB/poll':>9} {'vs full':>8} {'p50 ms':>8} {'p99 ms':>8} {'304s':>6}")
+    baseline = pollers[0].bytes
+    for poller in pollers:
+        latencies = sorted(poller.latencies)
+        p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+        print(f"{poller.mode:<12} {poller.bytes / args.polls / 1024:>9.1f} {poller.bytes / baseline:>8.3f} "
+              f"{statistics.median(latencies) * 1000:>8.2f} {p99:>8.2f} {poller.not_modified:>6}")
+
+    fresh = client.get(f"/api/organizations/{org_id}/appointments", headers=headers).json()
+    merged = pollers[2].copies[pollers[2].urls[-1]]
+    assert merged == {row["id"]: row for row in fresh}, "delta client drifted from the server"
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Memory per active booking conversation in the in-process state store.
+
+Fills a ConversationStore with a realistic mix of dialogue states (customer
+ids shaped like WhatsApp numbers and Telegram chat ids, a third of them with
+a picked slot and a name) and reports traced memory per conversation next to
+the store's own estimate, for the slotted records and for the same states
+kept as plain dicts. Also times get/update and writing and reloading a
+snapshot.
+
+    python benchmarks/bench_conversations.py --conversations 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversations import ConversationStore
+
+CHANNELS = ["whatsapp", "whatsapp", "whatsapp", "telegram", "sms"]
+NAMES = ["Asha", "Rahul Verma", "Priya", "Mohammed Irfan", "Sunita Devi", "Karan"]
+
+
+def conversations(count, rng):
+    now = time.time()
+    for i in range(count):
+        channel = rng.choice(CHANNELS)
+        customer_id = 919000000000 + i if channel != "telegram" else 500000000 + i
+        stage = rng.choice(["service", "slot", "slot", "confirm"])
+        changes = {"stage": stage}
+        if stage != "service":
+            changes["service_type_id"] = rng.randrange(1, 400)
+        if stage == "confirm":
+            changes["slot_start"] = int(now) + rng.randrange(3600, 14 * 86400)
+            changes["customer_name"] = rng.choice(NAMES)
+        yield i % 5000 + 1, channel, customer_id, changes
+
+
+def traced(fill):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = fill()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=1_000_000)
+    parser.add_argument("--operations", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = list(conversations(args.conversations, random.Random(args.seed)))
+    n = len(rows)
+
+    def fill_store():
+        store = ConversationStore(ttl=3600, max_bytes=1 << 40, snapshot_path=os.path.join(tempfile.mkdtemp(), "s"))
+        for org_id, channel, customer_id, changes in rows:
+            store.update(org_id, channel, str(customer_id), **changes)
+        return store
+
+    def fill_dicts():
+        states = OrderedDict()
+        for org_id, channel, customer_id, changes in rows:
+            states[(org_id, channel, str(customer_id))] = {"stage": "service", "service_type_id": None,
+                                                      "slot_start": None, "customer_name": None,
+                                                      "updated_at": time.time(), **changes}
+        return states
+
+    # Customer ids are formatted inside the fills, so both layouts pay for their strings
+    store_bytes, store = traced(fill_store)
+    dict_bytes, dicts = traced(fill_dicts)
+    del dicts
+    estimate = store.stats()["estimated_bytes"]
+    print(f"{n:,} conversations")
+    print(f"{'layout':<28} {'MB':>8} {'bytes/conv':>11}")
+    print(f"{'slotted records (traced)':<28} {store_bytes / 2**20:>8.1f} {store_bytes / n:>11.0f}")
+    print(f"{'slotted records (estimate)':<28} {estimate / 2**20:>8.1f} {estimate / n:>11.0f}")
+    print(f"{'dict per conversation':<28} {dict_bytes / 2**20:>8.1f} {dict_bytes / n:>11.0f}")
+
+    rng = random.Random(args.seed + 1)
+    sample = [rows[rng.randrange(n)] for _ in range(args.operations)]
+    for label, op in (("get", lambda r: store.get(r[0], r[1], str(r[2]))),
+                      ("update (stage change)", lambda r: store.update(r[0], r[1], str(r[2]), stage="confirm"))):
+        times = []
+        for row in sample:
+            start = time.perf_counter()
+            op(row)
+            times.append((time.perf_counter() - start) * 1e6)
+        times.sort()
+        print(f"{label:<28} p50 {statistics.median(times):.2f} µs, p99 {times[int(0.99 * (len(times) - 1))]:.2f} µs")
+
+    start = time.perf_counter()
+    written = store.snapshot()
+    write_s = time.perf_counter() - start
+    size = os.path.getsize(store.snapshot_path)
+    restored = ConversationStore(ttl=3600, max_bytes=1 << 40, snapshot_path=store.snapshot_path)
+    start = time.perf_counter()
+    loaded = restored.load_snapshot()
+    load_s = time.perf_counter() - start
+    assert loaded == written == n
+    print(f"snapshot: {size / 2**20:.1f} MB ({size / n:.0f} bytes/conv), write {write_s:.2f} s, load {load_s:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Sender resolution through the customer directory vs scanning appointments.
+
+Seeds a temporary SQLite database with customers who booked under phone
+numbers in mixed formats and who message on WhatsApp, builds the directory
+with the backfill, then times resolving an inbound sender to a customer:
+from the in-process cache (the inbound path), through the unique indexes with
+a cold cache, and the old way of matching the sender's number against the
+tenant's appointment phones. Also times the full "who is this and what have
+they booked" read.
+
+    python benchmarks/bench_customers.py --customers 100000 --tenants 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'customers_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import func, insert, select
+
+from crud import get_customer_detail
+from customers import backfill_customers, customer_cache, find_customer_id, resolve_customer
+from database import SessionLocal, init_db
+from models import Appointment, Customer, CustomerHandle, Message, Organization, ServiceType
+
+FORMATS = ["{0} {1}", "+91 {0} {1}", "0{0}{1}", "{0}-{1}", "+91{0}{1}"]
+
+
+def seed(db, customers, tenants, rng):
+    orgs = [Organization(name=f"Tenant {i}") for i in range(tenants)]
+    db.add_all(orgs)
+    db.commit()
+    services = [ServiceType(organization_id=org.id, name="Consultation", duration=30) for org in orgs]
+    db.add_all(services)
+    db.commit()
+    now = datetime.utcnow()
+    senders = []
+    appointments, messages = [], []
+    for i in range(customers):
+        org, service = orgs[i % tenants], services[i % tenants]
+        number = f"{7000000000 + i * 7:010d}"
+        for _ in range(rng.randint(1, 3)):
+            phone = rng.choice(FORMATS).format(number[:5], number[5:])
+            appointments.append({"organization_id": org.id, "service_type_id": service.id,
+                                 "customer_name": f"Customer {i}", "customer_phone": phone,
+                                 "appointment_date": now + timedelta(days=rng.randrange(-300, 60)),
+                                 "status": "scheduled"})
+        messages.append({"organization_id": org.id, "customer_id": "91" + number, "channel": "whatsapp",
+                         "content": "Namaste", "is_from_customer": True})
+        senders.append((org.id, "91" + number))
+        if len(appointments) >= 50_000:
+            db.execute(insert(Appointment), appointments)
+            db.execute(insert(Message), messages)
+            appointments, messages = [], []
+    if appointments:
+        db.execute(insert(Appointment), appointments)
+        db.execute(insert(Message), messages)
+    db.commit()
+    return [org.id for org in orgs], senders
+
+
+def scan_appointments(db, org_id, sender):
+    """Before the directory: compare the sender's digits with every appointment phone of the tenant."""
+    digits = sender[-10:]
+    for appointment_id, phone in db.execute(select(Appointment.id, Appointment.customer_phone)
+                                            .where(Appointment.organization_id == org_id)):
+        if phone and "".join(c for c in phone if c.isdigit()).endswith(digits):
+            return appointment_id
+    return None
+
+
+def latencies(fn, samples):
+    times = []
+    for org_id, sender in samples:
+        start = time.perf_counter()
+        fn(org_id, sender)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return statistics.median(times), times[int(0.99 * (len(times) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    init_db()
+    db = SessionLocal()
+    org_ids, senders = seed(db, args.customers, args.tenants, rng)
+    appointments = db.execute(select(func.count()).select_from(Appointment)).scalar()
+    print(f"{args.customers:,} customers, {appointments:,} appointments, {args.tenants} tenants")
+
+    start = time.perf_counter()
+    totals = backfill_customers(db, org_ids)
+    rows = db.execute(select(func.count()).select_from(Customer)).scalar()
+    handles = db.execute(select(func.count()).select_from(CustomerHandle)).scalar()
+    print(f"backfill: {rows:,} customers, {handles:,} handles, {totals['appointments']:,} appointments linked "
+          f"in {time.perf_counter() - start:.1f} s")
+    assert rows == args.customers, "every phone format should resolve to one customer"
+
+    samples = [rng.choice(senders) for _ in range(args.lookups)]
+    scan_samples = samples[:max(20, args.lookups // 500)]
+
+    def cold(org_id, sender):
+        customer_cache.clear()
+        return find_customer_id(db, org_id, "whatsapp", sender)
+
+    warm = lambda org_id, sender: resolve_customer(db, org_id, "whatsapp", sender)
+    for org_id, sender in samples:
+        warm(org_id, sender)
+
+    def detail(org_id, sender):
+        return get_customer_detail(db, org_id, find_customer_id(db, org_id, "whatsapp", sender))
+
+    print(f"{'sender resolution':<34} {'p50 µs':>10} {'p99 µs':>10}")
+    for label, fn, sample in (("cache hit (inbound path)", warm, samples),
+                              ("index lookup, cold cache", cold, samples),
+                              ("customer + bookings", detail, samples),
+                              ("scan tenant appointments (before)", lambda o, s: scan_appointments(db, o, s),
+                               scan_samples)):
+        p50, p99 = latencies(fn, sample)
+        print(f"{label:<34} {p50:>10,.1f} {p99:>10,.1f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
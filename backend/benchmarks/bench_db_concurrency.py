@@ -0,0 +1,122 @@
+"""Mixed read/write concurrency benchmark for the SQLite engine profiles.
+
+Runs writer threads inserting messages and reader threads running the
+analytics-style aggregates against the same database file, once with the
+library defaults and once with the tuned "sqlite" profile, and reports
+throughput and "database is locked" errors for each.
+
+    python benchmarks/bench_db_concurrency.py --writers 8 --readers 8 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, build_engine
+from models import Organization, Message
+
+
+def run_profile(profile: str, writers: int, readers: int, seconds: float, seed_rows: int):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_{profile}.db")
+    engine = build_engine(f"sqlite:///{path}", profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        org = Organization(name="Bench Org")
+        db.add(org)
+        db.commit()
+        org_id = org.id
+        db.bulk_insert_mappings(Message, [
+            {"organization_id": org_id, "customer_id": str(i % 500), "channel": "whatsapp",
+             "content": "Namaste, mujhe appointment book karni hai.", "response_time": i % 90}
+            for i in range(seed_rows)
+        ])
+        db.commit()
+
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                for _ in range(20):
+                    db.add(Message(organization_id=org_id, customer_id="w", channel="telegram",
+                                   content="Main thoda late ho jaunga.", response_time=12.5))
+                db.commit()
+                bump("writes")
+            except OperationalError as exc:
+                db.rollback()
+                if "locked" in str(exc):
+                    bump("locked")
+                else:
+                    raise
+            finally:
+                db.close()
+
+    def reader():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                db.query(Message.channel, func.count(Message.id), func.avg(Message.response_time)).filter(
+                    Message.organization_id == org_id
+                ).group_by(Message.channel).all()
+                bump("reads")
+            except OperationalError as exc:
+                if "locked" in str(exc):
+                    bump("locked")
+                else:
+                    raise
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    return {
+        "profile": profile,
+        "write_tx_per_s": counts["writes"] / elapsed,
+        "reads_per_s": counts["reads"] / elapsed,
+        "locked_errors": counts["locked"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed-rows", type=int, default=200_000)
+    parser.add_argument("--profiles", nargs="+", default=["default", "sqlite"])
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'write tx/s':>12} {'reads/s':>10} {'locked':>8}")
+    for profile in args.profiles:
+        result = run_profile(profile, args.writers, args.readers, args.seconds, args.seed_rows)
+        print(f"{result['profile']:<10} {result['write_tx_per_s']:>12.1f} "
+              f"{result['reads_per_s']:>10.1f} {result['locked_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Fan-out of live dashboard events to thousands of SSE subscribers in one worker.
+
+Runs EventHub subscribers as consumer tasks draining hub.stream() on one
+event loop, the way StreamingResponse does, publishes bursts of events and
+measures publish-to-consume latency, deliveries per second and memory per
+subscriber. A share of subscribers read slowly to exercise eviction.
+
+    python benchmarks/bench_events.py --subscribers 5000 --orgs 10 --events 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventHub
+
+
+async def consume(hub, subscription, received, slow_seconds):
+    async for chunk in hub.stream(subscription, heartbeat=5):
+        now = time.perf_counter()
+        for line in chunk.split(b"\n"):
+            if line.startswith(b"id: "):
+                received.append((int(line[4:]), now))
+        if slow_seconds:
+            await asyncio.sleep(slow_seconds)
+
+
+async def run(args):
+    hub = EventHub(max_buffer=args.buffer, max_per_org=args.subscribers)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    received, tasks = [], []
+    for i in range(args.subscribers):
+        subscription = hub.subscribe(i % args.orgs)
+        slow = args.slow_seconds if random.random() < args.slow_share else 0
+        tasks.append(asyncio.create_task(consume(hub, subscription, received, slow)))
+    await asyncio.sleep(0.1)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    published = {}
+    start = time.perf_counter()
+    for i in range(args.events):
+        org_id = i % args.orgs
+        hub.publish(org_id, "message", {"op": "created", "items": [
+            {"id": i, "customer_id": "9876543210", "channel": "whatsapp", "is_from_customer": True}],
+            "counters": {"total_messages": 1, "channel_breakdown": {"whatsapp": 1}}})
+        published[hub._sequence] = time.perf_counter()
+        if i % args.burst == args.burst - 1:
+            await asyncio.sleep(0)
+    publish_seconds = time.perf_counter() - start
+    await asyncio.sleep(1.0)
+    elapsed = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    latencies = sorted(now - published[seq] for seq, now in received if seq in published)
+    return {
+        "stats": hub.stats(),
+        "deliveries": len(latencies),
+        "publish_seconds": publish_seconds,
+        "elapsed": elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan"),
+        "kib_per_subscriber": (rss_after - rss_before) / args.subscribers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--orgs", type=int, default=10)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=10, help="events published between loop yields")
+    parser.add_argument("--buffer", type=int, default=64)
+    parser.add_argument("--slow-share", type=float, default=0.01)
+    parser.add_argument("--slow-seconds", type=float, default=30.0, help="stalled clients")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    stats = result["stats"]
+    print(f"{args.subscribers:,} subscribers over {args.orgs} orgs, {args.events:,} events")
+    print(f"published in {result['publish_seconds']:.2f}s, {result['deliveries']:,} deliveries "
+          f"({result['deliveries'] / result['elapsed']:,.0f}/s)")
+    print(f"latency p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    print(f"evicted {stats['evicted']} slow subscribers; ~{result['kib_per_subscriber']:.1f} KiB RSS per subscriber")
+
+
+if __name__ == "__main__":
+    main()
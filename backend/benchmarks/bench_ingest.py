@@ -0,0 +1,90 @@
+"""Inbound message ingest throughput with retried (duplicate) webhook deliveries.
+
+Replays a stream where a share of deliveries repeat a recent provider message
+id, through crud.create_message against a temporary SQLite database, in three
+modes: no external_id (every retry stored, the old behaviour), unique index
+only (recent-id filter disabled) and unique index plus the recent-id filter.
+
+    python benchmarks/bench_ingest.py --messages 100000 --duplicates 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'ingest_bench.db')}")
+
+import crud
+from database import SessionLocal, init_db
+from dedupe import RecentIdFilter
+from models import Message, Organization
+from schemas import MessageCreate
+from seed_data import INDIAN_MESSAGES
+
+
+def delivery_stream(count, duplicate_share, org_ids, window):
+    """Deliveries where `duplicate_share` of them retry one of the last `window` ids."""
+    recent = []
+    for i in range(count):
+        if recent and random.random() < duplicate_share:
+            yield random.choice(recent)
+            continue
+        message = MessageCreate(organization_id=random.choice(org_ids), customer_id=str(random.randint(1000, 99999)),
+                                channel=random.choice(["whatsapp", "telegram"]),
+                                content=random.choice(INDIAN_MESSAGES), external_id=f"prov-{i}")
+        recent.append(message)
+        if len(recent) > window:
+            recent.pop(0)
+        yield message
+
+
+def run(mode, deliveries, capacity):
+    crud.recent_message_ids = RecentIdFilter(capacity=capacity if mode == "filter" else 0)
+    db = SessionLocal()
+    db.query(Message).delete()
+    db.commit()
+    start = time.perf_counter()
+    for message in deliveries:
+        if mode == "no_external_id":
+            message = message.model_copy(update={"external_id": None})
+        crud.create_message(db, message)
+    seconds = time.perf_counter() - start
+    stored = db.query(Message).count()
+    db.close()
+    return seconds, stored, crud.recent_message_ids.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--retry-window", type=int, default=5000, help="retries repeat one of the last N ids")
+    parser.add_argument("--capacity", type=int, default=200_000)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(args.tenants)]
+    db.add_all(orgs)
+    db.commit()
+    org_ids = [org.id for org in orgs]
+    db.close()
+    deliveries = list(delivery_stream(args.messages, args.duplicates, org_ids, args.retry_window))
+    unique = len({message.external_id for message in deliveries})
+    print(f"{len(deliveries):,} deliveries, {unique:,} unique provider ids")
+
+    print(f"{'mode':<16} {'msgs/s':>10} {'stored':>9} {'memory hits':>12} {'db hits':>8} {'memory hit rate':>16}")
+    for mode in ("no_external_id", "unique_index", "filter"):
+        seconds, stored, stats = run(mode, deliveries, args.capacity)
+        print(f"{mode:<16} {len(deliveries) / seconds:>10,.0f} {stored:>9,} {stats['memory_hits']:>12,} "
+              f"{stats['database_hits']:>8,} {stats['memory_hit_rate']:>16.1%}")
+
+
+if __name__ == "__main__":
+    main()
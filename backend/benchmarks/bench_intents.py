@@ -0,0 +1,168 @@
+"""Keyword intent routing: Aho-Corasick vs per-keyword scans and a regex alternation.
+
+Generates a labelled stream of Hinglish/English inbound messages (a synthetic
+mix: 30% booking, 15% reschedule, 10% cancel, 20% FAQ, 25% that need the
+model), then reports classification throughput with the default keyword table
+and with a large tenant table, the fraction of messages routed without a
+model and how often a routed message got the wrong intent. The baselines find
+the same keywords with `keyword in text` per keyword, or with one compiled
+regex alternation.
+
+    python benchmarks/bench_intents.py --messages 200000 --tenant-keywords 2000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intents import DEFAULT_KEYWORDS, HANDOFF, IntentRouter, KeywordMatcher, normalize
+
+DAYS = ["kal", "parso", "Monday", "Saturday", "aaj shaam", "next week"]
+TIMES = ["10 baje", "subah", "shaam 5 baje", "dopahar", "11:30"]
+TEMPLATES = {
+    "booking": [
+        "Namaste, mujhe appointment book karni hai.", "Kya aap mujhe kal ka slot de sakte hain?",
+        "{day} {time} ka slot milega?", "I want to book a consultation for {day}", "{day} ko appointment chahiye",
+        "Koi slot free hai {day}?", "Doctor se milna hai {day}, time milega?",
+    ],
+    "reschedule": [
+        "Main thoda late ho jaunga.", "Kya appointment {day} ko shift kar sakte hain?",
+        "Please reschedule my appointment to {day}", "Mujhe time change karna hai, {time} chalega?",
+        "Traffic hai, 20 min der se aaunga", "Appointment {day} pe postpone kar do",
+    ],
+    "cancel": [
+        "Mera appointment cancel kar dijiye", "Sorry, {day} nahi aa paunga", "Please cancel my booking for {day}",
+        "Can't come {day}, sorry", "Appointment radd kar dijiye please",
+    ],
+    "faq": [
+        "Aapki fees kitni hai?", "Clinic ka address kya hai?", "Kya aap mujhe prescription bhej sakte hain?",
+        "{day} ko clinic kab khulta hai?", "Parking ki suvidha hai?", "UPI se payment ho jayega?",
+        "Mera blood test report aa gaya?", "Insurance accept karte ho?",
+    ],
+    None: [
+        "Dhanyavaad! Appointment confirm ho gayi.", "Dawai ke baad chakkar aa raha hai",
+        "Mere bete ko bukhar hai, kya karun?", "Hello", "Kya aap Marathi bolte ho?",
+        "Cancel nahi karna, bas yaad dila raha tha", "Doctor se baat karni hai urgent",
+        "Pichli baar ka experience accha nahi tha, complaint karni hai", "Ok thik hai",
+    ],
+}
+MIX = {"booking": 30, "reschedule": 15, "cancel": 10, "faq": 20, None: 25}
+
+
+def corpus(count, rng):
+    labels = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    texts = [rng.choice(TEMPLATES[label]).format(day=rng.choice(DAYS), time=rng.choice(TIMES)) for label in labels]
+    return texts, labels
+
+
+def tenant_table(extra, rng):
+    keywords = {intent: list(words) for intent, words in DEFAULT_KEYWORDS.items()}
+    syllables = ["ka", "ri", "mo", "ta", "shu", "pa", "le", "dhi", "vo", "ne", "gra", "zu"]
+    for i in range(extra):
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        keywords.setdefault(f"custom{i % 20}", []).append(f"{word} {rng.choice(syllables)}{i}")
+    return keywords
+
+
+class SubstringClassifier:
+    """Baseline: test every keyword against the text with `in`."""
+
+    def __init__(self, keywords):
+        self.patterns = [(intent, " " + normalize(word), normalize(word).count(" ") + 1)
+                         for intent, words in keywords.items() for word in words]
+
+    def classify(self, text):
+        text = " " + normalize(text)
+        scores = {}
+        for intent, pattern, weight in self.patterns:
+            if pattern in text:
+                scores[intent] = scores.get(intent, 0) + weight
+        return decide(scores)
+
+
+class RegexClassifier:
+    """Baseline: one alternation of every keyword (non-overlapping matches only)."""
+
+    def __init__(self, keywords):
+        self.lookup = {}
+        for intent, words in keywords.items():
+            for word in words:
+                self.lookup.setdefault(normalize(word), (intent, normalize(word).count(" ") + 1))
+        alternation = "|".join(re.escape(word) for word in sorted(self.lookup, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternation})")
+
+    def classify(self, text):
+        scores = {}
+        for match in dict.fromkeys(self.pattern.findall(normalize(text))):
+            intent, weight = self.lookup[match]
+            scores[intent] = scores.get(intent, 0) + weight
+        return decide(scores)
+
+
+def decide(scores):
+    if not scores or HANDOFF in scores:
+        return None
+    best = max(scores.values())
+    leaders = [intent for intent, score in scores.items() if score == best]
+    return leaders[0] if len(leaders) == 1 else None
+
+
+def throughput(classify, texts):
+    start = time.perf_counter()
+    results = [classify(text) for text in texts]
+    return len(texts) / (time.perf_counter() - start), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--tenant-keywords", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts, labels = corpus(args.messages, rng)
+    baseline_texts = texts[:max(1000, args.messages // 20)]
+    print(f"{args.messages:,} messages, mix {dict((label or 'model', share) for label, share in MIX.items())}")
+
+    print(f"{'table':<24} {'classifier':<22} {'msgs/s':>10} {'µs/msg':>8}")
+    for label, keywords in (("default", DEFAULT_KEYWORDS),
+                            (f"+{args.tenant_keywords:,} tenant keywords", tenant_table(args.tenant_keywords, rng))):
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        compile_ms = (time.perf_counter() - start) * 1000
+        size = sum(len(words) for words in keywords.values())
+        print(f"{label:<24} ({size:,} keywords, {len(matcher.delta):,} states, compiled in {compile_ms:.0f} ms)")
+        for name, classify, sample in (("aho-corasick", lambda text: matcher.classify(text).intent, texts),
+                                       ("regex alternation", RegexClassifier(keywords).classify, baseline_texts),
+                                       ("substring per keyword", SubstringClassifier(keywords).classify,
+                                        baseline_texts)):
+            rate, results = throughput(classify, sample)
+            assert results == [matcher.classify(text).intent for text in sample] or name == "regex alternation"
+            print(f"{'':<24} {name:<22} {rate:>10,.0f} {1e6 / rate:>8.1f}")
+
+    router = IntentRouter(session_factory=None)
+    router._matchers[1] = (router.default_matcher, float("inf"))
+    start = time.perf_counter()
+    matches = []
+    for offset in range(0, len(texts), 500):
+        matches.extend(router.classify_batch(1, texts[offset:offset + 500]))
+    seconds = time.perf_counter() - start
+    print(f"classify_batch of 500: {len(texts) / seconds:,.0f} msgs/s")
+
+    predicted = [match.intent for match in matches]
+    routed = sum(intent is not None for intent in predicted)
+    wrong = sum(intent is not None and intent != label for intent, label in zip(predicted, labels))
+    handled = Counter(intent for intent in predicted if intent is not None)
+    print(f"routed without a model: {routed / len(texts):.1%} (of a possible {1 - MIX[None] / 100:.0%}), "
+          f"wrong intent: {wrong / max(routed, 1):.2%} of routed")
+    print("by intent: " + ", ".join(f"{intent} {count / len(texts):.1%}" for intent, count in handled.most_common()))
+
+
+if __name__ == "__main__":
+    main()
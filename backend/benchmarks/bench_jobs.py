@@ -0,0 +1,101 @@
+"""Job queue throughput: jobs/second and queue wait with many workers.
+
+Seeds a temporary SQLite database with jobs spread over tenants, then drains
+it with pools of worker processes x threads and reports jobs/second and the
+wait from due to claimed. `--work-ms` makes each job sleep like an I/O-bound
+handler (provider call, file write); with 0 the numbers are the queue's own
+overhead: claim, run and acknowledge transactions per job.
+
+    python benchmarks/bench_jobs.py --jobs 5000 --tenants 50 --work-ms 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'jobs_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import delete, func, insert, select
+
+import jobs
+from database import SessionLocal, init_db
+from models import Job, Organization
+from sketches import DDSketch
+
+WORK_SECONDS = 0.0
+
+
+@jobs.job_handler("bench.work")
+def work(db, job):
+    if WORK_SECONDS:
+        time.sleep(WORK_SECONDS)
+
+
+def seed(db, count, org_ids):
+    db.execute(delete(Job))
+    now = datetime.utcnow()
+    db.execute(insert(Job), [{"kind": "bench.work", "organization_id": org_ids[i % len(org_ids)], "payload": {"n": i},
+                              "priority": 100, "status": "queued", "run_at": now, "attempts": 0,
+                              "max_attempts": 5, "created_at": now} for i in range(count)])
+    db.commit()
+
+
+def drain(db, processes, threads, batch_size, tenant_concurrency):
+    options = {"batch_size": batch_size, "poll_interval": 0.01, "tenant_concurrency": tenant_concurrency}
+    start = time.perf_counter()
+    children = [multiprocessing.Process(target=jobs._serve, args=(threads, options)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    while db.execute(select(func.count()).where(Job.status != jobs.DONE)).scalar():
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    for child in children:
+        child.terminate()
+        child.join()
+    waits = DDSketch()
+    for started, run_at in db.execute(select(Job.started_at, Job.run_at)):
+        waits.add(max((started - run_at).total_seconds(), 0.0))
+    return seconds, waits
+
+
+def main():
+    global WORK_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--work-ms", type=float, default=5.0)
+    parser.add_argument("--tenant-concurrency", type=int, default=jobs.TENANT_CONCURRENCY)
+    parser.add_argument("--pools", default="1x1,1x8,2x8,4x8", help="processes x threads to compare")
+    parser.add_argument("--batch-sizes", default="1,10")
+    args = parser.parse_args()
+    WORK_SECONDS = args.work_ms / 1000
+
+    init_db()
+    db = SessionLocal()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(args.tenants)]
+    db.add_all(orgs)
+    db.commit()
+    org_ids = [org.id for org in orgs]
+
+    print(f"{args.jobs:,} jobs over {args.tenants} tenants, {args.work_ms:g} ms of work each, "
+          f"tenant cap {args.tenant_concurrency or 'none'}, {os.cpu_count()} CPUs")
+    print(f"{'processes x threads':<20} {'batch':>5} {'jobs/s':>9} {'wait p50 s':>11} {'wait p99 s':>11}")
+    for pool in args.pools.split(","):
+        processes, threads = (int(part) for part in pool.split("x"))
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            seed(db, args.jobs, org_ids)
+            seconds, waits = drain(db, processes, threads, batch_size, args.tenant_concurrency)
+            print(f"{pool:<20} {batch_size:>5} {args.jobs / seconds:>9,.0f} {waits.quantile(0.5):>11.2f} "
+                  f"{waits.quantile(0.99):>11.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
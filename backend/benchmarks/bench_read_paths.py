@@ -0,0 +1,97 @@
+"""ORM entity reads vs column-projected row reads for the large list endpoints.
+
+Seeds a single large tenant in a temporary SQLite database, then compares
+crud.get_organization_* (full ORM entities) with crud.list_organization_*
+(projected rows) on latency, peak traced memory and live allocated blocks,
+and checks both encode to the same JSON.
+
+    python benchmarks/bench_read_paths.py --rows 100000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from database import Base, build_engine
+from models import Appointment, Message, Organization, ServiceType
+from schemas import AppointmentResponse, MessageResponse
+from seed_data import INDIAN_CUSTOMERS, INDIAN_MESSAGES
+from serialization import encode_list
+
+
+def seed(Session, rows):
+    now = datetime.utcnow()
+    with Session() as db:
+        org = Organization(name="Large Tenant")
+        db.add(org)
+        db.flush()
+        service = ServiceType(organization_id=org.id, name="Consultation", duration=30, price=500.0)
+        db.add(service)
+        db.flush()
+        db.bulk_insert_mappings(Message, [
+            {"organization_id": org.id, "customer_id": str(1000 + i % 5000), "channel": random.choice(["whatsapp", "telegram"]),
+             "content": random.choice(INDIAN_MESSAGES) * 3, "is_from_customer": bool(i % 2),
+             "response_time": random.uniform(10, 120), "created_at": now - timedelta(minutes=i)}
+            for i in range(rows)
+        ])
+        db.bulk_insert_mappings(Appointment, [
+            {"organization_id": org.id, "service_type_id": service.id, "customer_name": c["name"],
+             "customer_email": c["email"], "customer_phone": c["phone"], "status": "confirmed",
+             "appointment_date": now + timedelta(hours=i), "channel": "whatsapp",
+             "notes": "Patient prefers morning slots; bring previous reports.", "created_at": now}
+            for i, c in ((i, random.choice(INDIAN_CUSTOMERS)) for i in range(rows))
+        ])
+        db.commit()
+        return org.id
+
+
+def measure(Session, fn, org_id):
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with Session() as db:
+        result = fn(db, org_id)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks = sys.getallocatedblocks() - blocks_before
+        return elapsed, peak, blocks, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = build_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reads.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    org_id = seed(Session, args.rows)
+
+    print(f"{'path':<28} {'ms':>9} {'peak MiB':>9} {'live blocks':>12}")
+    for label, schema, orm_fn, row_fn in [
+        ("messages", MessageResponse, crud.get_organization_messages, crud.list_organization_messages),
+        ("appointments", AppointmentResponse, crud.get_organization_appointments, crud.list_organization_appointments),
+    ]:
+        encoded = []
+        for kind, fn in [("orm", orm_fn), ("rows", row_fn)]:
+            elapsed, peak, blocks, result = measure(Session, fn, org_id)
+            encoded.append(encode_list(schema, result))
+            print(f"{label + ' ' + kind:<28} {elapsed * 1000:>9.1f} {peak / 2**20:>9.1f} {blocks:>12}")
+            del result
+        print(f"{label} JSON identical: {encoded[0] == encoded[1]}")
+
+
+if __name__ == "__main__":
+    main()
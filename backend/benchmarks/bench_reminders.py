@@ -0,0 +1,67 @@
+"""Reminder scheduler throughput at a large number of pending reminders.
+
+Schedules N reminders spread over the next 30 days, reschedules and cancels a
+share of them, then dispatches everything through a no-op sender.
+
+    python benchmarks/bench_reminders.py --pending 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import LocalStubSender, ReminderScheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pending", type=int, default=1_000_000)
+    parser.add_argument("--churn", type=float, default=0.1, help="share rescheduled and share cancelled")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    scheduler = ReminderScheduler(sender=LocalStubSender(keep=False), batch_size=args.batch_size)
+    scheduler.watermark = time.time()
+    now = datetime.now()
+    appointments = [
+        SimpleNamespace(id=i, organization_id=i % 1000, status="scheduled", customer_name="Rohit Patil",
+                        customer_phone="9876543210", channel="whatsapp",
+                        appointment_date=now + timedelta(minutes=random.randint(120, 30 * 24 * 60)))
+        for i in range(args.pending)
+    ]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for appointment in appointments:
+        scheduler.track_appointment(appointment)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"schedule:   {args.pending / elapsed:>12,.0f} reminders/s  "
+          f"({memory / args.pending:.0f} bytes/reminder)")
+
+    churn = random.sample(appointments, int(args.pending * args.churn * 2))
+    half = len(churn) // 2
+    start = time.perf_counter()
+    for appointment in churn[:half]:
+        appointment.appointment_date += timedelta(hours=3)
+        scheduler.track_appointment(appointment)
+    for appointment in churn[half:]:
+        scheduler.cancel(appointment.id)
+    elapsed = time.perf_counter() - start
+    print(f"churn:      {len(churn) / elapsed:>12,.0f} updates/s")
+
+    start = time.perf_counter()
+    sent = scheduler.dispatch_due(time.time() + 40 * 24 * 3600, persist=False)
+    elapsed = time.perf_counter() - start
+    print(f"dispatch:   {sent / elapsed:>12,.0f} reminders/s  ({sent:,} sent in batches of {args.batch_size})")
+
+
+if __name__ == "__main__":
+    main()
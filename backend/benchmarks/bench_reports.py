@@ -0,0 +1,106 @@
+"""Nightly platform report: process-pool batch build vs get_analytics_data per tenant.
+
+Seeds a temporary SQLite database with many tenants and one day of messages
+and appointments. Times the old approach, calling get_analytics_data for
+every tenant (measured on a sample and extrapolated), and reports.py with 1,
+2, 4, ... worker processes up to --max-workers. Speedup beyond one worker
+needs that many idle cores; the machine's core count is printed first.
+
+    python benchmarks/bench_reports.py --tenants 2000 --messages 1000000 --max-workers 8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'reports_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import insert, select
+
+from crud import get_analytics_data
+from database import SessionLocal, init_db
+from models import Appointment, Message, Organization, ServiceType
+from reports import generate_report
+
+CHANNELS = ["whatsapp", "telegram", "web", "sms"]
+STATUSES = ["scheduled", "confirmed", "cancelled", "completed"]
+
+
+def seed(db, tenants, messages, appointments, start, rng):
+    db.execute(insert(Organization), [{"name": f"Tenant {i}"} for i in range(tenants)])
+    org_ids = list(db.execute(select(Organization.id)).scalars())
+    db.execute(insert(ServiceType), [{"organization_id": org_id, "name": f"Service {i}", "duration": 30,
+                                      "price": 500.0 + 250 * i} for org_id in org_ids for i in range(3)])
+    services = {}
+    for service_id, org_id in db.execute(select(ServiceType.id, ServiceType.organization_id)):
+        services.setdefault(org_id, []).append(service_id)
+    batch = []
+    for i in range(messages):
+        batch.append({"organization_id": rng.choice(org_ids), "customer_id": f"c{rng.randrange(20_000)}",
+                      "channel": rng.choice(CHANNELS), "content": "Bench message",
+                      "is_from_customer": i % 2 == 0, "response_time": rng.lognormvariate(2.5, 1.0),
+                      "created_at": start + timedelta(seconds=rng.randrange(86400))})
+        if len(batch) == 50_000:
+            db.execute(insert(Message), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Message), batch)
+    rows = []
+    for _ in range(appointments):
+        org_id = rng.choice(org_ids)
+        rows.append({"organization_id": org_id, "service_type_id": rng.choice(services[org_id]),
+                     "customer_name": "Bench Customer", "status": rng.choice(STATUSES),
+                     "appointment_date": start + timedelta(seconds=rng.randrange(86400)),
+                     "created_at": start + timedelta(seconds=rng.randrange(86400))})
+    db.execute(insert(Appointment), rows)
+    db.commit()
+    return org_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--appointments", type=int, default=100_000)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--sample", type=int, default=20, help="tenants timed with get_analytics_data")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    init_db()
+    end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    start = end - timedelta(days=1)
+    db = SessionLocal()
+    org_ids = seed(db, args.tenants, args.messages, args.appointments, start, rng)
+    print(f"{args.tenants:,} tenants, {args.messages:,} messages and {args.appointments:,} appointments in a day; "
+          f"{os.cpu_count()} cores")
+
+    began = time.perf_counter()
+    for org_id in org_ids[:args.sample]:
+        get_analytics_data(db, org_id)
+    loop_seconds = (time.perf_counter() - began) / args.sample * len(org_ids)
+    db.close()
+    print(f"get_analytics_data loop (extrapolated from {args.sample} tenants): {loop_seconds:,.0f} s")
+
+    print(f"{'workers':>7} {'seconds':>8} {'vs 1 worker':>12} {'vs loop':>8}")
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        began = time.perf_counter()
+        generate_report(start, end, os.path.join(workdir, f"report-{workers}.json"), workers=workers, fresh=True)
+        seconds = time.perf_counter() - began
+        baseline = baseline or seconds
+        print(f"{workers:>7} {seconds:>8.1f} {baseline / seconds:>11.1f}x {loop_seconds / seconds:>7.0f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
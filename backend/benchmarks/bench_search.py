@@ -0,0 +1,121 @@
+"""Full-text search latency against a LIKE scan over message content.
+
+Seeds a temporary SQLite database (FTS5 index maintained by the insert
+triggers), then times tenant-scoped searches of varying selectivity, with and
+without channel/customer/date filters. The LIKE baseline runs the same tenant
+scope with `content LIKE '%term%'`.
+
+    python benchmarks/bench_search.py --messages 10000000 --tenants 50
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'search_bench.db')}")
+
+from sqlalchemy import insert, text
+
+from database import SessionLocal, engine, init_db
+from models import Message, Organization
+from search import search_messages
+from seed_data import INDIAN_MESSAGES
+
+# Zipf-ish vocabulary so some terms are common and some rare
+VOCABULARY = [f"word{i}" for i in range(20000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+QUERIES = {
+    "common term": {"query": "word0"},
+    "mid term": {"query": "word50"},
+    "rare term": {"query": "word15000"},
+    "two terms": {"query": "word1 word2"},
+    "prefix": {"query": "word123*"},
+    "phrase from seed": {"query": "appointment"},
+    "+ channel": {"query": "word0", "channel": "telegram"},
+    "+ customer": {"query": "word0", "customer_id": "1234"},
+    "+ last 30 days": {"query": "word0", "days": 30},
+}
+
+
+def seed(db, messages, tenants):
+    now = datetime.utcnow()
+    orgs = [Organization(name=f"Tenant {i}") for i in range(tenants)]
+    db.add_all(orgs)
+    db.commit()
+    batch = []
+    for i in range(messages):
+        words = random.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=6)
+        batch.append({"organization_id": orgs[i % tenants].id, "customer_id": str(random.randint(1000, 9999)),
+                      "channel": random.choice(["whatsapp", "telegram"]), "message_type": "text",
+                      "content": f"{random.choice(INDIAN_MESSAGES)} {' '.join(words)}",
+                      "is_from_customer": bool(i % 2), "response_time": random.uniform(5, 120),
+                      "created_at": now - timedelta(minutes=random.randint(0, 365 * 24 * 60))})
+        if len(batch) == 50_000:
+            db.execute(insert(Message), batch)
+            db.commit()
+            batch = []
+    if batch:
+        db.execute(insert(Message), batch)
+        db.commit()
+    return [org.id for org in orgs]
+
+
+def latencies(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+
+
+def like_scan(db, org_id, term):
+    return db.execute(text(
+        "SELECT id FROM messages WHERE organization_id = :org_id AND content LIKE :pattern "
+        "ORDER BY created_at DESC LIMIT 20"
+    ), {"org_id": org_id, "pattern": f"%{term}%"}).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    org_ids = seed(db, args.messages, args.tenants)
+    seconds = time.perf_counter() - start
+    print(f"seeded {args.messages:,} messages in {seconds:.1f}s ({args.messages / seconds:,.0f}/s with FTS triggers)")
+    print(f"database size {os.path.getsize(engine.url.database) / 2**20:.1f} MiB")
+
+    print(f"{'query':<18} {'fts p50 ms':>11} {'fts p95 ms':>11} {'hits':>5} {'like p50 ms':>12}")
+    for name, query in QUERIES.items():
+        query = dict(query)
+        days = query.pop("days", None)
+        if days:
+            query["start"] = datetime.utcnow() - timedelta(days=days)
+        org_id = random.choice(org_ids)
+        page = search_messages(db, org_id, **query)
+        p50, p95 = latencies(lambda: search_messages(db, org_id, **query), args.repeat)
+        like = ""
+        if set(query) == {"query"} and "*" not in query["query"] and " " not in query["query"]:
+            like = f"{latencies(lambda: like_scan(db, org_id, query['query']), max(3, args.repeat // 10))[0]:.1f}"
+        print(f"{name:<18} {p50:>11.2f} {p95:>11.2f} {len(page['results']):>5} {like:>12}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""List response serialization benchmark: FastAPI's default path vs serialization.encode_list.
+
+The default path mirrors what FastAPI does for a `response_model`: validate from
+attributes, dump to JSON-mode Python objects, then json.dumps. Both outputs are
+compared byte for byte.
+
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Appointment, Message
+from schemas import AppointmentResponse, MessageResponse
+from seed_data import INDIAN_CUSTOMERS, INDIAN_MESSAGES
+from serialization import encode_list, list_adapter
+
+
+def default_path(schema, rows) -> bytes:
+    adapter = list_adapter(schema)
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json", by_alias=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def make_messages(n):
+    now = datetime.utcnow()
+    return [
+        Message(id=i, organization_id=1, customer_id=str(1000 + i % 900), channel=random.choice(["whatsapp", "telegram"]),
+                message_type="text", content=random.choice(INDIAN_MESSAGES), is_from_customer=bool(i % 2),
+                response_time=random.uniform(10, 120), created_at=now - timedelta(seconds=i))
+        for i in range(n)
+    ]
+
+
+def make_appointments(n):
+    now = datetime.utcnow()
+    appointments = []
+    for i in range(n):
+        cust = random.choice(INDIAN_CUSTOMERS)
+        appointments.append(Appointment(
+            id=i, organization_id=1, service_type_id=1 + i % 4, customer_name=cust["name"],
+            customer_email=cust["email"], customer_phone=cust["phone"],
+            appointment_date=now + timedelta(hours=i), status="scheduled", channel="whatsapp",
+            notes="Auto-generated appointment", created_at=now
+        ))
+    return appointments
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<14} {'default ms':>11} {'fast ms':>9} {'speedup':>8} {'bytes':>10}  identical")
+    for name, schema, rows in [("messages", MessageResponse, make_messages(args.rows)),
+                               ("appointments", AppointmentResponse, make_appointments(args.rows))]:
+        slow_s, slow = best_of(lambda: default_path(schema, rows), args.repeat)
+        fast_s, fast = best_of(lambda: encode_list(schema, rows), args.repeat)
+        print(f"{name:<14} {slow_s * 1000:>11.1f} {fast_s * 1000:>9.1f} {slow_s / fast_s:>7.2f}x "
+              f"{len(fast):>10}  {fast == slow}")
+
+
+if __name__ == "__main__":
+    main()
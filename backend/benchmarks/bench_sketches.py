@@ -0,0 +1,115 @@
+"""Response-time percentiles from per-day sketches vs scanning raw message rows.
+
+Seeds a temporary SQLite database with messages spread over tenants, channels
+and days, builds the sketches with the backfill, then times 30-day and
+one-year percentile reports for one tenant and for the platform. The baseline
+reads every response time in the window and sorts it. Also reports the
+per-message cost of recording into a sketch, the stored size per row and the
+worst relative error against the exact percentiles.
+
+    python benchmarks/bench_sketches.py --messages 1000000 --tenants 10 --days 365
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'sketches_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import func, insert, select
+
+from database import SessionLocal, init_db
+from models import Message, MetricSketch, Organization
+from sketches import PERCENTILES, DDSketch, backfill_sketches, response_time_report
+
+CHANNELS = ["whatsapp", "telegram", "web", "sms"]
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def seed(db, count, tenants, days, rng):
+    orgs = [Organization(name=f"Tenant {i}") for i in range(tenants)]
+    db.add_all(orgs)
+    db.commit()
+    start = datetime.utcnow() - timedelta(days=days)
+    span = days * 86400
+    batch = []
+    for i in range(count):
+        batch.append({"organization_id": orgs[i % tenants].id, "customer_id": f"c{rng.randrange(50_000)}",
+                      "channel": rng.choice(CHANNELS), "content": "Bench message", "is_from_customer": False,
+                      "response_time": rng.lognormvariate(2.5, 1.0),
+                      "created_at": start + timedelta(seconds=rng.randrange(span))})
+        if len(batch) == 50_000:
+            db.execute(insert(Message), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Message), batch)
+    db.commit()
+    return [org.id for org in orgs]
+
+
+def exact_report(db, org_id, start, end):
+    criteria = [Message.response_time.isnot(None), Message.created_at >= start, Message.created_at < end]
+    if org_id is not None:
+        criteria.append(Message.organization_id == org_id)
+    values = sorted(db.execute(select(Message.response_time).where(*criteria)).scalars())
+    return {name: values[int(q * (len(values) - 1))] for name, q in PERCENTILES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    init_db()
+    db = SessionLocal()
+    org_ids = seed(db, args.messages, args.tenants, args.days, rng)
+    print(f"{args.messages:,} messages over {args.days} days, {args.tenants} tenants, {len(CHANNELS)} channels")
+
+    start = time.perf_counter()
+    backfill_sketches(db, org_ids, datetime.utcnow().date() + timedelta(days=1))
+    backfill_seconds = time.perf_counter() - start
+    rows, stored_bytes = db.execute(select(func.count(), func.sum(func.length(MetricSketch.data)))
+                                    .where(MetricSketch.metric == "response_time")).one()
+    print(f"backfill: {rows:,} sketch rows in {backfill_seconds:.1f} s, "
+          f"{stored_bytes / rows:,.0f} bytes per row on average")
+
+    sketch = DDSketch()
+    values = [rng.lognormvariate(2.5, 1.0) for _ in range(200_000)]
+    record_ms, _ = timed(lambda: [sketch.add(value) for value in values], repeat=3)
+    print(f"recording: {record_ms * 1000 / len(values):.2f} µs per message")
+
+    today = datetime.utcnow().date()
+    tomorrow = today + timedelta(days=1)
+    print(f"{'report':<22} {'sketch ms':>10} {'raw scan ms':>12} {'max rel err':>12}")
+    for label, org_id, days in (("tenant, 30 days", org_ids[0], 30), ("tenant, 1 year", org_ids[0], 365),
+                                ("platform, 30 days", None, 30), ("platform, 1 year", None, 365)):
+        first = tomorrow - timedelta(days=days)
+        sketch_ms, report = timed(lambda: response_time_report(db, org_id, first, tomorrow))
+        raw_ms, exact = timed(lambda: exact_report(db, org_id, datetime.combine(first, datetime.min.time()),
+                                                   datetime.combine(tomorrow, datetime.min.time())), repeat=2)
+        error = max(abs(report["overall"][name] - exact[name]) / exact[name] for name in PERCENTILES)
+        print(f"{label:<22} {sketch_ms:>10.2f} {raw_ms:>12.1f} {error:>11.2%}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Cold start and multi-worker throughput benchmark for the production launcher.
+
+Measures how long a fresh interpreter takes to import the app, then starts
+`run.py --production` with 1..N workers and drives /api/health from a pool of
+client processes to show requests/second scaling.
+
+    python benchmarks/bench_startup.py --max-workers 4 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cold_start_ms(runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _client(url: str, seconds: float, queue):
+    done = 0
+    deadline = time.perf_counter() + seconds
+    with httpx.Client() as client:
+        while time.perf_counter() < deadline:
+            client.get(url)
+            done += 1
+    queue.put(done)
+
+
+def requests_per_second(workers: int, port: int, clients: int, seconds: float, env: dict) -> float:
+    server = subprocess.Popen(
+        [sys.executable, "run.py", "--production", "--workers", str(workers), "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}/api/health"
+    try:
+        for _ in range(200):
+            try:
+                httpx.get(url)
+                break
+            except httpx.TransportError:
+                time.sleep(0.05)
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_client, args=(url, seconds, queue)) for _ in range(clients)]
+        for p in procs:
+            p.start()
+        total = sum(queue.get() for _ in procs)
+        for p in procs:
+            p.join()
+        return total / seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=None, help="defaults to 2 per worker")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    timings = cold_start_ms(args.cold_runs)
+    print(f"cold start (import main): median {statistics.median(timings):.0f} ms, "
+          f"min {min(timings):.0f} ms over {len(timings)} runs")
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        rps = requests_per_second(workers, args.port, args.clients or 2 * workers, args.seconds, env)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline:>7.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Distinct-customer counts from HyperLogLog day sketches vs COUNT(DISTINCT).
+
+Seeds a temporary SQLite database with messages from a pool of customers per
+tenant, builds the sketches with the backfill, then times a report (total
+plus per-day or per-month buckets) for one tenant and for the platform. The
+exact baseline runs COUNT(DISTINCT customer_id) over the message rows for the
+total and for every bucket. Also prints the relative error of each estimate
+and the stored size per sketch row.
+
+    python benchmarks/bench_unique_customers.py --messages 1000000 --tenants 10 --customers 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'unique_customers_bench.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+from sqlalchemy import func, insert, select
+
+from database import SessionLocal, init_db
+from models import Message, MetricSketch, Organization
+from sketches import backfill_sketches, unique_customers_report
+
+CHANNELS = ["whatsapp", "telegram", "web", "sms"]
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def seed(db, count, tenants, customers, days, rng):
+    orgs = [Organization(name=f"Tenant {i}") for i in range(tenants)]
+    db.add_all(orgs)
+    db.commit()
+    start = datetime.utcnow() - timedelta(days=days)
+    span = days * 86400
+    batch = []
+    for i in range(count):
+        org_index = i % tenants
+        # Skewed pool: a minority of customers writes most of the messages
+        customer = int(customers * rng.random() ** 2)
+        batch.append({"organization_id": orgs[org_index].id, "customer_id": f"+91{org_index:02d}{customer:08d}",
+                      "channel": rng.choice(CHANNELS), "content": "Bench message", "is_from_customer": True,
+                      "created_at": start + timedelta(seconds=rng.randrange(span))})
+        if len(batch) == 50_000:
+            db.execute(insert(Message), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Message), batch)
+    db.commit()
+    return [org.id for org in orgs]
+
+
+def exact_report(db, org_id, start, end, granularity):
+    criteria = [Message.created_at >= start, Message.created_at < end]
+    if org_id is not None:
+        criteria.append(Message.organization_id == org_id)
+    period = func.strftime("%Y-%m-%d" if granularity == "day" else "%Y-%m-01", Message.created_at)
+    total = db.execute(select(func.count(func.distinct(Message.customer_id))).where(*criteria)).scalar()
+    buckets = dict(db.execute(select(period, func.count(func.distinct(Message.customer_id)))
+                              .where(*criteria).group_by(period)).all())
+    return total, buckets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=20_000, help="customer pool per tenant")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    init_db()
+    db = SessionLocal()
+    org_ids = seed(db, args.messages, args.tenants, args.customers, args.days, rng)
+    print(f"{args.messages:,} messages over {args.days} days, {args.tenants} tenants, "
+          f"{args.customers:,} customers each")
+
+    start = time.perf_counter()
+    backfill_sketches(db, org_ids, datetime.utcnow().date() + timedelta(days=1))
+    rows, stored_bytes = db.execute(select(func.count(), func.sum(func.length(MetricSketch.data)))
+                                    .where(MetricSketch.metric == "unique_customers")).one()
+    print(f"backfill: {time.perf_counter() - start:.1f} s, {rows:,} customer sketch rows, "
+          f"{stored_bytes / rows:,.0f} bytes per row on average")
+
+    tomorrow = datetime.utcnow().date() + timedelta(days=1)
+    print(f"{'report':<28} {'hll ms':>8} {'exact ms':>9} {'total':>9} {'estimate':>9} {'err':>7} {'max bucket err':>15}")
+    for label, org_id, days, granularity in (
+        ("tenant, 30 days by day", org_ids[0], 30, "day"),
+        ("tenant, 1 year by month", org_ids[0], 365, "month"),
+        ("platform, 30 days by day", None, 30, "day"),
+        ("platform, 1 year by month", None, 365, "month"),
+    ):
+        first = tomorrow - timedelta(days=days)
+        hll_ms, report = timed(lambda: unique_customers_report(db, org_id, first, tomorrow, granularity))
+        exact_ms, (total, buckets) = timed(lambda: exact_report(
+            db, org_id, datetime.combine(first, datetime.min.time()),
+            datetime.combine(tomorrow, datetime.min.time()), granularity), repeat=1)
+        bucket_error = max(abs(bucket["unique_customers"] - buckets[bucket["period"]]) / buckets[bucket["period"]]
+                           for bucket in report["buckets"])
+        error = (report["unique_customers"] - total) / total
+        print(f"{label:<28} {hll_ms:>8.1f} {exact_ms:>9.1f} {total:>9,} {report['unique_customers']:>9,} "
+              f"{error:>+7.2%} {bucket_error:>15.2%}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
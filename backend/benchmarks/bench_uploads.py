@@ -0,0 +1,66 @@
+"""Streaming upload throughput and memory use.
+
+Feeds multipart bodies of increasing size through uploads.store_upload in
+64 KiB chunks, the way the ASGI server delivers them, and reports MB/s and
+the process's peak RSS after each upload, which stays flat as files grow.
+Each file is uploaded twice; the second upload is deduplicated against the
+stored object.
+
+    python benchmarks/bench_uploads.py --sizes 10 100 500
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import random
+import resource
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uploads
+
+BOUNDARY = "----benchboundary7MA4YWxkTrZu0gW"
+CHUNK = 64 * 1024
+
+
+async def multipart_body(size_mb, seed):
+    """Yield a multipart body with one generated file part, chunk by chunk, never all at once."""
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"name\"\r\n\r\nBench document\r\n"
+           f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.pdf\"\r\n"
+           f"Content-Type: application/pdf\r\n\r\n").encode()
+    block = random.Random(seed).randbytes(CHUNK)
+    for _ in range(size_mb * 1024 * 1024 // CHUNK):
+        yield block
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def upload(size_mb, seed):
+    start = time.perf_counter()
+    stored = await uploads.store_upload(f"multipart/form-data; boundary={BOUNDARY}", multipart_body(size_mb, seed))
+    return stored, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="file sizes in MiB")
+    args = parser.parse_args()
+
+    uploads.UPLOAD_DIR = tempfile.mkdtemp()
+    print(f"{'size MiB':>9} {'pass':<6} {'MB/s':>8} {'peak RSS MiB':>13} {'deduplicated':>13}")
+    try:
+        for seed, size_mb in enumerate(args.sizes):
+            for attempt in ("first", "repeat"):
+                stored, seconds = asyncio.run(upload(size_mb, seed))
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                assert stored.size == size_mb * 1024 * 1024 // CHUNK * CHUNK
+                print(f"{size_mb:>9} {attempt:<6} {stored.size / seconds / 1e6:>8.0f} {peak:>13,.0f} "
+                      f"{str(stored.deduplicated):>13}")
+    finally:
+        shutil.rmtree(uploads.UPLOAD_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""External calendar free/busy cache.
+
+Busy intervals from each organization's external calendars are mirrored into
+`calendar_busy_intervals` with incremental sync: the provider's sync token is
+kept in `calendar_sync_state`, so a refresh only transfers events changed since
+the last one. An expired token (HTTP 410) falls back to a full sync of that
+calendar.
+
+Free/busy lookups never call the provider. They are answered from an in-memory
+index per organization: the busy intervals merged into disjoint, sorted
+start/end arrays and searched with bisect. The syncing process swaps in a new
+index after each sync. Other processes reload theirs from the table once it is
+older than `index_ttl`.
+
+Calendars are configured in Configuration.calendar_config:
+
+    {"enabled": true, "calendarIds": ["primary"], "accessToken": "..."}
+
+Run it in exactly one process, either with CALENDAR_SYNC_ENABLED=true on a
+single API worker or standalone with `python calendar_sync.py`.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from dispatcher import ProviderError
+from models import CalendarBusyInterval, CalendarSyncState, Configuration
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CALENDAR_URL = "https://www.googleapis.com/calendar/v3"
+
+class SyncTokenExpired(Exception):
+    """The provider no longer accepts the sync token; a full sync is needed."""
+
+class CalendarPage:
+    __slots__ = ("events", "next_page_token", "next_sync_token")
+
+    def __init__(self, events: List[dict], next_page_token: Optional[str] = None,
+                 next_sync_token: Optional[str] = None):
+        self.events = events
+        self.next_page_token = next_page_token
+        self.next_sync_token = next_sync_token
+
+def naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+def _parse_time(value: dict) -> datetime:
+    """Event start/end as naive UTC; all-day dates are taken as UTC midnight."""
+    if "dateTime" in value:
+        return naive_utc(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+    return datetime.fromisoformat(value["date"])
+
+def busy_span(event: dict) -> Optional[Tuple[datetime, datetime]]:
+    """(start, end) for an event that blocks time, None for cancelled or free events."""
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return None
+    if "start" not in event or "end" not in event:
+        return None
+    start, end = _parse_time(event["start"]), _parse_time(event["end"])
+    return (start, end) if end > start else None
+
+class HttpCalendarProvider:
+    """Calendar provider speaking the Google Calendar events.list API.
+
+    GET {base_url}/calendars/{calendar_id}/events?syncToken=&pageToken= answers
+    {"items": [...], "nextPageToken"} and, on the last page, {"nextSyncToken"};
+    410 when the sync token has expired.
+    """
+
+    def __init__(self, base_url: str = GOOGLE_CALENDAR_URL, timeout: float = 10.0, page_size: int = 2500):
+        self.base_url = base_url.rstrip("/")
+        self.page_size = page_size
+        self.client = httpx.Client(timeout=timeout)
+
+    def list_events(self, credentials: dict, calendar_id: str, sync_token: Optional[str] = None,
+                    page_token: Optional[str] = None) -> CalendarPage:
+        params = {"maxResults": self.page_size, "singleEvents": "true", "showDeleted": "true"}
+        if sync_token:
+            params["syncToken"] = sync_token
+        if page_token:
+            params["pageToken"] = page_token
+        token = credentials.get("accessToken")
+        try:
+            response = self.client.get(
+                f"{self.base_url}/calendars/{calendar_id}/events",
+                params=params,
+                headers={"Authorization": f"Bearer {token}"} if token else {},
+            )
+        except httpx.TransportError as exc:
+            raise ProviderError(str(exc))
+        if response.status_code == 410:
+            raise SyncTokenExpired(calendar_id)
+        if response.status_code >= 400:
+            raise ProviderError(f"Calendar provider error {response.status_code}",
+                                retryable=response.status_code >= 500 or response.status_code == 429)
+        body = response.json()
+        return CalendarPage(body.get("items", []), body.get("nextPageToken"), body.get("nextSyncToken"))
+
+class BusyIndex:
+    """Disjoint, sorted busy intervals of one organization."""
+
+    __slots__ = ("starts", "ends", "loaded_at")
+
+    def __init__(self, intervals):
+        starts, ends = [], []
+        for start, end in sorted(intervals):
+            if ends and start <= ends[-1]:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts = starts
+        self.ends = ends
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def is_busy(self, start: datetime, end: datetime) -> bool:
+        """Whether any busy interval overlaps [start, end)."""
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def busy_between(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """Busy intervals overlapping [start, end), clipped to it."""
+        busy = []
+        i = bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            busy.append((max(self.starts[i], start), min(self.ends[i], end)))
+            i += 1
+        return busy
+
+class CalendarSync:
+    def __init__(self, provider=None, session_factory=SessionLocal, index_ttl: float = 30.0):
+        self.provider = provider or HttpCalendarProvider(os.getenv("CALENDAR_PROVIDER_URL", GOOGLE_CALENDAR_URL))
+        self.session_factory = session_factory
+        self.index_ttl = index_ttl
+        self._indexes: Dict[int, BusyIndex] = {}
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Syncing
+    def _sync_calendar(self, db: Session, org_id: int, calendar_id: str, credentials: dict) -> dict:
+        state = db.get(CalendarSyncState, (org_id, calendar_id))
+        if state is None:
+            state = CalendarSyncState(organization_id=org_id, calendar_id=calendar_id)
+            db.add(state)
+        full = not state.sync_token
+        try:
+            changes, sync_token = self._fetch_changes(credentials, calendar_id, state.sync_token)
+        except SyncTokenExpired:
+            full = True
+            changes, sync_token = self._fetch_changes(credentials, calendar_id, None)
+
+        in_calendar = (CalendarBusyInterval.organization_id == org_id,
+                       CalendarBusyInterval.calendar_id == calendar_id)
+        if full:
+            db.execute(delete(CalendarBusyInterval).where(*in_calendar))
+        elif changes:
+            changed_ids = list(changes)
+            for i in range(0, len(changed_ids), 500):
+                db.execute(delete(CalendarBusyInterval).where(
+                    *in_calendar, CalendarBusyInterval.event_id.in_(changed_ids[i:i + 500])))
+        rows = [
+            {"organization_id": org_id, "calendar_id": calendar_id, "event_id": event_id,
+             "start": span[0], "end": span[1]}
+            for event_id, span in changes.items() if span is not None
+        ]
+        if rows:
+            db.execute(insert(CalendarBusyInterval), rows)
+
+        now = datetime.utcnow()
+        state.sync_token = sync_token
+        state.synced_at = now
+        if full:
+            state.full_synced_at = now
+        db.commit()
+        return {"calendar_id": calendar_id, "full": full, "changed": len(changes), "busy": len(rows)}
+
+    def _fetch_changes(self, credentials: dict, calendar_id: str,
+                       sync_token: Optional[str]) -> Tuple[Dict[str, Optional[Tuple[datetime, datetime]]], str]:
+        """Every page of changes since `sync_token`, keyed by event id (None = no longer busy)."""
+        changes = {}
+        page_token = None
+        while True:
+            page = self.provider.list_events(credentials, calendar_id, sync_token, page_token)
+            for event in page.events:
+                changes[event["id"]] = busy_span(event)
+            if page.next_page_token:
+                page_token = page.next_page_token
+                continue
+            return changes, page.next_sync_token
+
+    def sync_organization(self, org_id: int, db: Session = None) -> List[dict]:
+        """Bring one organization's calendars up to date and rebuild its index."""
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            config = db.query(Configuration).filter(Configuration.organization_id == org_id).first()
+            calendar_config = (config.calendar_config if config else None) or {}
+            if not calendar_config.get("enabled"):
+                return []
+            with self._sync_lock:
+                results = [
+                    self._sync_calendar(db, org_id, calendar_id, calendar_config)
+                    for calendar_id in calendar_config.get("calendarIds") or ["primary"]
+                ]
+            self._indexes[org_id] = self._load_index(db, org_id)
+            return results
+        finally:
+            if own_session:
+                db.close()
+
+    def sync_all(self) -> int:
+        """Sync every organization with calendar sync enabled; returns how many were synced."""
+        db = self.session_factory()
+        try:
+            org_ids = [
+                config.organization_id for config in db.query(Configuration).all()
+                if (config.calendar_config or {}).get("enabled")
+            ]
+            synced = 0
+            for org_id in org_ids:
+                try:
+                    self.sync_organization(org_id, db)
+                    synced += 1
+                except (ProviderError, SyncTokenExpired):
+                    db.rollback()
+                    logger.exception("Calendar sync failed for organization %s", org_id)
+            return synced
+        finally:
+            db.close()
+
+    # Lookups
+    def _load_index(self, db: Session, org_id: int) -> BusyIndex:
+        return BusyIndex(db.execute(
+            select(CalendarBusyInterval.start, CalendarBusyInterval.end)
+            .where(CalendarBusyInterval.organization_id == org_id)
+        ).all())
+
+    def index(self, org_id: int) -> BusyIndex:
+        index = self._indexes.get(org_id)
+        # The syncing process keeps its indexes current; everyone else re-reads the table
+        if index is None or (not self.running and time.monotonic() - index.loaded_at > self.index_ttl):
+            db = self.session_factory()
+            try:
+                index = self._indexes[org_id] = self._load_index(db, org_id)
+            finally:
+                db.close()
+        return index
+
+    def is_busy(self, org_id: int, start: datetime, end: datetime) -> bool:
+        return self.index(org_id).is_busy(naive_utc(start), naive_utc(end))
+
+    def free_busy(self, org_id: int, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        return self.index(org_id).busy_between(naive_utc(start), naive_utc(end))
+
+    # Background refresh
+    def run(self, interval: float = 300.0) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync_all()
+            except Exception:
+                logger.exception("Calendar sync pass failed")
+            self._stop.wait(interval)
+
+    def start(self, **kwargs) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, kwargs=kwargs, name="calendar-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+# Process-wide cache; the endpoints read from it
+calendar_sync = CalendarSync()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    calendar_sync.run(interval=float(os.getenv("CALENDAR_SYNC_INTERVAL", 300)))
@@ -0,0 +1,176 @@
+"""Change versions per tenant and collection, for conditional GETs and ?since= deltas.
+
+Every transaction that writes a tracked collection (a tenant's organization
+record, configuration, documents, service types or appointments) calls
+`bump()` just before committing. That is one upsert on a small
+change_versions row, and it returns the new version. Written rows carry that
+version in their change_version column. On Postgres the upsert holds the
+version row's lock until commit, so versions commit in order. On SQLite the
+database write lock does the same. A client holding version N therefore
+never misses a row that commits later with a lower version.
+
+GET endpoints read the version (one primary-key lookup) before doing any
+other work:
+
+- A matching If-None-Match is answered with 304 straight away.
+- Otherwise the response carries ETag and X-Collection-Version, with
+  Cache-Control: no-cache, so browsers revalidate instead of re-downloading.
+  Last-Modified is sent for information only; If-Modified-Since is ignored.
+  HTTP dates have one-second resolution, so a second write within the same
+  second would be answered with a stale 304.
+- List endpoints take `?since=<version>` and return only rows written after
+  it, marked with X-Delta-Since. Deletes record a reset_version. A delta from
+  before the last delete, or from a version the server never issued, falls
+  back to the full list, so removed rows cannot linger in a client's copy.
+
+Other GET responses get a weak ETag hashed from their body by
+ConditionalGetMiddleware. This saves bandwidth but not the work of
+building the response.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+
+from models import ChangeVersion
+from serialization import wants_msgpack
+
+COLLECTIONS = ("organization", "config", "documents", "service_types", "appointments")
+
+_CURRENT = select(ChangeVersion.version, ChangeVersion.reset_version, ChangeVersion.changed_at).where(
+    ChangeVersion.organization_id == bindparam("org_id"), ChangeVersion.collection == bindparam("name"))
+
+def _insert(db: Session):
+    return (postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert)(ChangeVersion)
+
+def bump(db: Session, org_id: int, collection: str, deleted: bool = False) -> int:
+    """Advance a collection's version in the caller's transaction and return it; call right before commit.
+
+    `deleted` marks a write that removed rows, which deltas cannot express.
+    """
+    now = datetime.utcnow()
+    changes = {"version": ChangeVersion.version + 1, "changed_at": now}
+    if deleted:
+        changes["reset_version"] = ChangeVersion.version + 1
+    statement = _insert(db).values(organization_id=org_id, collection=collection, version=1,
+                                   reset_version=1 if deleted else 0, changed_at=now)
+    statement = statement.on_conflict_do_update(index_elements=["organization_id", "collection"], set_=changes)
+    return db.execute(statement.returning(ChangeVersion.version)).scalar_one()
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match uses."""
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+class CollectionVersion:
+    """A collection's current version and the validators derived from it."""
+
+    __slots__ = ("organization_id", "collection", "version", "reset_version", "changed_at", "etag")
+
+    def __init__(self, organization_id: int, collection: str, version: int = 0, reset_version: int = 0,
+                 changed_at: Optional[datetime] = None):
+        self.organization_id = organization_id
+        self.collection = collection
+        self.version = version
+        self.reset_version = reset_version
+        self.changed_at = changed_at
+        # MessagePack and JSON are different representations of the same version
+        suffix = "-msgpack" if wants_msgpack() else ""
+        self.etag = f'W/"{collection}-{organization_id}-{version}{suffix}"'
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache", "X-Collection-Version": str(self.version)}
+        if self.changed_at is not None:
+            # Informational; 304s are decided by the ETag alone
+            headers["Last-Modified"] = format_datetime(self.changed_at.replace(tzinfo=timezone.utc), usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """Whether the client's cached copy is current, by ETag only (If-Modified-Since is ignored, see above)."""
+        if_none_match = request.headers.get("if-none-match")
+        return if_none_match is not None and _etag_matches(if_none_match, self.etag)
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+    def delta_since(self, since: Optional[int]) -> Optional[int]:
+        """`since` if rows written after it are a complete delta, else None (send the full list)."""
+        if since is None or since < self.reset_version or since > self.version:
+            return None
+        return since
+
+    def tag(self, result: Any, response: Response, delta_since: Optional[int] = None) -> Any:
+        """Attach the validators to an endpoint's result, whether it is a Response or data for response_model."""
+        headers = self.headers()
+        if delta_since is not None:
+            headers["X-Delta-Since"] = str(delta_since)
+        (result if isinstance(result, Response) else response).headers.update(headers)
+        return result
+
+def collection_version(db: Session, org_id: int, collection: str) -> CollectionVersion:
+    row = db.execute(_CURRENT, {"org_id": org_id, "name": collection}).first()
+    if row is None:
+        return CollectionVersion(org_id, collection)
+    return CollectionVersion(org_id, collection, row.version, row.reset_version, row.changed_at)
+
+class ConditionalGetMiddleware:
+    """ASGI middleware giving untracked GET responses a body-hash ETag and answering If-None-Match with 304.
+
+    Only single-chunk bodies are tagged; streamed or chunked bodies (exports,
+    event streams) and responses that already carry an ETag pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+
+        async def send_tagged(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                names = {name for name, _ in message["headers"]}
+                # Only one-shot bodies declare their length up front; streams are sent on unheld
+                if message["status"] == 200 and b"etag" not in names and b"content-length" in names:
+                    start = message
+                    return
+                await send(message)
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            held, start = start, None
+            if message.get("more_body", False):
+                # Sent in several chunks: a hash of the first one would not name the body
+                await send(held)
+                await send(message)
+                return
+            body = message.get("body", b"")
+            etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            headers = MutableHeaders(raw=held["headers"])
+            headers["ETag"] = etag
+            if if_none_match is not None and _etag_matches(if_none_match, etag):
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                await send({"type": "http.response.start", "status": 304, "headers": held["headers"]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(held)
+            await send(message)
+
+        await self.app(scope, receive, send_tagged)
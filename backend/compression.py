@@ -0,0 +1,205 @@
+"""Response compression (brotli or gzip) as ASGI middleware.
+
+The encoding is negotiated from Accept-Encoding. Brotli is used when the
+client accepts it and the optional `brotli` package is installed, gzip
+otherwise. Only compressible media types are encoded (JSON, NDJSON,
+MessagePack, text), never text/event-stream, whose events must reach the
+browser as they are sent, and never a response that already has a
+Content-Encoding.
+
+One-shot bodies under COMPRESSION_MIN_BYTES go out as they are: a small
+JSON object would barely shrink, and compressing it still costs CPU. Streamed
+bodies (exports) are compressed chunk by chunk as they are produced, so
+nothing is buffered beyond what the compressor holds. CPU per request is
+bounded by the level settings (COMPRESSION_GZIP_LEVEL,
+COMPRESSION_BROTLI_QUALITY). Chunks of COMPRESSION_THREAD_BYTES or more are
+compressed in the thread pool, where zlib and brotli release the GIL, so a
+large export does not stall the event loop.
+"""
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+THREAD_BYTES = int(os.getenv("COMPRESSION_THREAD_BYTES", 256 * 1024))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/msgpack", "application/x-msgpack",
+                      "application/javascript", "application/xml", "image/svg+xml")
+
+def compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith("+json")
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """br or gzip, whichever the client accepts (br preferred on equal weight), or None."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+    wildcard = weights.get("*", 0.0)
+    candidates = (("br", "gzip") if brotli is not None else ("gzip",))
+    best = max(candidates, key=lambda name: weights.get(name, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+class _Compressor:
+    """Streaming compressor with the same interface for both encodings."""
+
+    __slots__ = ("encoding", "_compress", "_flush")
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self._compress, self._flush = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+            self._compress, self._flush = compressor.compress, compressor.flush
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compress(data) + self._flush() if final else self._compress(data)
+
+class CompressionStats:
+    """Bytes in/out and compression time per encoding, shared by the app's middleware."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {encoding: {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+                         for encoding in ("br", "gzip", "identity")}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float, response: bool) -> None:
+        with self._lock:
+            counters = self.counters[encoding]
+            counters["responses"] += response
+            counters["bytes_in"] += bytes_in
+            counters["bytes_out"] += bytes_out
+            counters["seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = {encoding: dict(counters) for encoding, counters in self.counters.items()}
+        for counters in stats.values():
+            counters["ratio"] = round(counters["bytes_out"] / counters["bytes_in"], 4) if counters["bytes_in"] else None
+            counters["seconds"] = round(counters["seconds"], 6)
+        stats["brotli_available"] = brotli is not None
+        stats["levels"] = {"gzip": GZIP_LEVEL, "br": BROTLI_QUALITY}
+        stats["min_bytes"] = MIN_BYTES
+        return stats
+
+compression_stats = CompressionStats()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible HTTP responses; see the module docstring."""
+
+    def __init__(self, app, min_bytes: int = MIN_BYTES, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY, thread_bytes: int = THREAD_BYTES,
+                 stats: CompressionStats = compression_stats):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self.thread_bytes = thread_bytes
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+    async def compress(self, compressor: _Compressor, data: bytes, final: bool, first: bool) -> bytes:
+        started = time.perf_counter()
+        if len(data) >= self.thread_bytes:
+            output = await run_in_threadpool(compressor.compress, data, final)
+        else:
+            output = compressor.compress(data, final)
+        self.stats.record(compressor.encoding, len(data), len(output), time.perf_counter() - started, first)
+        return output
+
+class _Responder:
+    """Per-response state for one response passing through CompressionMiddleware."""
+
+    __slots__ = ("middleware", "encoding", "_send", "start", "compressor")
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start = None
+        self.compressor: Optional[_Compressor] = None
+
+    async def send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            if self._eligible(message):
+                # Held until the first body chunk shows whether it is worth compressing
+                self.start = message
+            else:
+                self.middleware.stats.record("identity", 0, 0, 0.0, True)
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            # A streamed body is compressed unless it declared a small length up front
+            size = len(body) if not more_body else int(headers.get("content-length", self.middleware.min_bytes))
+            if size < self.middleware.min_bytes:
+                self.middleware.stats.record("identity", len(body), len(body), 0.0, True)
+                await self._send(start)
+                await self._send(message)
+                return
+            self.compressor = _Compressor(self.encoding, self.middleware.levels[self.encoding])
+            headers["Content-Encoding"] = self.encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The encoded bytes differ from the ones the strong validator names
+                headers["ETag"] = "W/" + etag
+            body = await self.middleware.compress(self.compressor, body, not more_body, True)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.compressor is None:
+            self.middleware.stats.record("identity", len(body), len(body), 0.0, False)
+            await self._send(message)
+            return
+        body = await self.middleware.compress(self.compressor, body, not more_body, False)
+        if body or not more_body:
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _eligible(self, start) -> bool:
+        """Whether the response may be compressed; anything else is sent on unheld, event streams included."""
+        headers = Headers(raw=start["headers"])
+        if not compressible(headers.get("content-type", "")):
+            return False
+        MutableHeaders(raw=start["headers"]).add_vary_header("Accept-Encoding")
+        return self.encoding is not None and "content-encoding" not in headers \
+            and start["status"] not in (204, 206, 304)
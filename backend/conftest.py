@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Run the suite against a throwaway seeded database instead of ai_assistant.db.
+# This must happen before anything imports database.py.
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+)
+
+from database import init_db
+from seed_data import create_seed_data
+
+init_db()
+create_seed_data()
@@ -0,0 +1,251 @@
+"""In-memory dialogue state for chat booking flows.
+
+A booking conversation (pick service -> pick slot -> confirm ->
+create_appointment) needs a little state per customer between turns. Writing
+it to the database on every turn would double the write load of the
+inbound path, so it lives here instead:
+
+- one slotted record per (organization_id, channel, customer_id), replaced
+  on every write, so readers and snapshots never see a half-updated record;
+- records are kept in last-update order, so expiry (no update for
+  CONVERSATION_TTL_SECONDS) and eviction under the memory budget
+  (CONVERSATION_MEMORY_MB, least recently updated first) both pop from the
+  front. Reads do not count: every turn of a live conversation updates it,
+  and the TTL is measured from the last update too;
+- a background thread writes a snapshot to CONVERSATION_SNAPSHOT_PATH every
+  CONVERSATION_SNAPSHOT_SECONDS, and once more on shutdown. Startup reloads
+  the snapshot and drops whatever expired in the meantime, so a restart
+  does not lose in-flight bookings.
+
+State is per process. Run the chat flow and the snapshots in one process
+(CONVERSATION_SNAPSHOTS_ENABLED=true on a single worker, like the calendar
+sync), or route each customer to the same worker.
+"""
+import gc
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", 1800))
+MEMORY_BYTES = int(float(os.getenv("CONVERSATION_MEMORY_MB", 256)) * 1024 * 1024)
+SNAPSHOT_PATH = os.getenv("CONVERSATION_SNAPSHOT_PATH", "./conversations.snapshot")
+SNAPSHOT_VERSION = 1
+
+# Per-entry cost of the OrderedDict (hash slot, index and order node) on top of key and record,
+# measured on CPython 3.11 with benchmarks/bench_conversations.py
+ENTRY_OVERHEAD_BYTES = 48
+
+ConversationKey = Tuple[int, str, str]
+
+class ConversationState:
+    """One customer's place in the booking flow. Treat as immutable; use ConversationStore.update."""
+
+    __slots__ = ("stage", "service_type_id", "slot_start", "customer_name", "updated_at")
+
+    def __init__(self, stage: str = "service", service_type_id: Optional[int] = None,
+                 slot_start: Optional[int] = None, customer_name: Optional[str] = None, updated_at: float = 0.0):
+        self.stage = sys.intern(stage)  # a handful of distinct values, shared by every record
+        self.service_type_id = service_type_id
+        self.slot_start = slot_start  # epoch seconds of the picked slot
+        self.customer_name = customer_name
+        self.updated_at = updated_at  # epoch seconds
+
+    def replace(self, **changes) -> "ConversationState":
+        values = {field: getattr(self, field) for field in self.__slots__}
+        values.update(changes)
+        return ConversationState(**values)
+
+    def as_tuple(self) -> tuple:
+        return (self.stage, self.service_type_id, self.slot_start, self.customer_name, self.updated_at)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.__slots__, self.as_tuple()))
+
+def _entry_bytes(key: ConversationKey, state: ConversationState) -> int:
+    """Approximate memory held by one entry; the stage and channel strings are shared."""
+    size = ENTRY_OVERHEAD_BYTES + sys.getsizeof(key) + sys.getsizeof(key[2]) + sys.getsizeof(state)
+    size += sys.getsizeof(state.updated_at)
+    for value in (state.service_type_id, state.slot_start, state.customer_name):
+        if value is not None:
+            size += sys.getsizeof(value)
+    return size
+
+class ConversationStore:
+    def __init__(self, ttl: float = TTL_SECONDS, max_bytes: int = MEMORY_BYTES,
+                 snapshot_path: str = SNAPSHOT_PATH, clock=time.time):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.snapshot_path = snapshot_path
+        self.clock = clock
+        self._states: "OrderedDict[ConversationKey, ConversationState]" = OrderedDict()
+        self._bytes = 0
+        self._writes = 0  # since the last snapshot
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"expired": 0, "evicted": 0, "snapshots": 0}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _remove(self, key: ConversationKey) -> None:
+        self._bytes -= _entry_bytes(key, self._states.pop(key))
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently updated ones while over budget."""
+        states = self._states
+        while states:
+            key, state = next(iter(states.items()))
+            if now - state.updated_at > self.ttl:
+                self.counters["expired"] += 1
+            elif self._bytes > self.max_bytes:
+                self.counters["evicted"] += 1
+            else:
+                break
+            self._remove(key)
+
+    def get(self, org_id: int, channel: str, customer_id: str) -> Optional[ConversationState]:
+        """The customer's live conversation, if any. Does not refresh its place in update order."""
+        key = (org_id, channel, customer_id)
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and self.clock() - state.updated_at > self.ttl:
+                self._remove(key)
+                self.counters["expired"] += 1
+                return None
+            return state
+
+    def update(self, org_id: int, channel: str, customer_id: str, **changes) -> ConversationState:
+        """Apply changes to the customer's conversation, starting a new one if there is none (or it expired)."""
+        key = (org_id, sys.intern(channel), customer_id)
+        now = self.clock()
+        with self._lock:
+            current = self._states.get(key)
+            if current is not None:
+                self._remove(key)
+                if now - current.updated_at > self.ttl:
+                    self.counters["expired"] += 1
+                    current = None
+            state = (current or ConversationState()).replace(updated_at=now, **changes)
+            self._states[key] = state
+            self._bytes += _entry_bytes(key, state)
+            self._writes += 1
+            self._evict(now)
+            return state
+
+    def discard(self, org_id: int, channel: str, customer_id: str) -> bool:
+        """End a conversation, e.g. once its appointment is created."""
+        key = (org_id, channel, customer_id)
+        with self._lock:
+            if key not in self._states:
+                return False
+            self._remove(key)
+            self._writes += 1
+            return True
+
+    def expire(self) -> None:
+        with self._lock:
+            self._evict(self.clock())
+
+    # Snapshots
+    def snapshot(self, path: Optional[str] = None) -> int:
+        """Write every live conversation to disk atomically; returns how many were written."""
+        path = path or self.snapshot_path
+        with self._lock:
+            # Records are replaced, never mutated, so copying the references is enough
+            items = list(self._states.items())
+            writes = self._writes
+        records = [key + state.as_tuple() for key, state in items]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(marshal.dumps((SNAPSHOT_VERSION, records)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        with self._lock:
+            # Only now is it safe to forget them; writes made meanwhile wait for the next snapshot
+            self._writes -= writes
+            self.counters["snapshots"] += 1
+        return len(records)
+
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        """Restore conversations from a snapshot, skipping expired ones and keys already in memory."""
+        path = path or self.snapshot_path
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "rb") as f:
+                version, records = marshal.loads(f.read())
+        except (EOFError, ValueError, TypeError):
+            logger.warning("Ignoring unreadable conversation snapshot %s", path)
+            return 0
+        if version != SNAPSHOT_VERSION:
+            logger.warning("Ignoring conversation snapshot %s with version %s", path, version)
+            return 0
+        # Half the load time would otherwise go to cyclic collections over the new records
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._restore(records, self.clock())
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _restore(self, records: list, now: float) -> int:
+        loaded = 0
+        with self._lock:
+            for org_id, channel, customer_id, *fields in records:
+                key = (org_id, sys.intern(channel), customer_id)
+                if now - fields[-1] > self.ttl or key in self._states:
+                    continue
+                state = self._states[key] = ConversationState(*fields)
+                self._bytes += _entry_bytes(key, state)
+                loaded += 1
+            if loaded != len(self._states):
+                # Snapshots are written oldest first; only a merge with live entries needs reordering
+                self._states = OrderedDict(sorted(self._states.items(), key=lambda item: item[1].updated_at))
+            self._evict(now)
+        return loaded
+
+    # Background snapshots
+    def run(self, interval: float = 30.0) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.expire()
+                if self._writes:
+                    self.snapshot()
+            except Exception:
+                logger.exception("Conversation snapshot failed")
+
+    def start(self, **kwargs) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, kwargs=kwargs, name="conversation-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.snapshot()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            counters.update(conversations=len(self._states), estimated_bytes=self._bytes,
+                            max_bytes=self.max_bytes, unsaved_writes=self._writes)
+        return counters
+
+# Process-wide store for the chat booking flow
+conversation_store = ConversationStore()
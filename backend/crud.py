@@ -1,12 +1,26 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select, update, text
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import json
 
 from models import *
 from schemas import *
 from auth import get_password_hash
+from reminders import on_appointment_changed, on_configuration_changed
+from archive import archived_totals, archived_message_count, get_archived_message
+from dedupe import recent_message_ids
+from events import publish_appointments, publish_messages
+from sketches import response_time_report, sketch_recorder, unique_customer_counts, unique_customers_report
+from customers import resolve_customer
+from intents import intent_router
+from changes import bump
+
+def response_columns(model, schema) -> list:
+    """Model columns named by a response schema, for ORM-free projected reads."""
+    return [getattr(model, field) for field in schema.model_fields]
 
 # User CRUD operations
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
@@ -15,7 +29,7 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate) -> User:
+def create_user(db: Session, user: UserCreate, commit: bool = True) -> User:
     hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
@@ -25,8 +39,10 @@ def create_user(db: Session, user: UserCreate) -> User:
         organization_id=user.organization_id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     return db_user
 
 # Organization CRUD operations
@@ -44,10 +60,9 @@ def create_organization(db: Session, org: OrganizationCreate) -> Organization:
         subscription_status="active"
     )
     db.add(db_org)
-    db.commit()
-    db.refresh(db_org)
+    db.flush()
     
-    # Create admin user
+    # Create admin user in the same transaction
     admin_user = UserCreate(
         email=org.admin_email,
         name=org.admin_name,
@@ -55,7 +70,8 @@ def create_organization(db: Session, org: OrganizationCreate) -> Organization:
         role=UserRole.ORG_ADMIN,
         organization_id=db_org.id
     )
-    create_user(db, admin_user)
+    create_user(db, admin_user, commit=False)
+    db.commit()
     
     return db_org
 
@@ -68,6 +84,7 @@ def update_organization(db: Session, org_id: int, org_update: OrganizationUpdate
     for field, value in update_data.items():
         setattr(db_org, field, value)
     
+    bump(db, org_id, "organization")
     db.commit()
     db.refresh(db_org)
     return db_org
@@ -79,8 +96,10 @@ def get_organization_config(db: Session, org_id: int) -> Optional[Configuration]
 def create_configuration(db: Session, config: ConfigurationCreate) -> Configuration:
     db_config = Configuration(**config.dict())
     db.add(db_config)
+    bump(db, db_config.organization_id, "config")
     db.commit()
-    db.refresh(db_config)
+    on_configuration_changed(db_config.organization_id, db_config.appointment_settings)
+    intent_router.invalidate(db_config.organization_id)
     return db_config
 
 def update_configuration(db: Session, org_id: int, config_update: ConfigurationUpdate) -> Optional[Configuration]:
@@ -92,19 +111,26 @@ def update_configuration(db: Session, org_id: int, config_update: ConfigurationU
     for field, value in update_data.items():
         setattr(db_config, field, value)
     
+    bump(db, org_id, "config")
     db.commit()
     db.refresh(db_config)
+    on_configuration_changed(org_id, db_config.appointment_settings)
+    intent_router.invalidate(org_id)
     return db_config
 
 # Document CRUD operations
-def get_organization_documents(db: Session, org_id: int) -> List[Document]:
-    return db.query(Document).filter(Document.organization_id == org_id).all()
+def get_organization_documents(db: Session, org_id: int, since: Optional[int] = None) -> List[Document]:
+    """All of a tenant's documents, or with `since` only those written after that change version."""
+    query = db.query(Document).filter(Document.organization_id == org_id)
+    if since is not None:
+        query = query.filter(Document.change_version > since)
+    return query.all()
 
 def create_document(db: Session, doc: DocumentCreate) -> Document:
     db_doc = Document(**doc.dict())
+    db_doc.change_version = bump(db, doc.organization_id, "documents")
     db.add(db_doc)
     db.commit()
-    db.refresh(db_doc)
     return db_doc
 
 def delete_document(db: Session, doc_id: int, org_id: int) -> bool:
@@ -115,42 +141,255 @@ def delete_document(db: Session, doc_id: int, org_id: int) -> bool:
         return False
     
     db.delete(db_doc)
+    bump(db, org_id, "documents", deleted=True)
     db.commit()
     return True
 
 # Service Type CRUD operations
-def get_organization_service_types(db: Session, org_id: int) -> List[ServiceType]:
-    return db.query(ServiceType).filter(ServiceType.organization_id == org_id).all()
+def get_organization_service_types(db: Session, org_id: int, since: Optional[int] = None) -> List[ServiceType]:
+    """All of a tenant's service types, or with `since` only those written after that change version."""
+    query = db.query(ServiceType).filter(ServiceType.organization_id == org_id)
+    if since is not None:
+        query = query.filter(ServiceType.change_version > since)
+    return query.all()
 
 def create_service_type(db: Session, service: ServiceTypeCreate) -> ServiceType:
     db_service = ServiceType(**service.dict())
+    db_service.change_version = bump(db, service.organization_id, "service_types")
     db.add(db_service)
     db.commit()
-    db.refresh(db_service)
     return db_service
 
 # Appointment CRUD operations
+APPOINTMENT_RESPONSE_COLUMNS = response_columns(Appointment, AppointmentResponse)
+
 def get_organization_appointments(db: Session, org_id: int) -> List[Appointment]:
     return db.query(Appointment).filter(Appointment.organization_id == org_id).all()
 
+def list_organization_appointments(db: Session, org_id: int, start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None, since: Optional[int] = None) -> List[Row]:
+    """Appointment rows with only the AppointmentResponse columns, without ORM entities.
+
+    With a window, only appointments in [start, end), ordered by appointment_date.
+    With `since`, only appointments written after that change version.
+    """
+    query = select(*APPOINTMENT_RESPONSE_COLUMNS).where(Appointment.organization_id == org_id)
+    if since is not None:
+        query = query.where(Appointment.change_version > since)
+    if start is not None or end is not None:
+        if start is not None:
+            query = query.where(Appointment.appointment_date >= start)
+        if end is not None:
+            query = query.where(Appointment.appointment_date < end)
+        query = query.order_by(Appointment.appointment_date, Appointment.id)
+    return db.execute(query).all()
+
+def appointment_buckets(db: Session, org_id: int, start: datetime, end: datetime,
+                        granularity: str = "day") -> List[Dict[str, Any]]:
+    """Appointment counts per day or week (starting Monday) in [start, end), by status and service type."""
+    day = func.date(Appointment.appointment_date) if db.bind.dialect.name == "sqlite" \
+        else func.to_char(Appointment.appointment_date, "YYYY-MM-DD")
+    rows = db.execute(
+        select(day, Appointment.status, Appointment.service_type_id, func.count())
+        .where(Appointment.organization_id == org_id,
+               Appointment.appointment_date >= start, Appointment.appointment_date < end)
+        .group_by(day, Appointment.status, Appointment.service_type_id)
+    ).all()
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for day_key, status, service_type_id, count in rows:
+        period = datetime.fromisoformat(day_key).date()
+        if granularity == "week":
+            period -= timedelta(days=period.weekday())
+        bucket = buckets.setdefault(period.isoformat(), {
+            "period": period.isoformat(), "total": 0, "by_status": {}, "by_service_type": {}
+        })
+        bucket["total"] += count
+        bucket["by_status"][status] = bucket["by_status"].get(status, 0) + count
+        service_key = str(service_type_id)
+        bucket["by_service_type"][service_key] = bucket["by_service_type"].get(service_key, 0) + count
+    return [buckets[key] for key in sorted(buckets)]
+
 def create_appointment(db: Session, appointment: AppointmentCreate) -> Appointment:
     db_appointment = Appointment(**appointment.dict())
+    # Resolved in the appointment's transaction, so a failed booking leaves no orphan customer
+    db_appointment.customer_id = resolve_customer(db, appointment.organization_id, phone=appointment.customer_phone,
+                                                  email=appointment.customer_email, name=appointment.customer_name,
+                                                  commit=False)
+    db_appointment.change_version = bump(db, appointment.organization_id, "appointments")
     db.add(db_appointment)
     db.commit()
-    db.refresh(db_appointment)
+    on_appointment_changed(db_appointment)
+    publish_appointments(db_appointment.organization_id, "created", [db_appointment])
     return db_appointment
 
+BULK_UPDATE_BATCH_SIZE = 500
+# What the reminder scheduler and live updates need about an updated appointment
+UPDATED_APPOINTMENT_COLUMNS = (Appointment.id, Appointment.organization_id, Appointment.service_type_id,
+                               Appointment.appointment_date, Appointment.status, Appointment.customer_name,
+                               Appointment.customer_phone, Appointment.channel)
+
+def bulk_update_appointments(db: Session, org_id: int, changes: AppointmentBulkUpdate) -> Dict[str, Any]:
+    """Apply one set of changes to many appointments of a tenant, one UPDATE per batch, one transaction.
+
+    Appointments are picked by `ids` or, without ids, by an appointment_date window
+    and optional current status, read in id order a batch at a time. Ids that do not
+    belong to the tenant are reported as not_found.
+    """
+    values = {}
+    if changes.status is not None:
+        values["status"] = changes.status.value
+    if changes.notes is not None:
+        values["notes"] = changes.notes
+    if changes.appointment_date is not None:
+        values["appointment_date"] = changes.appointment_date
+    elif changes.shift_minutes:
+        if db.bind.dialect.name == "sqlite":
+            # Whole minutes move: keep the stored seconds and microseconds text as-is
+            values["appointment_date"] = func.strftime(
+                "%Y-%m-%d %H:%M:", Appointment.appointment_date, f"{changes.shift_minutes:+d} minutes"
+            ).concat(func.substr(Appointment.appointment_date, 18))
+        else:
+            values["appointment_date"] = Appointment.appointment_date + text(
+                f"interval '{changes.shift_minutes:d} minutes'")
+
+    values["change_version"] = bump(db, org_id, "appointments")
+    statement = update(Appointment).values(**values).returning(*UPDATED_APPOINTMENT_COLUMNS) \
+        .execution_options(synchronize_session=False)
+    updated = []
+    if changes.ids is not None:
+        ids = list(dict.fromkeys(changes.ids))
+        for i in range(0, len(ids), BULK_UPDATE_BATCH_SIZE):
+            updated.extend(db.execute(statement.where(
+                Appointment.organization_id == org_id, Appointment.id.in_(ids[i:i + BULK_UPDATE_BATCH_SIZE])
+            )).all())
+    else:
+        ids = None
+        criteria = [Appointment.organization_id == org_id,
+                    Appointment.appointment_date >= changes.start, Appointment.appointment_date < changes.end]
+        if changes.current_status is not None:
+            criteria.append(Appointment.status == changes.current_status.value)
+        # Keyset batches: rows already updated may have left the window, so move on by id
+        last_id = 0
+        while True:
+            batch = db.execute(select(Appointment.id).where(*criteria, Appointment.id > last_id)
+                               .order_by(Appointment.id).limit(BULK_UPDATE_BATCH_SIZE)).scalars().all()
+            if not batch:
+                break
+            updated.extend(db.execute(statement.where(
+                Appointment.organization_id == org_id, Appointment.id.in_(batch)
+            )).all())
+            last_id = batch[-1]
+    db.commit()
+
+    for row in updated:
+        on_appointment_changed(row)
+    if updated:
+        publish_appointments(org_id, "updated", updated)
+    outcomes = {row.id: "updated" for row in updated}
+    for appointment_id in ids or []:
+        outcomes.setdefault(appointment_id, "not_found")
+    return {"requested": len(ids) if ids is not None else len(updated), "rows_affected": len(updated),
+            "outcomes": outcomes}
+
 # Message CRUD operations
+MESSAGE_RESPONSE_COLUMNS = response_columns(Message, MessageResponse)
+
 def get_organization_messages(db: Session, org_id: int) -> List[Message]:
     return db.query(Message).filter(Message.organization_id == org_id).all()
 
-def create_message(db: Session, message: MessageCreate) -> Message:
+def list_organization_messages(db: Session, org_id: int) -> List[Row]:
+    """Message rows with only the MessageResponse columns, without ORM entities."""
+    return db.execute(
+        select(*MESSAGE_RESPONSE_COLUMNS).where(Message.organization_id == org_id)
+    ).all()
+
+def _resolve_sender(db: Session, message: MessageCreate) -> None:
+    """Put the message's sender in the customer directory (a cache hit for known senders).
+
+    Resolved in the message's transaction, before the row is added, so both commit together.
+    """
+    if message.customer_id:
+        resolve_customer(db, message.organization_id, channel=message.channel, handle=message.customer_id,
+                         commit=False)
+
+def _store_message(db: Session, message: MessageCreate) -> Tuple[Optional[Message], int]:
+    """(new row, id), or (None, id of the original) when external_id was already ingested."""
+    if message.external_id is None:
+        _resolve_sender(db, message)
+        db_message = Message(**message.dict())
+        db.add(db_message)
+        db.commit()
+        publish_messages(db_message.organization_id, [db_message])
+        sketch_recorder.record_messages([db_message])
+        return db_message, db_message.id
+
+    key = (message.organization_id, message.channel, message.external_id)
+    existing_id = recent_message_ids.get(key)
+    if existing_id is not None:
+        return None, existing_id
+    # The unique index no longer covers originals that were archived
+    archived = db.get(ArchivedMessageKey, key)
+    if archived is not None:
+        recent_message_ids.record_database_hit(key, archived.message_id)
+        return None, archived.message_id
+
+    _resolve_sender(db, message)
     db_message = Message(**message.dict())
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing_id = db.execute(
+            select(Message.id).where(
+                Message.organization_id == message.organization_id,
+                Message.channel == message.channel,
+                Message.external_id == message.external_id,
+            )
+        ).scalar()
+        if existing_id is None:
+            raise
+        recent_message_ids.record_database_hit(key, existing_id)
+        return None, existing_id
+    recent_message_ids.add(key, db_message.id)
+    publish_messages(db_message.organization_id, [db_message])
+    sketch_recorder.record_messages([db_message])
+    return db_message, db_message.id
+
+def create_message(db: Session, message: MessageCreate) -> Message:
+    """Insert a message; a retried delivery with the same external_id returns the original."""
+    db_message, message_id = _store_message(db, message)
+    if db_message is None:
+        db_message = db.get(Message, message_id)
+    if db_message is None:
+        record = get_archived_message(message.organization_id, message_id)
+        if record is not None:
+            # Answered from the archive; never added to the session
+            return Message(**record)
+        # The remembered original was deleted: forget it and store this one
+        recent_message_ids.discard((message.organization_id, message.channel, message.external_id))
+        db_message, message_id = _store_message(db, message)
+        if db_message is None:
+            db_message = db.get(Message, message_id)
     return db_message
 
+# Customer directory
+def get_customer_detail(db: Session, org_id: int, customer_id: int) -> Optional[Dict[str, Any]]:
+    """A tenant's customer with their channel handles and appointments (newest first)."""
+    customer = db.execute(select(*response_columns(Customer, CustomerResponse))
+                          .where(Customer.id == customer_id, Customer.organization_id == org_id)).first()
+    if customer is None:
+        return None
+    handles = db.execute(select(CustomerHandle.channel, CustomerHandle.handle)
+                         .where(CustomerHandle.customer_id == customer_id)
+                         .order_by(CustomerHandle.channel, CustomerHandle.handle)).all()
+    appointments = db.execute(select(*APPOINTMENT_RESPONSE_COLUMNS)
+                              .where(Appointment.organization_id == org_id, Appointment.customer_id == customer_id)
+                              .order_by(Appointment.appointment_date.desc(), Appointment.id.desc())).all()
+    return {**customer._mapping, "handles": [row._mapping for row in handles],
+            "appointments": [row._mapping for row in appointments]}
+
 # Analytics functions
 def get_analytics_data(db: Session, org_id: int) -> Dict[str, Any]:
     # Get basic counts
@@ -173,6 +412,12 @@ def get_analytics_data(db: Session, org_id: int) -> Dict[str, Any]:
     
     channel_breakdown = {channel: count for channel, count in channel_data}
     
+    # Include messages moved to the archive tier
+    archived = archived_totals(org_id)
+    total_messages += archived['count']
+    for channel, count in archived['channels'].items():
+        channel_breakdown[channel] = channel_breakdown.get(channel, 0) + count
+    
     # Appointment status breakdown
     status_data = db.query(
         Appointment.status,
@@ -214,6 +459,7 @@ def get_analytics_data(db: Session, org_id: int) -> Dict[str, Any]:
     # Monthly trends (last 6 months)
     six_months_ago = datetime.utcnow() - timedelta(days=180)
     monthly_data = []
+    windows = []
     for i in range(6):
         month_start = datetime.utcnow().replace(day=1) - timedelta(days=30*i)
         month_end = month_start + timedelta(days=30)
@@ -224,7 +470,7 @@ def get_analytics_data(db: Session, org_id: int) -> Dict[str, Any]:
                 Message.created_at >= month_start,
                 Message.created_at < month_end
             )
-        ).count()
+        ).count() + archived_message_count(org_id, month_start, month_end)
         
         month_appointments = db.query(Appointment).filter(
             and_(
@@ -239,12 +485,26 @@ def get_analytics_data(db: Session, org_id: int) -> Dict[str, Any]:
             'messages': month_messages,
             'appointments': month_appointments
         })
+        windows.append((month_start.date(), month_end.date()))
+    
+    # Distinct customers per month, from one read of the sketches covering all six
+    for month, count in zip(monthly_data, unique_customer_counts(db, org_id, windows)):
+        month['unique_customers'] = count
+    
+    # Response-time percentiles (last 30 days) from the per-day sketches
+    today = datetime.utcnow().date()
+    response_time_percentiles = response_time_report(db, org_id, today - timedelta(days=29), today + timedelta(days=1))
+    
+    # Distinct customers (last 30 days, per day) from the HyperLogLog sketches
+    unique_customers = unique_customers_report(db, org_id, today - timedelta(days=29), today + timedelta(days=1))
     
     return {
         'total_messages': total_messages,
         'total_appointments': total_appointments,
         'active_users': active_users,
         'avg_response_time': round(avg_response_time, 2),
+        'response_time_percentiles': response_time_percentiles,
+        'unique_customers': unique_customers,
         'channel_breakdown': channel_breakdown,
         'appointment_status_breakdown': appointment_status_breakdown,
         'daily_activity': daily_activity,
@@ -258,7 +518,7 @@ def get_platform_analytics_data(db: Session) -> Dict[str, Any]:
         Organization.subscription_status == 'active'
     ).count()
     total_users = db.query(User).count()
-    total_messages = db.query(Message).count()
+    total_messages = db.query(Message).count() + archived_totals()['count']
     total_appointments = db.query(Appointment).count()
     
     # Top performing organizations
@@ -279,11 +539,17 @@ def get_platform_analytics_data(db: Session) -> Dict[str, Any]:
         for name, msg_count, apt_count in top_orgs
     ]
     
+    today = datetime.utcnow().date()
+    response_time_percentiles = response_time_report(db, None, today - timedelta(days=29), today + timedelta(days=1))
+    unique_customers = unique_customers_report(db, None, today - timedelta(days=29), today + timedelta(days=1))
+    
     return {
         'total_organizations': total_organizations,
         'active_organizations': active_organizations,
         'total_users': total_users,
         'total_messages': total_messages,
         'total_appointments': total_appointments,
+        'response_time_percentiles': response_time_percentiles,
+        'unique_customers': unique_customers,
         'top_organizations': top_organizations
     }
\ No newline at end of file
@@ -0,0 +1,383 @@
+"""Per-tenant customer directory, looked up by phone, email or channel handle.
+
+Appointments carry free-text customer details and messages only the sender id
+a channel hands us, so answering "who is this WhatsApp sender and what have
+they booked" used to mean scanning both tables. Each tenant's customers are
+now rows keyed by a normalized phone, a normalized email and any number of
+(channel, handle) pairs, each behind a per-tenant unique index. On phone
+channels (WhatsApp, SMS) the handle is the phone number, so a sender resolves
+to the customer who booked with that number.
+
+Message and appointment writes upsert through `resolve_customer`. The inbound
+path is served from a bounded LRU of lookup key -> customer id, so a known
+sender costs no query, and a known customer who already has a name costs an
+appointment booking no query either. Customers are never deleted and an id is
+cached only once its rows are committed, so cached ids do not go stale.
+
+    python customers.py --backfill [--org-id 3]
+"""
+import argparse
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from changes import bump
+from database import SessionLocal
+from models import Appointment, Customer, CustomerHandle, Message
+
+DEFAULT_COUNTRY_CODE = os.getenv("CUSTOMER_DEFAULT_COUNTRY_CODE", "91")
+CACHE_CAPACITY = int(os.getenv("CUSTOMER_CACHE_CAPACITY", 100_000))
+PHONE_CHANNELS = {"whatsapp", "sms"}
+BACKFILL_BATCH_SIZE = 1000
+
+# ("handle", channel, handle), ("phone", phone) or ("email", email)
+Identifier = Tuple[str, ...]
+
+# Normalization
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """E.164-style +<digits>; national numbers get DEFAULT_COUNTRY_CODE. None if it is not a phone number."""
+    if not value:
+        return None
+    digits = re.sub(r"\D", "", value)
+    if value.lstrip().startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif DEFAULT_COUNTRY_CODE and len(digits) == 11 and digits.startswith("0"):
+        digits = DEFAULT_COUNTRY_CODE + digits[1:]
+    elif DEFAULT_COUNTRY_CODE and len(digits) == 10:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().lower()
+    return value if "@" in value else None
+
+def normalize_handle(channel: str, handle: Optional[str]) -> Optional[str]:
+    """Sender id as stored in customer_handles; phone channels use the normalized number."""
+    handle = (handle or "").strip()
+    if not handle:
+        return None
+    if channel in PHONE_CHANNELS:
+        return normalize_phone(handle) or handle
+    return handle
+
+def customer_identifiers(channel: Optional[str] = None, handle: Optional[str] = None, phone: Optional[str] = None,
+                         email: Optional[str] = None) -> List[Identifier]:
+    """Normalized identifiers, most specific first."""
+    identifiers = []
+    handle = normalize_handle(channel, handle) if channel else None
+    if handle:
+        identifiers.append(("handle", channel, handle))
+    phone = normalize_phone(phone)
+    if phone is None and channel in PHONE_CHANNELS and handle and handle.startswith("+"):
+        phone = handle
+    if phone:
+        identifiers.append(("phone", phone))
+    email = normalize_email(email)
+    if email:
+        identifiers.append(("email", email))
+    return identifiers
+
+# Lookup cache
+class CustomerCache:
+    """Thread-safe LRU of (organization_id, *identifier) -> (customer id, whether the customer has a name)."""
+
+    def __init__(self, capacity: int = CACHE_CAPACITY):
+        self.capacity = capacity
+        self._ids: "OrderedDict[Hashable, Tuple[int, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0}
+
+    def lookup(self, key: Hashable) -> Optional[Tuple[int, bool]]:
+        with self._lock:
+            self.counters["lookups"] += 1
+            entry = self._ids.get(key)
+            if entry is not None:
+                self._ids.move_to_end(key)
+                self.counters["hits"] += 1
+            return entry
+
+    def get(self, key: Hashable) -> Optional[int]:
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else None
+
+    def add(self, keys: Iterable[Hashable], customer_id: int, named: bool = False) -> None:
+        with self._lock:
+            for key in keys:
+                previous = self._ids.get(key)
+                self._ids[key] = (customer_id, named or (previous is not None and previous == (customer_id, True)))
+                self._ids.move_to_end(key)
+            while len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        counters.update(size=len(self._ids), capacity=self.capacity,
+                        hit_rate=counters["hits"] / counters["lookups"] if counters["lookups"] else 0.0)
+        return counters
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self.counters = {"lookups": 0, "hits": 0}
+
+# Shared by every request handled in this process
+customer_cache = CustomerCache()
+
+# Ids resolved in a session's open transaction, cached once it commits
+_PENDING = "customers.resolved"
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed(session: Session) -> None:
+    for keys, customer_id, named in session.info.pop(_PENDING, ()):
+        customer_cache.add(keys, customer_id, named)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING, None)
+
+# Resolution
+def _match(org_id: int, identifier: Identifier):
+    if identifier[0] == "handle":
+        return select(CustomerHandle.customer_id).where(CustomerHandle.organization_id == org_id,
+                                                        CustomerHandle.channel == identifier[1],
+                                                        CustomerHandle.handle == identifier[2])
+    column = getattr(Customer, identifier[0])
+    return select(Customer.id).where(Customer.organization_id == org_id, column == identifier[1])
+
+def _attach(db: Session, org_id: int, customer_id: int, identifier: Identifier) -> bool:
+    """Give the customer an identifier nobody in the tenant owns yet; True if it is now theirs."""
+    if identifier[0] == "handle":
+        # Handles are always looked up first, so this one was free a moment ago
+        db.execute(insert(CustomerHandle).values(organization_id=org_id, channel=identifier[1],
+                                                 handle=identifier[2], customer_id=customer_id))
+        return True
+    column = getattr(Customer, identifier[0])
+    taken = _match(org_id, identifier).exists()
+    updated = db.execute(update(Customer).where(Customer.id == customer_id, column.is_(None), ~taken)
+                         .values({identifier[0]: identifier[1]})
+                         .execution_options(synchronize_session=False)).rowcount
+    return updated == 1 or db.execute(_match(org_id, identifier)).scalar() == customer_id
+
+def _resolve_in_db(db: Session, org_id: int, identifiers: List[Identifier],
+                   name: Optional[str]) -> Tuple[int, List[Identifier]]:
+    """(customer id, identifiers that now point at it), creating or completing the customer.
+
+    Raises IntegrityError if a concurrent writer claims one of the identifiers first.
+    """
+    matches: Dict[Identifier, Optional[int]] = {}
+    customer_id = None
+    for identifier in identifiers:
+        customer_id = matches[identifier] = db.execute(_match(org_id, identifier)).scalar()
+        if customer_id is not None:
+            break
+
+    if customer_id is None:
+        fields = {identifier[0]: identifier[1] for identifier in identifiers if identifier[0] != "handle"}
+        customer_id = db.execute(insert(Customer).values(organization_id=org_id, name=name, **fields)
+                                 .returning(Customer.id)).scalar()
+        matches.update((identifier, customer_id) for identifier in identifiers if identifier[0] != "handle")
+    elif name:
+        db.execute(update(Customer).where(Customer.id == customer_id, Customer.name.is_(None))
+                   .values(name=name).execution_options(synchronize_session=False))
+
+    owned = [identifier for identifier in identifiers
+             if matches.get(identifier) == customer_id or _attach(db, org_id, customer_id, identifier)]
+    return customer_id, owned
+
+def resolve_customer(db: Session, org_id: int, channel: Optional[str] = None, handle: Optional[str] = None,
+                     phone: Optional[str] = None, email: Optional[str] = None,
+                     name: Optional[str] = None, commit: bool = True) -> Optional[int]:
+    """Id of the tenant's customer with any of these identifiers, creating or completing it as needed.
+
+    Matches by handle, then phone, then email. Identifiers the customer lacks are
+    attached unless another customer already owns them; two existing customers
+    are never merged. A name only fills in a missing one, so a write carrying a
+    name is served from the cache only once the customer is known to have one.
+    The identifiers that point at the customer are cached when the transaction
+    commits. With commit=False the caller commits, together with its own rows;
+    call it before the transaction's other writes, since losing a race with a
+    concurrent writer rolls the transaction back. Returns None when nothing
+    identifies the customer.
+    """
+    identifiers = customer_identifiers(channel, handle, phone, email)
+    if not identifiers:
+        return None
+    cached = [customer_cache.lookup((org_id,) + identifier) for identifier in identifiers]
+    if None not in cached and len({customer_id for customer_id, _ in cached}) == 1:
+        if not name or any(named for _, named in cached):
+            return cached[0][0]
+
+    try:
+        customer_id, owned = _resolve_in_db(db, org_id, identifiers, name)
+    except IntegrityError:
+        # A concurrent writer claimed an identifier after our guard; its row is visible now
+        db.rollback()
+        customer_id, owned = _resolve_in_db(db, org_id, identifiers, name)
+    db.info.setdefault(_PENDING, []).append(([(org_id,) + identifier for identifier in owned], customer_id, bool(name)))
+    if commit:
+        db.commit()
+    return customer_id
+
+def find_customer_id(db: Session, org_id: int, channel: Optional[str] = None, handle: Optional[str] = None,
+                     phone: Optional[str] = None, email: Optional[str] = None) -> Optional[int]:
+    """Read-only lookup through the cache; None if no customer has any of the identifiers."""
+    for identifier in customer_identifiers(channel, handle, phone, email):
+        key = (org_id,) + identifier
+        customer_id = customer_cache.get(key)
+        if customer_id is None:
+            customer_id = db.execute(_match(org_id, identifier)).scalar()
+            if customer_id is None:
+                continue
+            customer_cache.add([key], customer_id)
+        return customer_id
+    return None
+
+def handles_by_phone(db: Session, channel: str, phones: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], str]:
+    """(org id, phone as given) -> the customer's handle on `channel`, for customers that have one."""
+    wanted = {}
+    for org_id, phone in phones:
+        normalized = normalize_phone(phone)
+        if normalized:
+            wanted.setdefault((org_id, normalized), []).append((org_id, phone))
+    if not wanted:
+        return {}
+    rows = db.execute(
+        select(Customer.organization_id, Customer.phone, func.min(CustomerHandle.handle))
+        .join(CustomerHandle, CustomerHandle.customer_id == Customer.id)
+        .where(CustomerHandle.channel == channel,
+               Customer.organization_id.in_({org_id for org_id, _ in wanted}),
+               Customer.phone.in_({phone for _, phone in wanted}))
+        .group_by(Customer.organization_id, Customer.phone)
+    )
+    return {given: handle for org_id, phone, handle in rows for given in wanted.get((org_id, phone), [])}
+
+# Backfill
+def _backfill_organization(db: Session, org_id: int) -> Tuple[int, int]:
+    """Resolve a tenant's appointments and senders in memory, then write the directory in bulk.
+
+    Applies the same rules as resolve_customer. New customers get negative
+    placeholder ids until their rows are inserted.
+    """
+    from archive import iter_archived_messages
+
+    customers: Dict[int, dict] = {}
+    owners: Dict[Identifier, int] = {}
+    for customer_id, name, phone, email in db.execute(select(Customer.id, Customer.name, Customer.phone, Customer.email)
+                                                      .where(Customer.organization_id == org_id)):
+        customers[customer_id] = {"id": customer_id, "name": name, "phone": phone, "email": email}
+        owners.update({("phone", phone): customer_id} if phone else {})
+        owners.update({("email", email): customer_id} if email else {})
+    for channel, handle, customer_id in db.execute(select(CustomerHandle.channel, CustomerHandle.handle,
+                                                          CustomerHandle.customer_id)
+                                                   .where(CustomerHandle.organization_id == org_id)):
+        owners[("handle", channel, handle)] = customer_id
+    new_rows, changed, new_handles = [], set(), []
+
+    def claim(identifiers: List[Identifier], name: Optional[str] = None) -> Optional[int]:
+        if not identifiers:
+            return None
+        customer_id = next((owners[identifier] for identifier in identifiers if identifier in owners), None)
+        if customer_id is None:
+            customer_id = -len(new_rows) - 1
+            customers[customer_id] = {"organization_id": org_id, "name": name, "phone": None, "email": None}
+            new_rows.append(customers[customer_id])
+        row = customers[customer_id]
+        if name and row["name"] is None:
+            row["name"] = name
+            changed.add(customer_id)
+        for identifier in identifiers:
+            if identifier in owners:
+                continue
+            if identifier[0] == "handle":
+                new_handles.append((identifier, customer_id))
+            elif row[identifier[0]] is None:
+                row[identifier[0]] = identifier[1]
+                changed.add(customer_id)
+            else:
+                continue
+            owners[identifier] = customer_id
+        return customer_id
+
+    links = []
+    for appointment_id, name, phone, email in db.execute(
+            select(Appointment.id, Appointment.customer_name, Appointment.customer_phone, Appointment.customer_email)
+            .where(Appointment.organization_id == org_id, Appointment.customer_id.is_(None))):
+        customer_id = claim(customer_identifiers(phone=phone, email=email), name)
+        if customer_id is not None:
+            links.append((appointment_id, customer_id))
+    senders = set(db.execute(select(Message.channel, Message.customer_id).distinct()
+                             .where(Message.organization_id == org_id, Message.customer_id.isnot(None))).all())
+    senders.update((record["channel"], record["customer_id"]) for record in iter_archived_messages(org_id)
+                   if record["customer_id"] is not None)
+    for channel, handle in senders:
+        claim(customer_identifiers(channel, handle))
+
+    ids = {}
+    if new_rows:
+        inserted = db.execute(insert(Customer).returning(Customer.id, sort_by_parameter_order=True), new_rows)
+        ids = {-position - 1: customer_id for position, customer_id in enumerate(inserted.scalars())}
+    updates = [customers[customer_id] for customer_id in changed if customer_id > 0]
+    if updates:
+        db.execute(update(Customer), updates)
+    if new_handles:
+        db.execute(insert(CustomerHandle), [
+            {"organization_id": org_id, "channel": identifier[1], "handle": identifier[2],
+             "customer_id": ids.get(customer_id, customer_id)} for identifier, customer_id in new_handles])
+    version = bump(db, org_id, "appointments") if links else None
+    for start in range(0, len(links), BACKFILL_BATCH_SIZE):
+        db.execute(update(Appointment), [{"id": appointment_id, "customer_id": ids.get(customer_id, customer_id),
+                                          "change_version": version}
+                                         for appointment_id, customer_id in links[start:start + BACKFILL_BATCH_SIZE]])
+    db.commit()
+    return len(links), len(new_handles)
+
+def backfill_customers(db: Session, org_ids: List[int]) -> Dict[str, int]:
+    """Build the directory from existing appointments and both message tiers, one transaction per tenant.
+
+    Appointments go first since they carry names, phones and emails; message
+    senders are then matched to them by phone on phone channels. Linked
+    appointments and known handles are skipped, so the backfill can run
+    alongside live writes and be rerun. Returns how many appointments were
+    linked and how many handles were added.
+    """
+    totals = {"appointments": 0, "handles": 0}
+    for org_id in org_ids:
+        try:
+            appointments, handles = _backfill_organization(db, org_id)
+        except IntegrityError:
+            # A live write created one of the customers first; the rerun picks it up
+            db.rollback()
+            appointments, handles = _backfill_organization(db, org_id)
+        totals["appointments"] += appointments
+        totals["handles"] += handles
+    return totals
+
+if __name__ == "__main__":
+    from models import Organization
+
+    parser = argparse.ArgumentParser(description="Build the customer directory from stored rows")
+    parser.add_argument("--backfill", action="store_true", help="link appointments and message senders to customers")
+    parser.add_argument("--org-id", type=int, action="append", help="organization to backfill (default: all)")
+    args = parser.parse_args()
+    if args.backfill:
+        db = SessionLocal()
+        try:
+            org_ids = args.org_id or list(db.execute(select(Organization.id)).scalars())
+            totals = backfill_customers(db, org_ids)
+            print(f"Linked {totals['appointments']} appointments and {totals['handles']} sender handles")
+        finally:
+            db.close()
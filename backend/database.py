@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -6,22 +6,99 @@ import os
 # Database URL
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ai_assistant.db")
 
+# Connection pool settings for server databases
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": True,
+}
+
+# Engine profiles, selected with DB_PROFILE (defaults to the URL's backend)
+ENGINE_PROFILES = {
+    "sqlite": {
+        "connect_args": {"check_same_thread": False},
+        "pragmas": {
+            "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 15000)),
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+            # Negative values are KiB, so this is a 64 MiB page cache per connection
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),
+            "temp_store": "MEMORY",
+        },
+    },
+    "postgres": {
+        **POOL_OPTIONS,
+        "connect_args": {
+            "options": "-c statement_timeout={} -c idle_in_transaction_session_timeout={}".format(
+                int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000)),
+                int(os.getenv("DB_IDLE_TX_TIMEOUT_MS", 60000)),
+            )
+        },
+    },
+    # Other server databases: the pool, without backend-specific connect arguments
+    "server": POOL_OPTIONS,
+    # The previous behaviour: library defaults, kept for comparison and debugging
+    "default": {},
+}
+
+def default_profile(url: str) -> str:
+    """Pick the engine profile matching a database URL."""
+    if url.startswith("sqlite"):
+        return "sqlite"
+    return "postgres" if url.startswith("postgresql") else "server"
+
+def _set_sqlite_pragmas(engine, pragmas: dict):
+    """Apply PRAGMAs to every new SQLite connection."""
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def build_engine(url: str, profile: str = None):
+    """Create an engine for a URL using a named profile."""
+    profile = profile or default_profile(url)
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile: {profile}")
+
+    options = dict(ENGINE_PROFILES[profile])
+    pragmas = options.pop("pragmas", None)
+    if profile == "default" and url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+
+    engine = create_engine(url, **options)
+    if pragmas:
+        _set_sqlite_pragmas(engine, pragmas)
+    return engine
+
 # Create engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
+DB_PROFILE = os.getenv("DB_PROFILE") or default_profile(SQLALCHEMY_DATABASE_URL)
+engine = build_engine(SQLALCHEMY_DATABASE_URL, DB_PROFILE)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create SessionLocal class. Objects stay loaded after commit, so creates rely on the
+# server-generated columns SQLAlchemy fetches with INSERT ... RETURNING instead of
+# a refresh SELECT.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
 
+def init_db():
+    """Create missing tables straight from the models (development and tests)."""
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    from search import install_search_index
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        install_search_index(connection)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,79 @@
+"""Duplicate suppression for inbound messages.
+
+Channel providers retry webhooks, so the same provider message id can arrive
+several times within a short window. Recently ingested (organization_id,
+channel, external_id) keys are kept in a bounded LRU map with the id of the
+stored row, so a retry is answered from memory. The unique index on
+messages is the backstop for keys that were evicted or ingested by another
+worker.
+
+An LRU map rather than a Bloom filter: a Bloom hit can be a false positive
+and would still need a database check, while an LRU hit is definite and also
+tells us which row to hand back.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+DEDUPE_CAPACITY = int(os.getenv("INGEST_DEDUPE_CAPACITY", 200_000))
+
+class RecentIdFilter:
+    """Thread-safe LRU of recently seen keys and the row id stored for each."""
+
+    def __init__(self, capacity: int = DEDUPE_CAPACITY):
+        self.capacity = capacity
+        self._ids: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"checked": 0, "memory_hits": 0, "database_hits": 0}
+
+    def get(self, key: Hashable) -> Optional[int]:
+        """Row id for a key seen recently, counting the lookup."""
+        with self._lock:
+            self.counters["checked"] += 1
+            row_id = self._ids.get(key)
+            if row_id is not None:
+                self._ids.move_to_end(key)
+                self.counters["memory_hits"] += 1
+            return row_id
+
+    def add(self, key: Hashable, row_id: int) -> None:
+        with self._lock:
+            self._ids[key] = row_id
+            self._ids.move_to_end(key)
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """Forget a key whose row is gone (archived or deleted)."""
+        with self._lock:
+            self._ids.pop(key, None)
+
+    def record_database_hit(self, key: Hashable, row_id: int) -> None:
+        """A duplicate the filter missed and the unique index caught."""
+        with self._lock:
+            self.counters["database_hits"] += 1
+        self.add(key, row_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        duplicates = counters["memory_hits"] + counters["database_hits"]
+        counters.update(
+            size=len(self._ids),
+            capacity=self.capacity,
+            duplicate_rate=duplicates / counters["checked"] if counters["checked"] else 0.0,
+            memory_hit_rate=counters["memory_hits"] / duplicates if duplicates else 0.0,
+        )
+        return counters
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self.counters = {"checked": 0, "memory_hits": 0, "database_hits": 0}
+
+# Shared by every request handled in this process
+recent_message_ids = RecentIdFilter()
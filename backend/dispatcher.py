@@ -0,0 +1,339 @@
+"""Outbound WhatsApp/Telegram message dispatch.
+
+Messages are queued per (organization, channel) and sent in batches as fast as
+that queue's token bucket allows; the rate comes from the channel config
+(`rate_limit_per_second`, `rate_limit_burst`). Identical messages still waiting
+to be sent are coalesced. Failures are retried with full-jitter exponential
+backoff and moved to the dead-letter table after `max_attempts`. The outgoing
+Message rows for a batch are written in one transaction as soon as the
+provider accepts it.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import insert
+
+from customers import handles_by_phone
+from database import SessionLocal
+from events import MESSAGE_FIELDS, publish_messages
+from models import Configuration, Message, OutboundDeadLetter
+from ratelimit import TokenBucket
+from sketches import sketch_recorder
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_EVENT_COLUMNS = [getattr(Message, field) for field in ("organization_id",) + MESSAGE_FIELDS]
+
+DEFAULT_RATE_PER_SECOND = 20.0
+SETTINGS_TTL = 60.0
+CHANNEL_CONFIG_FIELDS = {"whatsapp": "whatsapp_config", "telegram": "telegram_config"}
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class ProviderError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class OutboundMessage:
+    __slots__ = ("organization_id", "channel", "customer_id", "content", "message_type",
+                 "response_time", "attempts")
+
+    def __init__(self, organization_id, channel, customer_id, content, message_type="text",
+                 response_time=None):
+        self.organization_id = organization_id
+        self.channel = channel
+        self.customer_id = customer_id
+        self.content = content
+        self.message_type = message_type
+        self.response_time = response_time
+        self.attempts = 0
+
+    @property
+    def key(self):
+        return (self.organization_id, self.channel, self.customer_id, self.message_type, self.content)
+
+class HttpChannelProvider:
+    """Channel provider speaking a simple batched JSON API.
+
+    POST {base_url}/v1/{channel}/messages with {"organization_id", "messages": [...]}
+    answers {"results": [{"status": "sent"} | {"status": "failed", "error", "retryable"}]},
+    or 429 with Retry-After when the account is over its rate.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.Client(timeout=timeout, limits=httpx.Limits(max_connections=64))
+
+    def send_batch(self, organization_id: int, channel: str, credentials: dict,
+                   messages: List[OutboundMessage]) -> List[Optional[ProviderError]]:
+        token = credentials.get("authToken") or credentials.get("botToken")
+        try:
+            response = self.client.post(
+                f"{self.base_url}/v1/{channel}/messages",
+                headers={"Authorization": f"Bearer {token}"} if token else {},
+                json={
+                    "organization_id": organization_id,
+                    "messages": [{"to": m.customer_id, "type": m.message_type, "text": m.content} for m in messages],
+                },
+            )
+        except httpx.TransportError as exc:
+            raise ProviderError(str(exc))
+        if response.status_code == 429:
+            raise RateLimited(float(response.headers.get("Retry-After", 1)))
+        if response.status_code >= 500:
+            raise ProviderError(f"Provider error {response.status_code}")
+        if response.status_code >= 400:
+            raise ProviderError(f"Provider rejected batch: {response.status_code} {response.text}", retryable=False)
+        return [
+            None if result.get("status") == "sent"
+            else ProviderError(result.get("error", "failed"), result.get("retryable", True))
+            for result in response.json()["results"]
+        ]
+
+class OutboundDispatcher:
+    def __init__(self, provider, session_factory=SessionLocal, max_batch: int = 50,
+                 max_attempts: int = 5, base_backoff: float = 0.5, max_backoff: float = 60.0,
+                 send_workers: int = 8, default_rate: float = DEFAULT_RATE_PER_SECOND):
+        self.provider = provider
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.default_rate = default_rate
+        self.stats = {"queued": 0, "coalesced": 0, "sent": 0, "batches": 0, "retried": 0,
+                      "rate_limited": 0, "dead_lettered": 0}
+        self._queues: Dict[Tuple[int, str], deque] = {}
+        self._pending = set()
+        self._retries: list = []
+        self._sequence = itertools.count()
+        self._settings: Dict[Tuple[int, str], tuple] = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=send_workers, thread_name_prefix="outbound")
+        self._thread: Optional[threading.Thread] = None
+
+    # Queueing
+    def enqueue(self, organization_id: int, channel: str, customer_id: str, content: str,
+                message_type: str = "text", response_time: Optional[float] = None) -> bool:
+        """Queue a message; returns False when an identical one is already waiting.
+
+        Raises ValueError for a channel the provider does not serve, as the channel is part of its URL.
+        """
+        if channel not in CHANNEL_CONFIG_FIELDS:
+            raise ValueError(f"Unsupported outbound channel: {channel!r}")
+        message = OutboundMessage(organization_id, channel, customer_id, content, message_type, response_time)
+        with self._lock:
+            if message.key in self._pending:
+                self.stats["coalesced"] += 1
+                return False
+            self._pending.add(message.key)
+            self._queues.setdefault((organization_id, channel), deque()).append(message)
+            self.stats["queued"] += 1
+        self._wakeup.set()
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _channel_settings(self, key: Tuple[int, str]):
+        cached = self._settings.get(key)
+        if cached and time.monotonic() - cached[2] < SETTINGS_TTL:
+            return cached[0], cached[1]
+        organization_id, channel = key
+        db = self.session_factory()
+        try:
+            config = db.query(Configuration).filter(Configuration.organization_id == organization_id).first()
+            field = CHANNEL_CONFIG_FIELDS.get(channel)
+            channel_config = (getattr(config, field) if config and field else None) or {}
+        finally:
+            db.close()
+        rate = float(channel_config.get("rate_limit_per_second", self.default_rate))
+        burst = float(channel_config.get("rate_limit_burst", rate))
+        bucket = cached[0] if cached and cached[0].rate == rate and cached[0].capacity == burst \
+            else TokenBucket(rate, burst)
+        self._settings[key] = (bucket, channel_config, time.monotonic())
+        return bucket, channel_config
+
+    # Sending
+    def flush(self) -> float:
+        """Start every batch the buckets allow; returns seconds until more could be sent."""
+        now = time.monotonic()
+        next_wake = 1.0
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now:
+                _, _, message = heapq.heappop(self._retries)
+                self._queues.setdefault((message.organization_id, message.channel), deque()).appendleft(message)
+            if self._retries:
+                next_wake = min(next_wake, self._retries[0][0] - now)
+            keys = [key for key, queue in self._queues.items() if queue and key not in self._in_flight]
+
+        for key in keys:
+            bucket, credentials = self._channel_settings(key)
+            with self._lock:
+                queue = self._queues[key]
+                granted = bucket.acquire_up_to(min(self.max_batch, len(queue)))
+                if not granted:
+                    next_wake = min(next_wake, bucket.wait_time())
+                    continue
+                batch = [queue.popleft() for _ in range(granted)]
+                self._in_flight.add(key)
+            self._executor.submit(self._send, key, batch, bucket, credentials)
+        return max(next_wake, 0.001)
+
+    def _send(self, key, batch: List[OutboundMessage], bucket: TokenBucket, credentials: dict) -> None:
+        try:
+            try:
+                results = self.provider.send_batch(key[0], key[1], credentials, batch)
+            except RateLimited as exc:
+                bucket.pause(exc.retry_after)
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                    self._queues[key].extendleft(reversed(batch))
+                return
+            except ProviderError as exc:
+                results = [exc] * len(batch)
+            except Exception as exc:
+                logger.exception("Outbound batch for %s failed", key)
+                results = [ProviderError(str(exc))] * len(batch)
+            # Messages the provider gave no result for are retried rather than dropped
+            results = list(results[:len(batch)])
+            results += [ProviderError("No result from provider")] * (len(batch) - len(results))
+
+            sent = [m for m, error in zip(batch, results) if error is None]
+            dead = []
+            with self._lock:
+                for message, error in zip(batch, results):
+                    if error is None:
+                        continue
+                    message.attempts += 1
+                    if not error.retryable or message.attempts >= self.max_attempts:
+                        dead.append((message, error))
+                        continue
+                    delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** message.attempts))
+                    heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), message))
+                    self.stats["retried"] += 1
+            try:
+                self._record(sent, dead)
+            except Exception:
+                # The provider already accepted these; resending would duplicate them
+                logger.exception("Recording outbound batch for %s failed", key)
+            with self._lock:
+                for message in sent:
+                    self._pending.discard(message.key)
+                for message, _ in dead:
+                    self._pending.discard(message.key)
+                self.stats["sent"] += len(sent)
+                self.stats["batches"] += 1
+                self.stats["dead_lettered"] += len(dead)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+            self._wakeup.set()
+
+    def _record(self, sent: List[OutboundMessage], dead: list) -> None:
+        """Write the batch's outgoing Message rows and dead letters in one transaction."""
+        if not sent and not dead:
+            return
+        db = self.session_factory()
+        try:
+            stored = []
+            if sent:
+                stored = db.execute(insert(Message).returning(*MESSAGE_EVENT_COLUMNS), [
+                    {"organization_id": m.organization_id, "customer_id": m.customer_id, "channel": m.channel,
+                     "message_type": m.message_type, "content": m.content, "is_from_customer": False,
+                     "response_time": m.response_time}
+                    for m in sent
+                ]).all()
+            if dead:
+                db.execute(insert(OutboundDeadLetter), [
+                    {"organization_id": m.organization_id, "channel": m.channel, "customer_id": m.customer_id,
+                     "message_type": m.message_type, "content": m.content, "attempts": m.attempts,
+                     "error": str(error)}
+                    for m, error in dead
+                ])
+            db.commit()
+        finally:
+            db.close()
+        by_org = {}
+        for row in stored:
+            by_org.setdefault(row.organization_id, []).append(row)
+        for org_id, rows in by_org.items():
+            publish_messages(org_id, rows)
+        sketch_recorder.record_messages(stored)
+
+    # Background loop
+    def run(self) -> None:
+        while not self._stop.is_set():
+            wait = self.flush()
+            self._wakeup.wait(timeout=wait)
+            self._wakeup.clear()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Flush until nothing is pending (for tests and one-shot scripts)."""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            wait = self.flush()
+            self._wakeup.wait(timeout=min(wait, 0.05))
+            self._wakeup.clear()
+        return not self.pending()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="outbound-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+class ReminderChannelSender:
+    """Reminder sender that queues reminders on the outbound dispatcher.
+
+    WhatsApp reminders go to the booking's phone number; Telegram ones to the
+    Telegram handle of the directory customer with that number, if any.
+    Reminders for other channels (e.g. walk-in bookings) are skipped.
+    """
+
+    def __init__(self, dispatcher: OutboundDispatcher):
+        self.dispatcher = dispatcher
+
+    def send_batch(self, reminders) -> None:
+        reminders = [r for r in reminders if r.customer_phone and r.channel in CHANNEL_CONFIG_FIELDS]
+        telegram = [(r.organization_id, r.customer_phone) for r in reminders if r.channel == "telegram"]
+        handles = {}
+        if telegram:
+            db = self.dispatcher.session_factory()
+            try:
+                handles = handles_by_phone(db, "telegram", telegram)
+            finally:
+                db.close()
+        for reminder in reminders:
+            recipient = reminder.customer_phone if reminder.channel != "telegram" \
+                else handles.get((reminder.organization_id, reminder.customer_phone))
+            if recipient is None:
+                continue
+            self.dispatcher.enqueue(
+                reminder.organization_id, reminder.channel, recipient,
+                f"Reminder: {reminder.customer_name}, your appointment is at "
+                f"{reminder.appointment_date:%d %b %Y %H:%M}."
+            )
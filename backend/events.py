@@ -0,0 +1,179 @@
+"""Live dashboard updates: an in-process publish/subscribe hub served as SSE.
+
+crud write paths publish compact deltas per organization: new messages, new or
+updated appointments, and the counter increments they imply. Every open
+dashboard tab holds a Subscription with a bounded buffer. A publish encodes
+the SSE frame once and appends the same bytes to every subscriber of the
+organization. A subscriber whose buffer is full is evicted rather than
+allowed to grow without bound or to slow the publisher. It gets a final
+`evicted` event and the browser's EventSource reconnects and re-fetches.
+Idle streams carry a comment line every HEARTBEAT_SECONDS so proxies keep
+them open and dead clients are noticed.
+
+The hub is per process: a subscriber sees the writes handled by its own
+worker. Writes from background threads (dispatcher, reminders) are handed to
+the event loop with call_soon_threadsafe.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+SUBSCRIBER_BUFFER = int(os.getenv("EVENTS_SUBSCRIBER_BUFFER", 256))
+MAX_SUBSCRIBERS_PER_ORG = int(os.getenv("EVENTS_MAX_SUBSCRIBERS_PER_ORG", 2000))
+
+class Subscription:
+    __slots__ = ("organization_id", "buffer", "max_buffer", "wakeup", "closed", "evicted")
+
+    def __init__(self, organization_id: int, max_buffer: int = SUBSCRIBER_BUFFER):
+        self.organization_id = organization_id
+        self.buffer = deque()
+        self.max_buffer = max_buffer
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.evicted = False
+
+    def push(self, frame: bytes) -> bool:
+        """Queue a frame; False when the buffer is full and the subscriber must go."""
+        if len(self.buffer) >= self.max_buffer:
+            return False
+        self.buffer.append(frame)
+        self.wakeup.set()
+        return True
+
+    def close(self, evicted: bool = False) -> None:
+        self.closed = True
+        self.evicted = evicted
+        self.wakeup.set()
+
+class TooManySubscribers(Exception):
+    pass
+
+class EventHub:
+    def __init__(self, max_buffer: int = SUBSCRIBER_BUFFER, max_per_org: int = MAX_SUBSCRIBERS_PER_ORG):
+        self.max_buffer = max_buffer
+        self.max_per_org = max_per_org
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sequence = 0
+        self.counters = {"published": 0, "delivered": 0, "evicted": 0}
+
+    def subscribe(self, organization_id: int) -> Subscription:
+        """Must be called on the event loop that serves the stream."""
+        self._loop = asyncio.get_running_loop()
+        subscribers = self._subscribers[organization_id]
+        if len(subscribers) >= self.max_per_org:
+            raise TooManySubscribers(organization_id)
+        subscription = Subscription(organization_id, self.max_buffer)
+        subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.organization_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.organization_id]
+
+    def has_subscribers(self, organization_id: int) -> bool:
+        return bool(self._subscribers.get(organization_id))
+
+    def publish(self, organization_id: int, event: str, data: dict) -> None:
+        """Fan an event out to the organization's subscribers; safe from any thread."""
+        if not self.has_subscribers(organization_id) or self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(organization_id, event, data)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, organization_id, event, data)
+
+    def _deliver(self, organization_id: int, event: str, data: dict) -> None:
+        subscribers = self._subscribers.get(organization_id)
+        if not subscribers:
+            return
+        self._sequence += 1
+        frame = (f"id: {self._sequence}\nevent: {event}\n"
+                 f"data: {json.dumps(data, default=_json_default, separators=(',', ':'))}\n\n").encode()
+        self.counters["published"] += 1
+        for subscription in list(subscribers):
+            if subscription.push(frame):
+                self.counters["delivered"] += 1
+            else:
+                self.counters["evicted"] += 1
+                subscription.close(evicted=True)
+                subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[organization_id]
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "organizations": len(self._subscribers),
+        }
+
+    async def stream(self, subscription: Subscription, heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+        """SSE body for one subscriber; unsubscribes when the client goes away."""
+        try:
+            yield b"retry: 3000\n: connected\n\n"
+            while True:
+                if not subscription.buffer and not subscription.closed:
+                    subscription.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(subscription.wakeup.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield b": heartbeat\n\n"
+                        continue
+                if subscription.buffer:
+                    frames = b"".join(subscription.buffer)
+                    subscription.buffer.clear()
+                    yield frames
+                if subscription.closed:
+                    if subscription.evicted:
+                        yield b"event: evicted\ndata: {}\n\n"
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+# Process-wide hub; crud write paths publish to it
+event_hub = EventHub()
+
+MESSAGE_FIELDS = ("id", "customer_id", "channel", "message_type", "is_from_customer", "response_time", "created_at")
+APPOINTMENT_FIELDS = ("id", "service_type_id", "customer_name", "appointment_date", "status", "channel")
+
+def publish_messages(organization_id: int, messages: Iterable) -> None:
+    """Message rows or entities were stored for an organization."""
+    if not event_hub.has_subscribers(organization_id):
+        return
+    items = [{field: getattr(message, field, None) for field in MESSAGE_FIELDS} for message in messages]
+    channels: Dict[str, int] = {}
+    for item in items:
+        channels[item["channel"]] = channels.get(item["channel"], 0) + 1
+    event_hub.publish(organization_id, "message", {
+        "op": "created",
+        "items": items,
+        "counters": {"total_messages": len(items), "channel_breakdown": channels},
+    })
+
+def publish_appointments(organization_id: int, op: str, appointments: Iterable) -> None:
+    """Appointments were created or updated for an organization."""
+    if not event_hub.has_subscribers(organization_id):
+        return
+    items = [{field: getattr(appointment, field, None) for field in APPOINTMENT_FIELDS}
+             for appointment in appointments]
+    data = {"op": op, "items": items}
+    if op == "created":
+        data["counters"] = {"total_appointments": len(items)}
+    event_hub.publish(organization_id, "appointment", data)
@@ -0,0 +1,192 @@
+"""Local fake provider servers for tests, benchmarks and offline development."""
+import itertools
+import json
+import random
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from ratelimit import TokenBucket
+
+class _FakeServer:
+    handler = None
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (self.handler,), {"fake": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, status: int, body, headers: dict = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+class _ChannelHandler(_JSONHandler):
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "v1" or parts[2] != "messages":
+            self.send_json(404, {"error": "not found"})
+            return
+        body = self.read_json()
+        status, payload, headers = self.fake.handle(parts[1], body)
+        self.send_json(status, payload, headers)
+
+class FakeChannelProvider(_FakeServer):
+    """WhatsApp/Telegram stand-in enforcing a per-(organization, channel) message rate.
+
+    A batch that would exceed the account's rate is refused whole with 429 and
+    Retry-After. `failure_rate` makes individual messages fail (retryable) at random.
+    """
+
+    handler = _ChannelHandler
+
+    def __init__(self, rate_per_second: float = 20.0, burst: float = None,
+                 failure_rate: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_per_second = rate_per_second
+        self.burst = burst or rate_per_second
+        self.failure_rate = failure_rate
+        self.delivered = []
+        self.rejected_batches = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def handle(self, channel: str, body: dict):
+        messages = body.get("messages", [])
+        key = (body.get("organization_id"), channel)
+        with self._lock:
+            bucket = self._buckets.setdefault(key, TokenBucket(self.rate_per_second, self.burst))
+        wait = bucket.try_acquire(len(messages))
+        if wait:
+            with self._lock:
+                self.rejected_batches += 1
+            return 429, {"error": "rate limited"}, {"Retry-After": f"{wait:.3f}"}
+
+        results = []
+        with self._lock:
+            for message in messages:
+                if random.random() < self.failure_rate:
+                    results.append({"status": "failed", "error": "temporary failure", "retryable": True})
+                else:
+                    self.delivered.append((key[0], channel, message["to"], message["text"]))
+                    results.append({"status": "sent"})
+        return 200, {"results": results}, {}
+
+class _CalendarHandler(_JSONHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "calendars" or parts[2] != "events":
+            self.send_json(404, {"error": "not found"})
+            return
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        status, payload = self.fake.handle(unquote(parts[1]), query)
+        self.send_json(status, payload)
+
+class FakeCalendarProvider(_FakeServer):
+    """Google Calendar events.list stand-in with sync tokens and paging.
+
+    Every change bumps a global version; a sync token is the version it was
+    issued at, and an incremental sync returns the events changed since then,
+    cancelled ones included. `expire_sync_tokens()` makes older tokens answer 410.
+    """
+
+    handler = _CalendarHandler
+
+    def __init__(self, page_size: int = 250, **kwargs):
+        super().__init__(**kwargs)
+        self.page_size = page_size
+        self.requests = 0
+        self._events = {}  # calendar_id -> {event_id: (version, event)}
+        self._version = 0
+        self._oldest_token = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _put(self, calendar_id: str, event: dict) -> None:
+        self._version += 1
+        self._events.setdefault(calendar_id, {})[event["id"]] = (self._version, event)
+
+    def add_event(self, calendar_id: str, start: datetime, end: datetime, transparent: bool = False) -> str:
+        with self._lock:
+            event = {"id": f"evt{next(self._ids)}", "status": "confirmed",
+                     "start": {"dateTime": start.isoformat() + "Z"}, "end": {"dateTime": end.isoformat() + "Z"}}
+            if transparent:
+                event["transparency"] = "transparent"
+            self._put(calendar_id, event)
+            return event["id"]
+
+    def move_event(self, calendar_id: str, event_id: str, start: datetime, end: datetime) -> None:
+        with self._lock:
+            event = dict(self._events[calendar_id][event_id][1])
+            event.update(start={"dateTime": start.isoformat() + "Z"}, end={"dateTime": end.isoformat() + "Z"})
+            self._put(calendar_id, event)
+
+    def cancel_event(self, calendar_id: str, event_id: str) -> None:
+        with self._lock:
+            self._put(calendar_id, {"id": event_id, "status": "cancelled"})
+
+    def expire_sync_tokens(self) -> None:
+        with self._lock:
+            self._oldest_token = self._version + 1
+
+    def handle(self, calendar_id: str, query: dict):
+        with self._lock:
+            self.requests += 1
+            # pageToken is "<offset>:<snapshot version>" so every page of one sync sees the same changes
+            if "pageToken" in query:
+                offset, snapshot = (int(part) for part in query["pageToken"].split(":"))
+            else:
+                offset, snapshot = 0, self._version
+            since = query.get("syncToken")
+            if since is not None and int(since) < self._oldest_token:
+                return 410, {"error": "sync token expired"}
+            events = sorted(self._events.get(calendar_id, {}).items())
+            if since is None:
+                items = [event for _, (version, event) in events if event["status"] != "cancelled"]
+            else:
+                items = [event for _, (version, event) in events if int(since) < version <= snapshot]
+            page_size = min(int(query.get("maxResults", self.page_size)), self.page_size)
+            body = {"items": items[offset:offset + page_size]}
+            if offset + page_size < len(items):
+                body["nextPageToken"] = f"{offset + page_size}:{snapshot}"
+            else:
+                body["nextSyncToken"] = str(snapshot)
+            return 200, body
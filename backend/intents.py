@@ -0,0 +1,248 @@
+"""Rule-based intent routing for inbound messages, ahead of any model call.
+
+Most inbound messages are routine ("appointment book karni hai", "kal ka
+slot", "main late ho jaunga"), so a keyword stage routes booking,
+reschedule, cancel and FAQ messages straight to their handlers. Only what it
+cannot place goes to the model.
+
+Text and keywords are normalized the same way: NFKC, casefolded and
+punctuation to single spaces. Keywords match at the start of a word, so
+"book" also matches "booking" and "cancelll" but not "facebook". All of a tenant's keywords are compiled into one
+Aho-Corasick automaton, flattened into a transition table, so classifying is
+a single pass over the text however many keywords there are.
+
+Each matched keyword adds its word count to its intent's score, so "kal ka
+slot" outweighs a bare "slot". The best-scoring intent wins. A tie, or any
+`handoff` keyword (complaints, emergencies, "cancel nahi"), sends the message
+to the model instead.
+
+Tenants extend or replace the built-in Hinglish/English tables in
+Configuration.ai_config:
+
+    {"intents": {"enabled": true, "replaceDefaults": false,
+                 "keywords": {"faq": ["parking", "fees kitni"], "booking": ["darshan"]}}}
+
+Other intent names are allowed and routed like the built-in ones.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Configuration, Message
+
+HANDOFF = "handoff"
+
+DEFAULT_KEYWORDS: Dict[str, List[str]] = {
+    "booking": [
+        "book", "appointment chahiye", "appointment leni", "appointment lena", "new appointment", "slot",
+        "kal ka slot", "aaj ka slot", "koi slot", "time milega", "time mil sakta", "milna hai", "mil sakte",
+        "consultation chahiye", "schedule an", "reserve", "available hai", "free ho",
+    ],
+    "reschedule": [
+        "reschedule", "reschedule kar", "reschedule my", "re schedule", "postpone", "prepone", "shift kar",
+        "time change", "change the time", "change my appointment", "move my appointment", "badal", "aage kar",
+        "peeche kar", "late ho", "der ho", "der se", "running late", "dusre din", "doosre din", "another day",
+        "another time",
+    ],
+    "cancel": [
+        "cancel", "cancel kar", "cancel my", "cancel the", "radd", "nahi aa paunga", "nahi aa paungi",
+        "nahi aa sakta", "nahi aa sakti", "nahin aa paunga", "can t come", "cant come", "won t be able to come",
+        "will not come", "appointment nahi chahiye",
+    ],
+    "faq": [
+        "timing", "kab khul", "kab tak khul", "kab band", "open hai", "opening hours", "address", "location",
+        "kahan hai", "kaha hai", "parking", "fees", "fee kitni", "kitna lagega", "kitne ka", "price", "charges",
+        "cost", "prescription", "report", "insurance", "payment", "upi", "card chalega", "cash",
+    ],
+    HANDOFF: [
+        "complaint", "shikayat", "refund", "emergency", "urgent", "human", "agent", "manager", "baat karni",
+        "baat karna", "cancel nahi", "cancel mat", "don t cancel", "dont cancel", "do not cancel", "not cancel",
+        "book nahi", "book mat", "reschedule nahi", "reschedule mat",
+    ],
+}
+
+# \w alone would split Indic words at their vowel signs (U+0900-U+0DFF: Devanagari to Sinhala)
+_SEPARATORS = re.compile(r"(?:[^\w\u0900-\u0dff]|_)+")
+_ASCII_SEPARATORS = str.maketrans({chr(code): " " for code in range(128) if not chr(code).isalnum()})
+
+def normalize(text: str) -> str:
+    if text.isascii():
+        # Most messages; str.translate is several times faster than the regex
+        return " ".join(text.lower().translate(_ASCII_SEPARATORS).split())
+    return " ".join(_SEPARATORS.sub(" ", unicodedata.normalize("NFKC", text).casefold()).split())
+
+class IntentMatch:
+    """Outcome of classifying one message; `intent` is None when the model should answer it."""
+
+    __slots__ = ("intent", "scores", "keywords")
+
+    def __init__(self, intent: Optional[str], scores: Dict[str, int], keywords: List[str]):
+        self.intent = intent
+        self.scores = scores
+        self.keywords = keywords
+
+    @property
+    def routed(self) -> bool:
+        return self.intent is not None
+
+    def as_dict(self) -> dict:
+        return {"intent": self.intent, "routed": self.routed, "keywords": self.keywords, "scores": self.scores}
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over normalized keywords, flattened to one transition dict per state."""
+
+    __slots__ = ("patterns", "delta", "outputs")
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        # (intent, normalized keyword, weight) per pattern; patterns start with a space for the word boundary
+        self.patterns: List[Tuple[str, str, int]] = []
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for intent, words in keywords.items():
+            for word in words:
+                keyword = normalize(word)
+                if not keyword:
+                    continue
+                state = 0
+                for char in " " + keyword:
+                    following = goto[state].get(char)
+                    if following is None:
+                        following = goto[state][char] = len(goto)
+                        goto.append({})
+                        outputs.append([])
+                    state = following
+                outputs[state].append(len(self.patterns))
+                self.patterns.append((intent, keyword, keyword.count(" ") + 1))
+
+        # Breadth first, so a state's failure target already has its complete transitions
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [{} for _ in goto]
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, following in goto[state].items():
+                fail[following] = delta[fail[state]].get(char, 0)
+                outputs[following].extend(outputs[fail[following]])
+                queue.append(following)
+        self.delta = delta
+        self.outputs = [tuple(found) for found in outputs]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def scan(self, text: str) -> List[int]:
+        """Indexes of the patterns occurring in normalized text."""
+        delta, outputs = self.delta, self.outputs
+        state = 0
+        found = []
+        for char in " " + text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found.extend(outputs[state])
+        return found
+
+    def classify(self, text: str) -> IntentMatch:
+        scores: Dict[str, int] = {}
+        keywords = []
+        for index in dict.fromkeys(self.scan(normalize(text))):
+            intent, keyword, weight = self.patterns[index]
+            scores[intent] = scores.get(intent, 0) + weight
+            keywords.append(keyword)
+        if not scores or HANDOFF in scores:
+            return IntentMatch(None, scores, keywords)
+        best = max(scores.values())
+        leaders = [intent for intent, score in scores.items() if score == best]
+        return IntentMatch(leaders[0] if len(leaders) == 1 else None, scores, keywords)
+
+def tenant_keywords(ai_config: Optional[dict]) -> Optional[Dict[str, List[str]]]:
+    """Keyword table for a tenant's ai_config; None when it uses the defaults unchanged."""
+    settings = (ai_config or {}).get("intents") or {}
+    if not settings.get("enabled", True):
+        return {}
+    extra = settings.get("keywords") or {}
+    if not extra and not settings.get("replaceDefaults"):
+        return None
+    keywords = {} if settings.get("replaceDefaults") else {intent: list(words)
+                                                           for intent, words in DEFAULT_KEYWORDS.items()}
+    for intent, words in extra.items():
+        keywords.setdefault(intent, []).extend(words)
+    return keywords
+
+class IntentRouter:
+    """Per-tenant compiled keyword tables and routing counters for this process.
+
+    Tables are read from Configuration.ai_config on first use and reloaded once
+    older than `table_ttl`; configuration writes in this process drop them at once.
+    """
+
+    def __init__(self, session_factory=SessionLocal, table_ttl: float = 60.0):
+        self.session_factory = session_factory
+        self.table_ttl = table_ttl
+        self.default_matcher = KeywordMatcher(DEFAULT_KEYWORDS)
+        self._matchers: Dict[int, Tuple[KeywordMatcher, float]] = {}
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"classified": 0, "routed": 0}
+        # Kept apart from the totals, so an intent named like a counter cannot corrupt them
+        self.by_intent: Dict[str, int] = {}
+
+    def _load(self, org_id: int) -> KeywordMatcher:
+        db = self.session_factory()
+        try:
+            ai_config = db.execute(select(Configuration.ai_config)
+                                   .where(Configuration.organization_id == org_id)).scalar()
+        finally:
+            db.close()
+        keywords = tenant_keywords(ai_config)
+        return self.default_matcher if keywords is None else KeywordMatcher(keywords)
+
+    def matcher(self, org_id: int) -> KeywordMatcher:
+        entry = self._matchers.get(org_id)
+        if entry is None or time.monotonic() - entry[1] > self.table_ttl:
+            entry = self._matchers[org_id] = (self._load(org_id), time.monotonic())
+        return entry[0]
+
+    def invalidate(self, org_id: int) -> None:
+        self._matchers.pop(org_id, None)
+
+    def classify_batch(self, org_id: int, texts: Sequence[str]) -> List[IntentMatch]:
+        matcher = self.matcher(org_id)
+        matches = [matcher.classify(text or "") for text in texts]
+        with self._lock:
+            self.counters["classified"] += len(matches)
+            for match in matches:
+                if match.routed:
+                    self.counters["routed"] += 1
+                    self.by_intent[match.intent] = self.by_intent.get(match.intent, 0) + 1
+        return matches
+
+    def classify(self, org_id: int, text: str) -> IntentMatch:
+        return self.classify_batch(org_id, [text])[0]
+
+    def classify_pending(self, db: Session, org_id: int, after_id: int = 0,
+                         limit: int = 500) -> List[Tuple[int, IntentMatch]]:
+        """Classify the tenant's inbound messages after `after_id`, oldest first, for a reply worker's cursor."""
+        rows = db.execute(select(Message.id, Message.content)
+                          .where(Message.organization_id == org_id, Message.is_from_customer.is_(True),
+                                 Message.id > after_id)
+                          .order_by(Message.id).limit(limit)).all()
+        return list(zip([row.id for row in rows], self.classify_batch(org_id, [row.content for row in rows])))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            counters["by_intent"] = dict(self.by_intent)
+        counters.update(tenants_loaded=len(self._matchers),
+                        routed_rate=counters["routed"] / counters["classified"] if counters["classified"] else 0.0)
+        return counters
+
+# Shared by every request handled in this process
+intent_router = IntentRouter()
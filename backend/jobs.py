@@ -0,0 +1,502 @@
+"""Durable background job queue in the `jobs` table.
+
+Jobs are rows: a handler `kind`, a JSON payload, an optional tenant, a
+priority (lower runs first) and `run_at`, the earliest time they may run, so
+scheduled jobs are simply rows with a future `run_at`.
+
+Workers claim jobs in one short transaction and hold them for a visibility
+timeout (`locked_until`) that they extend while the jobs run. A job whose
+worker died is put back once its lease runs out, and counts as an attempt.
+Delivery is therefore at least once, and handlers must be safe to re-run.
+Claims are serialized: on Postgres by a transaction-level advisory lock, on
+SQLite by the write lock that the claim's first UPDATE takes. Each claim
+therefore sees the committed result of the previous one, which keeps the
+per-tenant concurrency cap (JOB_TENANT_CONCURRENCY running jobs per
+organization) exact across every worker. A claim takes a few milliseconds,
+so serializing claims does not limit throughput in practice.
+
+A failed job is retried with exponential backoff and jitter until it has
+made `max_attempts` attempts. After that, or when it raises
+JobError(retryable=False), it stays in the table as `failed` with its last
+error. Finished jobs are purged after JOB_RETENTION_DAYS.
+
+Run workers with JOB_WORKERS_ENABLED=true in an API process (JOB_THREADS
+threads), or standalone as a pool of processes:
+
+    python jobs.py --processes 4 --threads 8
+    python jobs.py --enqueue report.platform --payload '{"date": "2026-10-18"}'
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import Job
+from sketches import DDSketch
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 0, 100, 200
+
+THREADS = int(os.getenv("JOB_THREADS", 4))
+CLAIM_BATCH = int(os.getenv("JOB_CLAIM_BATCH", 1))
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", 300))
+TENANT_CONCURRENCY = int(os.getenv("JOB_TENANT_CONCURRENCY", 2))  # 0: no cap
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 10))
+RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", 3600))
+RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", 7))
+
+# Postgres advisory lock key serializing claims ("jobs" in ASCII)
+CLAIM_LOCK_KEY = 0x6A6F6273
+# Capped tenants can fill the head of the queue; look a little further for claimable jobs
+CANDIDATE_FACTOR = 4
+
+class JobError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class ClaimedJob:
+    __slots__ = ("id", "kind", "organization_id", "payload", "attempts", "max_attempts", "run_at", "claimed_at")
+
+    def __init__(self, id, kind, organization_id, payload, attempts, max_attempts, run_at, claimed_at):
+        self.id = id
+        self.kind = kind
+        self.organization_id = organization_id
+        self.payload = payload or {}
+        self.attempts = attempts  # Including this one
+        self.max_attempts = max_attempts
+        self.run_at = run_at
+        self.claimed_at = claimed_at
+
+# Handlers take a session (committed after they return) and the job
+HANDLERS: Dict[str, Callable[[Session, ClaimedJob], None]] = {}
+
+def job_handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+# Queue operations. The statements on the worker path are built once with bind parameters: constructing
+# them per call costs more than SQLite takes to run them.
+_jobs = Job.__table__
+_ready = and_(_jobs.c.status == QUEUED, _jobs.c.run_at <= bindparam("now"),
+              _jobs.c.kind.in_(bindparam("kinds", expanding=True)))
+_ANY_READY = select(_jobs.c.id).where(_ready).limit(1)
+_CANDIDATES = select(_jobs.c.id, _jobs.c.organization_id).where(_ready) \
+    .order_by(_jobs.c.priority, _jobs.c.run_at, _jobs.c.id).limit(bindparam("limit"))
+_UNSATURATED_CANDIDATES = _CANDIDATES.where(or_(
+    _jobs.c.organization_id.is_(None), _jobs.c.organization_id.notin_(bindparam("saturated", expanding=True))))
+_RUNNING_PER_TENANT = select(_jobs.c.organization_id, func.count()) \
+    .where(_jobs.c.status == RUNNING, _jobs.c.organization_id.isnot(None)).group_by(_jobs.c.organization_id)
+_out_of_attempts = _jobs.c.attempts >= _jobs.c.max_attempts
+_REQUEUE_EXPIRED = update(_jobs).where(_jobs.c.status == RUNNING, _jobs.c.locked_until < bindparam("now")).values(
+    status=case((_out_of_attempts, FAILED), else_=QUEUED),
+    finished_at=case((_out_of_attempts, bindparam("now")), else_=None),
+    run_at=bindparam("now"), locked_until=None, last_error="Visibility timeout expired")
+_CLAIM = update(_jobs).where(_jobs.c.id.in_(bindparam("ids", expanding=True)), _jobs.c.status == QUEUED).values(
+    status=RUNNING, attempts=_jobs.c.attempts + 1, locked_by=bindparam("worker"),
+    locked_until=bindparam("lease_until"), started_at=bindparam("now"),
+).returning(_jobs.c.id, _jobs.c.kind, _jobs.c.organization_id, _jobs.c.payload, _jobs.c.attempts,
+            _jobs.c.max_attempts, _jobs.c.run_at)
+_leased = and_(_jobs.c.id.in_(bindparam("ids", expanding=True)), _jobs.c.locked_by == bindparam("worker"),
+               _jobs.c.status == RUNNING)
+_EXTEND = update(_jobs).where(_leased).values(locked_until=bindparam("lease_until"))
+_COMPLETE = update(_jobs).where(_leased).values(status=DONE, finished_at=bindparam("now"), locked_until=None,
+                                                last_error=None)
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, organization_id: Optional[int] = None,
+            priority: int = PRIORITY_NORMAL, run_at: Optional[datetime] = None,
+            max_attempts: int = MAX_ATTEMPTS, unique_key: Optional[str] = None) -> int:
+    """Add a job and commit; with a unique_key, an existing job of the same kind and key is returned instead."""
+    now = datetime.utcnow()
+    try:
+        job_id = db.execute(insert(Job).values(
+            kind=kind, organization_id=organization_id, payload=payload or {}, priority=priority, status=QUEUED,
+            run_at=run_at or now, attempts=0, max_attempts=max_attempts, unique_key=unique_key, created_at=now,
+        ).returning(Job.id)).scalar_one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if unique_key is None:
+            raise
+        job_id = db.execute(select(Job.id).where(Job.kind == kind, Job.unique_key == unique_key)).scalar_one()
+    return job_id
+
+def requeue_expired(db: Session) -> int:
+    """Put back running jobs whose lease ran out, or fail them when they are out of attempts; commits."""
+    count = db.execute(_REQUEUE_EXPIRED, {"now": datetime.utcnow()}).rowcount
+    db.commit()
+    return count
+
+def claim_jobs(db: Session, worker_id: str, kinds: List[str], limit: int = 1,
+               visibility_timeout: float = VISIBILITY_TIMEOUT,
+               tenant_concurrency: int = TENANT_CONCURRENCY) -> List[ClaimedJob]:
+    """Lease up to `limit` due jobs of the given kinds to a worker, highest priority first; commits."""
+    now = datetime.utcnow()
+    # Read-only check first, so idle workers never take the write lock
+    if db.execute(_ANY_READY, {"now": now, "kinds": kinds}).first() is None:
+        db.rollback()
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+    # On SQLite this UPDATE takes the write lock, so the rest of the claim cannot interleave with another
+    db.execute(_REQUEUE_EXPIRED, {"now": now})
+
+    params = {"now": now, "kinds": kinds, "limit": limit}
+    statement = _CANDIDATES
+    free: Dict[int, int] = {}
+    if tenant_concurrency:
+        free = {org_id: tenant_concurrency - running for org_id, running in db.execute(_RUNNING_PER_TENANT)}
+        saturated = [org_id for org_id, slots in free.items() if slots <= 0]
+        if saturated:
+            statement = _UNSATURATED_CANDIDATES
+            params["saturated"] = saturated
+        params["limit"] = limit * CANDIDATE_FACTOR
+    picked = []
+    for job_id, org_id in db.execute(statement, params):
+        if tenant_concurrency and org_id is not None:
+            slots = free.get(org_id, tenant_concurrency)
+            if slots <= 0:
+                continue
+            free[org_id] = slots - 1
+        picked.append(job_id)
+        if len(picked) == limit:
+            break
+    if not picked:
+        db.commit()
+        return []
+
+    rows = db.execute(_CLAIM, {"ids": picked, "worker": worker_id, "now": now,
+                               "lease_until": now + timedelta(seconds=visibility_timeout)}).all()
+    db.commit()
+    order = {job_id: position for position, job_id in enumerate(picked)}
+    return sorted((ClaimedJob(*row, now) for row in rows), key=lambda job: order[job.id])
+
+def extend_leases(db: Session, worker_id: str, job_ids: List[int],
+                  visibility_timeout: float = VISIBILITY_TIMEOUT) -> int:
+    """Keep running jobs leased to a worker; commits."""
+    if not job_ids:
+        return 0
+    count = db.execute(_EXTEND, {"ids": job_ids, "worker": worker_id,
+                                 "lease_until": datetime.utcnow() + timedelta(seconds=visibility_timeout)}).rowcount
+    db.commit()
+    return count
+
+def complete_jobs(db: Session, worker_id: str, job_ids: List[int]) -> None:
+    """Mark jobs done, unless their lease was lost to another worker; does not commit."""
+    if job_ids:
+        db.execute(_COMPLETE, {"ids": job_ids, "worker": worker_id, "now": datetime.utcnow()})
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+def fail_job(db: Session, worker_id: str, job: ClaimedJob, error: Exception) -> bool:
+    """Schedule a retry, or fail the job for good; returns whether it will be retried. Does not commit."""
+    now = datetime.utcnow()
+    retry = getattr(error, "retryable", True) and job.attempts < job.max_attempts
+    values = {"locked_until": None, "last_error": f"{type(error).__name__}: {error}"[:2000]}
+    if retry:
+        values.update(status=QUEUED, run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+    else:
+        values.update(status=FAILED, finished_at=now)
+    db.execute(update(Job).where(Job.id == job.id, Job.locked_by == worker_id, Job.status == RUNNING)
+               .values(**values).execution_options(synchronize_session=False))
+    return retry
+
+def purge_finished(db: Session, older_than_days: float = RETENTION_DAYS) -> int:
+    """Delete jobs that finished successfully before the retention period; commits."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    count = db.execute(delete(Job).where(Job.status == DONE, Job.finished_at < cutoff)
+                       .execution_options(synchronize_session=False)).rowcount
+    db.commit()
+    return count
+
+def queue_metrics(db: Session) -> dict:
+    """Queue depth per kind, how long the oldest due job has waited, running and failed counts."""
+    now = datetime.utcnow()
+    by_kind = {}
+    for kind, count, oldest in db.execute(
+        select(Job.kind, func.count(), func.min(Job.run_at)).where(Job.status == QUEUED, Job.run_at <= now)
+        .group_by(Job.kind)
+    ):
+        by_kind[kind] = {"ready": count, "oldest_ready_seconds": round((now - oldest).total_seconds(), 3)}
+    counts = dict(db.execute(select(Job.status, func.count()).where(Job.status.in_((RUNNING, FAILED)))
+                             .group_by(Job.status)).all())
+    return {
+        "ready": sum(item["ready"] for item in by_kind.values()),
+        "scheduled": db.execute(select(func.count()).where(Job.status == QUEUED, Job.run_at > now)).scalar(),
+        "running": counts.get(RUNNING, 0),
+        "failed": counts.get(FAILED, 0),
+        "oldest_ready_seconds": max((item["oldest_ready_seconds"] for item in by_kind.values()), default=0.0),
+        "by_kind": by_kind,
+    }
+
+# Workers
+class JobWorker:
+    """Claims and runs jobs on `threads` threads; the run loop extends their leases and requeues expired ones."""
+
+    def __init__(self, handlers: Optional[Dict[str, Callable]] = None, session_factory=SessionLocal,
+                 threads: int = THREADS, batch_size: int = CLAIM_BATCH, poll_interval: float = POLL_SECONDS,
+                 visibility_timeout: float = VISIBILITY_TIMEOUT, tenant_concurrency: int = TENANT_CONCURRENCY,
+                 worker_id: Optional[str] = None):
+        self.handlers = HANDLERS if handlers is None else handlers
+        self.session_factory = session_factory
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.tenant_concurrency = tenant_concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.counters = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0}
+        self.wait_seconds = DDSketch()  # due (run_at) to claimed
+        self.run_seconds = DDSketch()
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _execute(self, job: ClaimedJob) -> Optional[Exception]:
+        db = self.session_factory()
+        try:
+            self.handlers[job.kind](db, job)
+            db.commit()
+            return None
+        except Exception as exc:
+            db.rollback()
+            logger.warning("Job %s (%s) attempt %s failed: %s", job.id, job.kind, job.attempts, exc)
+            return exc
+        finally:
+            db.close()
+
+    def run_once(self) -> int:
+        """Claim a batch, run it and record the outcomes; returns how many jobs ran."""
+        if not self.handlers:
+            return 0
+        db = self.session_factory()
+        try:
+            jobs = claim_jobs(db, self.worker_id, list(self.handlers), self.batch_size,
+                              self.visibility_timeout, self.tenant_concurrency)
+        finally:
+            db.close()
+        if not jobs:
+            return 0
+        with self._lock:
+            self._inflight.update(job.id for job in jobs)
+
+        done, failures, timings = [], [], []
+        for job in jobs:
+            started = time.perf_counter()
+            error = self._execute(job)
+            timings.append(((job.claimed_at - job.run_at).total_seconds(), time.perf_counter() - started))
+            if error is None:
+                done.append(job.id)
+            else:
+                failures.append((job, error))
+
+        db = self.session_factory()
+        try:
+            complete_jobs(db, self.worker_id, done)
+            retried = sum(fail_job(db, self.worker_id, job, error) for job, error in failures)
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._inflight.difference_update(job.id for job in jobs)
+            self.counters["claimed"] += len(jobs)
+            self.counters["succeeded"] += len(done)
+            self.counters["retried"] += retried
+            self.counters["failed"] += len(failures) - retried
+            for waited, ran in timings:
+                self.wait_seconds.add(max(waited, 0.0))
+                self.run_seconds.add(ran)
+        return len(jobs)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("Job worker iteration failed")
+                ran = 0
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    def maintain(self) -> None:
+        """Extend the leases of running jobs and requeue jobs abandoned by dead workers."""
+        with self._lock:
+            inflight = list(self._inflight)
+        db = self.session_factory()
+        try:
+            extend_leases(db, self.worker_id, inflight, self.visibility_timeout)
+            requeue_expired(db)
+        finally:
+            db.close()
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self._work, name=f"jobs-{number}", daemon=True)
+                   for number in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        next_purge = time.monotonic()
+        while not self._stop.wait(min(self.visibility_timeout / 3, 60.0)):
+            try:
+                self.maintain()
+                if time.monotonic() >= next_purge:
+                    db = self.session_factory()
+                    try:
+                        purge_finished(db)
+                    finally:
+                        db.close()
+                    next_purge = time.monotonic() + 3600
+            except Exception:
+                logger.exception("Job worker maintenance failed")
+        for thread in threads:
+            thread.join()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update(worker_id=self.worker_id, threads=self.threads, inflight=len(self._inflight),
+                         wait_seconds=self.wait_seconds.summary(), run_seconds=self.run_seconds.summary())
+        return stats
+
+# Worker for JOB_WORKERS_ENABLED=true in an API process
+job_worker = JobWorker()
+
+def _serve(threads: int, options: dict) -> None:
+    # Connections inherited from the parent must not be shared with it
+    engine.dispose(close=False)
+    worker = JobWorker(threads=threads, **options)
+    signal.signal(signal.SIGTERM, lambda *_: worker._stop.set())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker._stop.set()
+
+def run_pool(processes: int, threads: int, **options) -> None:
+    """Run `processes` worker processes of `threads` threads each until SIGTERM/SIGINT."""
+    if processes <= 1:
+        _serve(threads, options)
+        return
+    children = [multiprocessing.Process(target=_serve, args=(threads, options), name=f"jobs-{number}")
+                for number in range(processes)]
+    for child in children:
+        child.start()
+    signal.signal(signal.SIGTERM, lambda *_: [child.terminate() for child in children])
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+            child.join()
+
+# Built-in handlers; imports are deferred so loading the queue stays cheap
+def _day(value: Optional[str]) -> date:
+    return date.fromisoformat(value) if value else datetime.utcnow().date()
+
+@job_handler("report.platform")
+def _platform_report(db: Session, job: ClaimedJob) -> None:
+    """payload: {"date": "YYYY-MM-DD" (default today), "days": 1, "output": optional path}"""
+    from reports import REPORT_DIR, generate_report
+
+    day = _day(job.payload.get("date"))
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time())
+    output = job.payload.get("output") or os.path.join(REPORT_DIR, f"platform-{day.isoformat()}.json")
+    # Chunks finished by an earlier attempt are picked up from their checkpoints
+    generate_report(end - timedelta(days=job.payload.get("days", 1)), end, output)
+
+@job_handler("sketches.backfill")
+def _backfill_sketches(db: Session, job: ClaimedJob) -> None:
+    """Rebuild the job tenant's metric sketches; payload: {"until": "YYYY-MM-DD" (default today)}"""
+    from sketches import backfill_sketches
+
+    if job.organization_id is None:
+        raise JobError("sketches.backfill needs an organization", retryable=False)
+    backfill_sketches(db, [job.organization_id], _day(job.payload.get("until")))
+
+@job_handler("customers.backfill")
+def _backfill_customers(db: Session, job: ClaimedJob) -> None:
+    from customers import backfill_customers
+
+    if job.organization_id is None:
+        raise JobError("customers.backfill needs an organization", retryable=False)
+    backfill_customers(db, [job.organization_id])
+
+@job_handler("archive.messages")
+def _archive_messages(db: Session, job: ClaimedJob) -> None:
+    """payload: {"before": "YYYY-MM-DD" (default: the archive cutoff)}"""
+    from archive import archive_cutoff, archive_messages
+
+    before = job.payload.get("before")
+    archive_messages(db, datetime.fromisoformat(before) if before else archive_cutoff())
+
+@job_handler("uploads.gc")
+def _collect_upload_garbage(db: Session, job: ClaimedJob) -> None:
+    from uploads import collect_garbage
+
+    try:
+        collect_garbage(db)
+    except RuntimeError as exc:
+        # A safety refusal; retrying would not change the answer
+        raise JobError(str(exc), retryable=False)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run background job workers or enqueue a job")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_PROCESSES", 1)))
+    parser.add_argument("--threads", type=int, default=THREADS, help="worker threads per process")
+    parser.add_argument("--batch-size", type=int, default=CLAIM_BATCH, help="jobs claimed at a time per thread")
+    parser.add_argument("--enqueue", metavar="KIND", help="add a job instead of running workers")
+    parser.add_argument("--payload", type=json.loads, default={}, help="JSON payload for --enqueue")
+    parser.add_argument("--org-id", type=int, help="organization of the enqueued job")
+    parser.add_argument("--run-at", type=datetime.fromisoformat, help="UTC time to run the enqueued job at")
+    parser.add_argument("--priority", type=int, default=PRIORITY_NORMAL)
+    parser.add_argument("--unique-key", help="skip enqueueing if a job of this kind and key exists")
+    args = parser.parse_args()
+
+    if args.enqueue:
+        db = SessionLocal()
+        try:
+            job_id = enqueue(db, args.enqueue, args.payload, args.org_id, args.priority, args.run_at,
+                             unique_key=args.unique_key)
+            print(f"Enqueued job {job_id}")
+        finally:
+            db.close()
+    else:
+        run_pool(args.processes, args.threads, batch_size=args.batch_size)
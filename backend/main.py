@@ -1,23 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import uvicorn
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
 
-from database import get_db, engine, Base
+from database import SessionLocal, get_db, init_db
 from models import *
 from schemas import *
 from auth import create_access_token, verify_token, get_password_hash, verify_password
 from crud import *
+from serialization import ContentNegotiationMiddleware, encode_records, list_response, model_response, records_media_type
+from reminders import reminder_scheduler
+from dispatcher import OutboundDispatcher, HttpChannelProvider, ReminderChannelSender, ProviderError
+from ratelimit import AdmissionController, TenantAdmissionMiddleware
+from compression import CompressionMiddleware, compression_stats
+from archive import iter_messages, get_customer_thread
+from search import search_messages
+from uploads import UploadError, document_type, store_upload
+from events import TooManySubscribers, event_hub
+from dedupe import recent_message_ids
+from sketches import response_time_report, sketch_recorder, unique_customers_report
+from customers import find_customer_id
+from intents import intent_router
+from calendar_sync import calendar_sync, naive_utc
+from conversations import conversation_store
+from jobs import HANDLERS, enqueue, job_worker, queue_metrics
+from changes import ConditionalGetMiddleware, collection_version
+from starlette.concurrency import run_in_threadpool
+
+outbound_dispatcher: Optional[OutboundDispatcher] = None
 
 load_dotenv()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Schema is managed by run.py (migrations in production, create_all in development),
+# so importing the app in each worker does not touch the database.
 
 app = FastAPI(
     title="AI Appointment Assistant API",
@@ -25,6 +46,22 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# JSON or MessagePack, from the Accept header (see serialization.py)
+app.add_middleware(ContentNegotiationMiddleware)
+
+# Per-tenant admission control (added early so CORS headers still wrap 429/503 responses)
+admission_controller = AdmissionController()
+if os.getenv("ADMISSION_CONTROL", "true").lower() == "true":
+    app.add_middleware(TenantAdmissionMiddleware, controller=admission_controller)
+
+# Body-hash ETags and 304s for GETs without a tracked change version (see changes.py)
+if os.getenv("CONDITIONAL_GET_ENABLED", "true").lower() == "true":
+    app.add_middleware(ConditionalGetMiddleware)
+
+# gzip/brotli for large responses
+if os.getenv("COMPRESSION_ENABLED", "true").lower() == "true":
+    app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +72,45 @@ app.add_middleware(
 )
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Background services. Enable these on one process only when running several workers.
+@app.on_event("startup")
+async def start_background_services():
+    global outbound_dispatcher
+    if os.getenv("OUTBOUND_PROVIDER_URL"):
+        outbound_dispatcher = OutboundDispatcher(HttpChannelProvider(os.environ["OUTBOUND_PROVIDER_URL"]))
+        outbound_dispatcher.start()
+        reminder_scheduler.sender = ReminderChannelSender(outbound_dispatcher)
+    if os.getenv("REMINDERS_ENABLED", "false").lower() == "true":
+        reminder_scheduler.start()
+    if os.getenv("CALENDAR_SYNC_ENABLED", "false").lower() == "true":
+        calendar_sync.start(interval=float(os.getenv("CALENDAR_SYNC_INTERVAL", 300)))
+    if os.getenv("CONVERSATION_SNAPSHOTS_ENABLED", "false").lower() == "true":
+        conversation_store.load_snapshot()
+        conversation_store.start(interval=float(os.getenv("CONVERSATION_SNAPSHOT_SECONDS", 30)))
+    if os.getenv("JOB_WORKERS_ENABLED", "false").lower() == "true":
+        job_worker.start()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    if reminder_scheduler.running:
+        reminder_scheduler.stop()
+    if calendar_sync.running:
+        calendar_sync.stop()
+    if job_worker.running:
+        job_worker.stop()
+    if conversation_store.running:
+        # Writes a final snapshot
+        conversation_store.stop()
+    if outbound_dispatcher:
+        outbound_dispatcher.stop()
+    # Stops this worker's sketch flusher after a last flush of its pending updates
+    sketch_recorder.stop()
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok"}
 
 # Dependency to get current user
 async def get_current_user(
@@ -107,7 +183,7 @@ async def get_organizations(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
-    return get_all_organizations(db)
+    return list_response(OrganizationResponse, get_all_organizations(db))
 
 @app.post("/api/organizations", response_model=OrganizationResponse)
 async def create_organization_endpoint(
@@ -125,6 +201,8 @@ async def create_organization_endpoint(
 @app.get("/api/organizations/{org_id}", response_model=OrganizationResponse)
 async def get_organization(
     org_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -134,13 +212,16 @@ async def get_organization(
             detail="Access denied"
         )
     
+    current = collection_version(db, org_id, "organization")
+    if current.matches(request):
+        return current.not_modified()
     org = get_organization_by_id(db, org_id)
     if not org:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found"
         )
-    return org
+    return current.tag(org, response)
 
 @app.put("/api/organizations/{org_id}", response_model=OrganizationResponse)
 async def update_organization_endpoint(
@@ -168,6 +249,8 @@ async def update_organization_endpoint(
 @app.get("/api/organizations/{org_id}/config", response_model=ConfigurationResponse)
 async def get_configuration(
     org_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -177,6 +260,9 @@ async def get_configuration(
             detail="Access denied"
         )
     
+    current = collection_version(db, org_id, "config")
+    if current.matches(request):
+        return current.not_modified()
     config = get_organization_config(db, org_id)
     if not config:
         # Create default config if none exists
@@ -187,8 +273,9 @@ async def get_configuration(
             ai_config={}
         )
         config = create_configuration(db, config_data)
+        current = collection_version(db, org_id, "config")
     
-    return config
+    return current.tag(config, response)
 
 @app.put("/api/organizations/{org_id}/config", response_model=ConfigurationResponse)
 async def update_configuration_endpoint(
@@ -215,6 +302,9 @@ async def update_configuration_endpoint(
 @app.get("/api/organizations/{org_id}/documents", response_model=List[DocumentResponse])
 async def get_documents(
     org_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -224,7 +314,12 @@ async def get_documents(
             detail="Access denied"
         )
     
-    return get_organization_documents(db, org_id)
+    # ?since=<X-Collection-Version> lists only what changed after it (X-Delta-Since is set when it did)
+    current = collection_version(db, org_id, "documents")
+    if current.matches(request):
+        return current.not_modified()
+    delta = current.delta_since(since)
+    return current.tag(list_response(DocumentResponse, get_organization_documents(db, org_id, delta)), response, delta)
 
 @app.post("/api/organizations/{org_id}/documents", response_model=DocumentResponse)
 async def create_document_endpoint(
@@ -242,6 +337,34 @@ async def create_document_endpoint(
     doc_data.organization_id = org_id
     return create_document(db, doc_data)
 
+@app.post("/api/organizations/{org_id}/documents/upload", response_model=DocumentResponse)
+async def upload_document_endpoint(
+    org_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # multipart/form-data with one file part and optional "name"/"type" fields,
+    # parsed from the raw stream so large files never sit in memory
+    try:
+        upload = await store_upload(request.headers.get("content-type"), request.stream())
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    
+    return create_document(db, DocumentCreate(
+        organization_id=org_id,
+        name=upload.fields.get("name") or upload.filename or upload.sha256,
+        type=upload.fields.get("type") or document_type(upload.filename),
+        file_path=upload.path,
+        size=upload.size
+    ))
+
 @app.delete("/api/organizations/{org_id}/documents/{doc_id}")
 async def delete_document_endpoint(
     org_id: int,
@@ -267,6 +390,9 @@ async def delete_document_endpoint(
 @app.get("/api/organizations/{org_id}/service-types", response_model=List[ServiceTypeResponse])
 async def get_service_types(
     org_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -276,7 +402,12 @@ async def get_service_types(
             detail="Access denied"
         )
     
-    return get_organization_service_types(db, org_id)
+    # ?since=<X-Collection-Version> lists only what changed after it (X-Delta-Since is set when it did)
+    current = collection_version(db, org_id, "service_types")
+    if current.matches(request):
+        return current.not_modified()
+    delta = current.delta_since(since)
+    return current.tag(list_response(ServiceTypeResponse, get_organization_service_types(db, org_id, delta)), response, delta)
 
 @app.post("/api/organizations/{org_id}/service-types", response_model=ServiceTypeResponse)
 async def create_service_type_endpoint(
@@ -298,6 +429,11 @@ async def create_service_type_endpoint(
 @app.get("/api/organizations/{org_id}/appointments", response_model=List[AppointmentResponse])
 async def get_appointments(
     org_id: int,
+    request: Request,
+    response: Response,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    since: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -307,7 +443,48 @@ async def get_appointments(
             detail="Access denied"
         )
     
-    return get_organization_appointments(db, org_id)
+    # ?since=<X-Collection-Version> lists only what changed after it (X-Delta-Since is set when it did)
+    current = collection_version(db, org_id, "appointments")
+    if current.matches(request):
+        return current.not_modified()
+    delta = current.delta_since(since)
+    start, end = (naive_utc(value) if value else None for value in (start, end))
+    appointments = list_organization_appointments(db, org_id, start, end, delta)
+    return current.tag(list_response(AppointmentResponse, appointments), response, delta)
+
+@app.get("/api/organizations/{org_id}/appointments/calendar", response_model=AppointmentCalendarResponse)
+async def get_appointment_calendar(
+    org_id: int,
+    start: datetime,
+    end: datetime,
+    request: Request,
+    response: Response,
+    granularity: str = "day",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    # Appointment dates are stored as naive UTC; a bound with an offset is converted to match
+    start, end = naive_utc(start), naive_utc(end)
+    if granularity not in ("day", "week") or end <= start or end - start > timedelta(days=400):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="granularity must be day or week, over a window of at most 400 days"
+        )
+    
+    current = collection_version(db, org_id, "appointments")
+    if current.matches(request):
+        return current.not_modified()
+    return current.tag({
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "buckets": appointment_buckets(db, org_id, start, end, granularity),
+    }, response)
 
 @app.post("/api/organizations/{org_id}/appointments", response_model=AppointmentResponse)
 async def create_appointment_endpoint(
@@ -325,6 +502,61 @@ async def create_appointment_endpoint(
     appointment_data.organization_id = org_id
     return create_appointment(db, appointment_data)
 
+@app.post("/api/organizations/{org_id}/appointments/bulk-update", response_model=AppointmentBulkUpdateResult)
+async def bulk_update_appointments_endpoint(
+    org_id: int,
+    changes: AppointmentBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Stored appointment dates are naive UTC
+    for field in ("appointment_date", "start", "end"):
+        if getattr(changes, field) is not None:
+            setattr(changes, field, naive_utc(getattr(changes, field)))
+    return bulk_update_appointments(db, org_id, changes)
+
+# Calendar endpoints
+@app.get("/api/organizations/{org_id}/calendar/freebusy", response_model=FreeBusyResponse)
+async def get_calendar_free_busy(
+    org_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Served from the in-memory mirror; the provider is never called here
+    start = start or datetime.utcnow()
+    end = end or start + timedelta(days=7)
+    busy = calendar_sync.free_busy(org_id, start, end)
+    return {"start": start, "end": end, "busy": [{"start": s, "end": e} for s, e in busy]}
+
+@app.post("/api/organizations/{org_id}/calendar/sync")
+async def sync_calendar(
+    org_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    try:
+        return await run_in_threadpool(calendar_sync.sync_organization, org_id)
+    except ProviderError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc))
+
 # Analytics endpoints
 @app.get("/api/organizations/{org_id}/analytics")
 async def get_organization_analytics(
@@ -338,7 +570,92 @@ async def get_organization_analytics(
             detail="Access denied"
         )
     
-    return get_analytics_data(db, org_id)
+    return model_response(get_analytics_data(db, org_id))
+
+@app.get("/api/organizations/{org_id}/analytics/response-times", response_model=ResponseTimeReport)
+async def get_organization_response_times(
+    org_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    channel: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    start, end = analytics_window(start, end)
+    
+    return model_response(response_time_report(db, org_id, start, end, channel), ResponseTimeReport)
+
+@app.get("/api/analytics/platform/response-times", response_model=ResponseTimeReport)
+async def get_platform_response_times(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    channel: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    start, end = analytics_window(start, end)
+    
+    return model_response(response_time_report(db, None, start, end, channel), ResponseTimeReport)
+
+@app.get("/api/organizations/{org_id}/analytics/unique-customers", response_model=UniqueCustomersReport)
+async def get_organization_unique_customers(
+    org_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    channel: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    start, end = analytics_window(start, end, granularity)
+    
+    return model_response(unique_customers_report(db, org_id, start, end, granularity, channel),
+                          UniqueCustomersReport)
+
+@app.get("/api/analytics/platform/unique-customers", response_model=UniqueCustomersReport)
+async def get_platform_unique_customers(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    channel: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    start, end = analytics_window(start, end, granularity)
+    
+    return model_response(unique_customers_report(db, None, start, end, granularity, channel),
+                          UniqueCustomersReport)
+
+def analytics_window(start: Optional[date], end: Optional[date], granularity: str = "day"):
+    """Days [start, end) for a sketch-based report; the last 30 days by default."""
+    end = end or datetime.utcnow().date() + timedelta(days=1)
+    start = start or end - timedelta(days=30)
+    if granularity not in ("day", "month") or end <= start or end - start > timedelta(days=400):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="granularity must be day or month, over a window of at most 400 days"
+        )
+    return start, end
 
 @app.get("/api/analytics/platform")
 async def get_platform_analytics(
@@ -351,7 +668,184 @@ async def get_platform_analytics(
             detail="Access denied"
         )
     
-    return get_platform_analytics_data(db)
+    return model_response(get_platform_analytics_data(db))
+
+@app.get("/api/admin/admission")
+async def get_admission_counters(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    return admission_controller.snapshot()
+
+@app.get("/api/admin/ingestion")
+async def get_ingestion_stats(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Duplicate deliveries suppressed by the recent-id filter vs the unique index
+    return recent_message_ids.stats()
+
+@app.get("/api/admin/intents")
+async def get_intent_routing_stats(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Messages routed by keyword in this process vs left for the model
+    return intent_router.stats()
+
+@app.get("/api/admin/conversations")
+async def get_conversation_stats(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Booking dialogue state held by this process
+    return conversation_store.stats()
+
+@app.get("/api/admin/compression")
+async def get_compression_stats(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Bytes on the wire and CPU spent per encoding in this process
+    return compression_stats.snapshot()
+
+@app.get("/api/admin/jobs")
+async def get_job_queue_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Depth and wait of the shared queue, plus the workers of this process
+    return {"queue": queue_metrics(db), "worker": job_worker.stats()}
+
+@app.post("/api/admin/jobs", response_model=JobResponse)
+async def create_job_endpoint(
+    job_data: JobCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    if job_data.kind not in HANDLERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job kind: {job_data.kind}"
+        )
+    
+    job_id = enqueue(db, job_data.kind, job_data.payload, job_data.organization_id, job_data.priority,
+                     naive_utc(job_data.run_at) if job_data.run_at else None, job_data.max_attempts,
+                     job_data.unique_key)
+    return db.get(Job, job_id)
+
+@app.get("/api/admin/jobs/{job_id}", response_model=JobResponse)
+async def get_job_endpoint(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@app.get("/api/admin/events")
+async def get_event_hub_stats(
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    return event_hub.stats()
+
+# Live updates
+@app.get("/api/organizations/{org_id}/events")
+async def organization_events(
+    org_id: int,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # EventSource cannot send headers, so the token may also come as ?token=.
+    # The user is looked up with a short-lived session: no connection is held for the stream.
+    payload = verify_token(credentials.credentials if credentials else token or "")
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    db = SessionLocal()
+    try:
+        current_user = get_user_by_id(db, payload.get("sub"))
+    finally:
+        db.close()
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    try:
+        subscription = event_hub.subscribe(org_id)
+    except TooManySubscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live connections for this organization"
+        )
+    return StreamingResponse(
+        event_hub.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Message endpoints
 @app.get("/api/organizations/{org_id}/messages", response_model=List[MessageResponse])
@@ -366,7 +860,92 @@ async def get_messages(
             detail="Access denied"
         )
     
-    return get_organization_messages(db, org_id)
+    return list_response(MessageResponse, list_organization_messages(db, org_id))
+
+@app.get("/api/organizations/{org_id}/messages/export")
+async def export_messages(
+    org_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # NDJSON (or MessagePack maps) across the archive and hot tiers, oldest first
+    return StreamingResponse(encode_records(iter_messages(db, org_id, start, end)), media_type=records_media_type())
+
+@app.get("/api/organizations/{org_id}/messages/search", response_model=MessageSearchResponse)
+async def search_organization_messages(
+    org_id: int,
+    q: str,
+    channel: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    return search_messages(db, org_id, q, channel=channel, customer_id=customer_id, start=start, end=end,
+                           limit=max(1, min(limit, 100)), offset=max(offset, 0))
+
+@app.get("/api/organizations/{org_id}/customers/lookup", response_model=CustomerDetail)
+async def lookup_customer(
+    org_id: int,
+    channel: Optional[str] = None,
+    handle: Optional[str] = None,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    if bool(channel) != bool(handle) or not (handle or phone or email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="give a channel and handle, a phone or an email"
+        )
+    
+    customer_id = find_customer_id(db, org_id, channel, handle, phone, email)
+    customer = get_customer_detail(db, org_id, customer_id) if customer_id is not None else None
+    if customer is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Customer not found"
+        )
+    return customer
+
+@app.get("/api/organizations/{org_id}/customers/{customer_id}/messages", response_model=List[MessageResponse])
+async def get_customer_messages(
+    org_id: int,
+    customer_id: str,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    return get_customer_thread(db, org_id, customer_id, min(limit, 1000))
 
 @app.post("/api/organizations/{org_id}/messages", response_model=MessageResponse)
 async def create_message_endpoint(
@@ -384,5 +963,69 @@ async def create_message_endpoint(
     message_data.organization_id = org_id
     return create_message(db, message_data)
 
+@app.post("/api/organizations/{org_id}/intents/classify", response_model=IntentClassifyResponse)
+async def classify_intents(
+    org_id: int,
+    request: IntentClassifyRequest,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    if len(request.messages) > 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="at most 1000 messages per request"
+        )
+    
+    results = [match.as_dict() for match in intent_router.classify_batch(org_id, request.messages)]
+    return {"results": results, "routed": sum(result["routed"] for result in results), "total": len(results)}
+
+@app.get("/api/organizations/{org_id}/intents/pending", response_model=IntentQueueResponse)
+async def classify_pending_messages(
+    org_id: int,
+    after_id: int = 0,
+    limit: int = 500,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    classified = intent_router.classify_pending(db, org_id, after_id, max(1, min(limit, 1000)))
+    results = [{"message_id": message_id, **match.as_dict()} for message_id, match in classified]
+    return {"results": results, "routed": sum(result["routed"] for result in results), "total": len(results),
+            "last_id": classified[-1][0] if classified else after_id}
+
+@app.post("/api/organizations/{org_id}/outbound", status_code=status.HTTP_202_ACCEPTED)
+async def send_outbound_message(
+    org_id: int,
+    message_data: OutboundMessageCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.organization_id != org_id and current_user.role != "saas_owner":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    if outbound_dispatcher is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Outbound messaging is not configured"
+        )
+    
+    queued = outbound_dispatcher.enqueue(
+        org_id, message_data.channel.value, message_data.customer_id,
+        message_data.content, message_data.message_type
+    )
+    return {"queued": queued}
+
 if __name__ == "__main__":
+    init_db()
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Text, JSON, ForeignKey, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -46,6 +46,7 @@ class Configuration(Base):
     telegram_config = Column(JSON, default={})
     ai_config = Column(JSON, default={})
     appointment_settings = Column(JSON, default={})
+    calendar_config = Column(JSON, default={})
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -63,6 +64,7 @@ class Document(Base):
     url = Column(String(500))
     size = Column(Integer)
     status = Column(String(50), default="processing")  # processing, processed, error
+    change_version = Column(Integer, nullable=False, default=0, server_default="0")  # Collection version of the last write, see changes.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -79,6 +81,7 @@ class ServiceType(Base):
     duration = Column(Integer, nullable=False)  # in minutes
     price = Column(Float, default=0.0)
     is_active = Column(Boolean, default=True)
+    change_version = Column(Integer, nullable=False, default=0, server_default="0")  # Collection version of the last write, see changes.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -99,12 +102,21 @@ class Appointment(Base):
     status = Column(String(50), default="scheduled")  # scheduled, confirmed, cancelled, completed
     channel = Column(String(50))  # whatsapp, telegram
     notes = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    customer_id = Column(Integer, ForeignKey("customers.id"))  # Directory entry, see customers.py
+    change_version = Column(Integer, nullable=False, default=0, server_default="0")  # Collection version of the last write, see changes.py
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)
     
     # Relationships
     organization = relationship("Organization", back_populates="appointments")
     service_type = relationship("ServiceType", back_populates="appointments")
+    
+    __table_args__ = (
+        Index("ix_appointments_organization_id_appointment_date", "organization_id", "appointment_date",
+              "status", "service_type_id"),
+        Index("ix_appointments_organization_id_customer_id", "organization_id", "customer_id", "appointment_date"),
+        Index("ix_appointments_organization_id_change_version", "organization_id", "change_version"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -117,10 +129,25 @@ class Message(Base):
     content = Column(Text)
     is_from_customer = Column(Boolean, default=True)
     response_time = Column(Float)  # in seconds
+    external_id = Column(String(255))  # Provider message ID, used to drop webhook retries
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     organization = relationship("Organization", back_populates="messages")
+    
+    __table_args__ = (
+        Index("ix_messages_organization_id_created_at", "organization_id", "created_at"),
+        Index("uq_messages_organization_id_channel_external_id", "organization_id", "channel", "external_id",
+              unique=True),
+    )
+
+class ArchivedMessageKey(Base):
+    __tablename__ = "archived_message_keys"  # Unique keys of archived messages, so retries still match
+    
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    channel = Column(String(50), primary_key=True)
+    external_id = Column(String(255), primary_key=True)
+    message_id = Column(Integer, nullable=False)  # Id the message had in the hot table
 
 class Analytics(Base):
     __tablename__ = "analytics"
@@ -131,4 +158,126 @@ class Analytics(Base):
     metric_value = Column(Float, nullable=False)
     date = Column(DateTime(timezone=True), nullable=False)
     analytics_metadata = Column(JSON, default={})  # Renamed from 'metadata'
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ReminderState(Base):
+    __tablename__ = "reminder_state"
+    
+    id = Column(Integer, primary_key=True)
+    watermark = Column(DateTime(timezone=True))  # due time of the last dispatched reminder
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class OutboundDeadLetter(Base):
+    __tablename__ = "outbound_dead_letters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False, index=True)
+    channel = Column(String(50), nullable=False)
+    customer_id = Column(String(255), nullable=False)
+    message_type = Column(String(50), default="text")
+    content = Column(Text)
+    attempts = Column(Integer, nullable=False)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CalendarBusyInterval(Base):
+    __tablename__ = "calendar_busy_intervals"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    calendar_id = Column(String(255), nullable=False)
+    event_id = Column(String(255), nullable=False)  # Provider event ID
+    start = Column(DateTime, nullable=False)  # UTC
+    end = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("uq_calendar_busy_intervals_event", "organization_id", "calendar_id", "event_id", unique=True),
+        Index("ix_calendar_busy_intervals_organization_id_start", "organization_id", "start"),
+    )
+
+class CalendarSyncState(Base):
+    __tablename__ = "calendar_sync_state"
+    
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    calendar_id = Column(String(255), primary_key=True)
+    sync_token = Column(Text)  # Provider token for the next incremental sync
+    synced_at = Column(DateTime(timezone=True))
+    full_synced_at = Column(DateTime(timezone=True))
+
+class MetricSketch(Base):
+    __tablename__ = "metric_sketches"
+    
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(50), nullable=False)  # e.g. response_time; see sketches.SKETCH_TYPES
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    channel = Column(String(50), nullable=False)
+    day = Column(Date, nullable=False)  # UTC
+    count = Column(Integer, nullable=False, default=0)  # Values recorded in the sketch
+    data = Column(LargeBinary, nullable=False)  # Serialized sketch
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("uq_metric_sketches_organization_id_metric_day_channel", "organization_id", "metric", "day", "channel",
+              unique=True),
+    )
+
+class Customer(Base):
+    __tablename__ = "customers"
+    
+    id = Column(Integer, primary_key=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    name = Column(String(255))
+    phone = Column(String(50))  # Normalized, e.g. +919876543210
+    email = Column(String(255))  # Normalized (lowercase)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("uq_customers_organization_id_phone", "organization_id", "phone", unique=True),
+        Index("uq_customers_organization_id_email", "organization_id", "email", unique=True),
+    )
+
+class CustomerHandle(Base):
+    __tablename__ = "customer_handles"
+    
+    # A sender id on one channel, e.g. a WhatsApp number or a Telegram user id
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    channel = Column(String(50), primary_key=True)
+    handle = Column(String(255), primary_key=True)  # Normalized, see customers.normalize_handle
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)  # Handler name, see jobs.HANDLERS
+    organization_id = Column(Integer, ForeignKey("organizations.id"))  # None for platform-wide jobs
+    payload = Column(JSON, default={})
+    priority = Column(Integer, nullable=False, default=100)  # Lower runs first
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, done, failed
+    run_at = Column(DateTime, nullable=False)  # UTC; not claimed before this
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    locked_by = Column(String(100))  # Worker holding the job while running
+    locked_until = Column(DateTime)  # UTC; the job is requeued if not finished or extended by then
+    unique_key = Column(String(255))  # Optional; one job per (kind, unique_key)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_jobs_status_priority_run_at", "status", "priority", "run_at"),
+        Index("uq_jobs_kind_unique_key", "kind", "unique_key", unique=True),
+    )
+
+class ChangeVersion(Base):
+    __tablename__ = "change_versions"
+    
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    collection = Column(String(50), primary_key=True)  # See changes.COLLECTIONS
+    version = Column(Integer, nullable=False, default=0)  # Bumped in every transaction that writes the collection
+    reset_version = Column(Integer, nullable=False, default=0)  # Last version that deleted rows
+    changed_at = Column(DateTime, nullable=False)  # UTC
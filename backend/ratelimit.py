@@ -0,0 +1,239 @@
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from auth import verify_token
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available; returns 0, or the seconds to wait until they would be."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire_up_to(self, tokens: int) -> int:
+        """Take as many whole tokens as are available, at most `tokens`."""
+        with self._lock:
+            self._refill(time.monotonic())
+            granted = min(int(self.tokens), tokens)
+            self.tokens -= granted
+            return granted
+
+    def wait_time(self, tokens: float = 1) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Empty the bucket for `seconds`, e.g. after a provider's Retry-After."""
+        with self._lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+            self.updated = time.monotonic()
+
+# Per-tenant admission control for the API
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" else None
+    return None
+
+class RoutePolicy:
+    """Limits for one class of routes, applied separately to every tenant."""
+
+    __slots__ = ("rate", "burst", "max_concurrency", "max_queue", "queue_timeout")
+
+    def __init__(self, rate: float, burst: float, max_concurrency: int,
+                 max_queue: int = 10, queue_timeout: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+DEFAULT_POLICIES = {
+    "default": RoutePolicy(rate=50, burst=100, max_concurrency=8, max_queue=32, queue_timeout=1.0),
+    "expensive": RoutePolicy(rate=2, burst=5, max_concurrency=2, max_queue=4, queue_timeout=2.0),
+    # Login and registration hash passwords with bcrypt; limited per client address
+    "auth": RoutePolicy(rate=5, burst=20, max_concurrency=2, max_queue=4, queue_timeout=2.0),
+}
+
+# (pattern, route class) checked in order; a None class is not limited
+ROUTE_CLASSES = [
+    # Long-lived SSE streams would hold a concurrency slot for their whole life
+    (re.compile(r"^/api/organizations/\d+/events$"), None),
+    (re.compile(r"^/api/organizations/\d+/(analytics|messages/export)"), "expensive"),
+    (re.compile(r"^/api/analytics/"), "expensive"),
+    (re.compile(r"^/api/auth/"), "auth"),
+]
+
+TENANT_PATH = re.compile(r"^/api/organizations/(\d+)(/|$)")
+# Idle states are dropped beyond this many (per-client ones first) and tenants past it share one
+# counter, so scanning addresses or organization ids cannot grow memory without bound
+MAX_STATES = 10000
+
+class _TenantState:
+    __slots__ = ("bucket", "semaphore", "active", "waiting")
+
+    def __init__(self, policy: RoutePolicy):
+        self.bucket = TokenBucket(policy.rate, policy.burst)
+        self.semaphore = asyncio.Semaphore(policy.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+class AdmissionController:
+    """Per-tenant, per-route-class request rates and concurrency caps.
+
+    Requests over the rate get 429; requests that cannot get a concurrency slot
+    within the class's queue timeout (or find the queue full) get 503. Both carry
+    Retry-After. A tenant is charged only for requests with a verified bearer
+    token: the id in the path is the caller's to choose, so unauthenticated
+    requests, like routes outside /api/organizations/{id} (login, registration,
+    platform admin), are limited per client address instead. One client
+    flooding the login, or another tenant's URLs, cannot lock out others; the
+    per-client counters are reported together under "clients".
+    """
+
+    def __init__(self, policies: dict = None, route_classes: list = None):
+        self.policies = policies or DEFAULT_POLICIES
+        self.route_classes = route_classes if route_classes is not None else ROUTE_CLASSES
+        self._states = {}
+        self.counters = defaultdict(lambda: {"admitted": 0, "queued": 0, "rate_limited": 0, "shed": 0})
+
+    def classify(self, path: str, client: str = None, token: str = None):
+        """Return (tenant, route class) for a request path, or None when not limited."""
+        if not path.startswith("/api/") or path == "/api/health":
+            return None
+        match = TENANT_PATH.match(path)
+        if match and token and verify_token(token) is not None:
+            tenant = match.group(1)
+        else:
+            tenant = f"client:{client or 'unknown'}"
+        for pattern, route_class in self.route_classes:
+            if pattern.match(path):
+                return (tenant, route_class) if route_class else None
+        return tenant, "default"
+
+    def state(self, key, policy: RoutePolicy) -> "_TenantState":
+        state = self._states.get(key)
+        if state is None:
+            if len(self._states) >= MAX_STATES:
+                self._prune()
+            state = self._states[key] = _TenantState(policy)
+        return state
+
+    def _prune(self) -> None:
+        idle = [key for key, state in self._states.items() if not state.active and not state.waiting]
+        # Per-client states first; dropping a tenant's refills its bucket
+        idle.sort(key=lambda key: not key[0].startswith("client:"))
+        for key in idle[:len(self._states) - MAX_STATES // 2]:
+            del self._states[key]
+
+    def tenant_counters(self, tenant: str) -> dict:
+        if tenant.startswith("client:"):
+            return self.counters["clients"]
+        if tenant not in self.counters and len(self.counters) >= MAX_STATES:
+            return self.counters["other"]
+        return self.counters[tenant]
+
+    def snapshot(self) -> dict:
+        """Counters and current load per tenant."""
+        result = {tenant: dict(counts) for tenant, counts in self.counters.items()}
+        for (tenant, route_class), state in self._states.items():
+            if tenant.startswith("client:"):
+                continue
+            entry = result.setdefault(tenant, {})
+            entry[f"{route_class}_active"] = state.active
+            entry[f"{route_class}_waiting"] = state.waiting
+        return result
+
+class TenantAdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to every HTTP request."""
+
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        key = self.controller.classify(scope["path"], client[0] if client else None, _bearer_token(scope))
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        tenant, route_class = key
+        policy = self.controller.policies[route_class]
+        state = self.controller.state(key, policy)
+        counters = self.controller.tenant_counters(tenant)
+
+        wait = state.bucket.try_acquire()
+        if wait:
+            counters["rate_limited"] += 1
+            await self._reject(send, 429, "Too many requests", wait)
+            return
+
+        if state.semaphore.locked():
+            if state.waiting >= policy.max_queue:
+                counters["shed"] += 1
+                await self._reject(send, 503, "Server busy", policy.queue_timeout)
+                return
+            counters["queued"] += 1
+            state.waiting += 1
+            try:
+                await asyncio.wait_for(state.semaphore.acquire(), policy.queue_timeout)
+            except asyncio.TimeoutError:
+                counters["shed"] += 1
+                await self._reject(send, 503, "Server busy", policy.queue_timeout)
+                return
+            finally:
+                state.waiting -= 1
+        else:
+            await state.semaphore.acquire()
+
+        counters["admitted"] += 1
+        state.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            state.active -= 1
+            state.semaphore.release()
+
+    async def _reject(self, send, status_code: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
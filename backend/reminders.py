@@ -0,0 +1,345 @@
+"""Appointment reminder scheduling.
+
+Upcoming appointments are kept in a heap ordered by reminder due time. Entries
+are replaced lazily: rescheduling or cancelling only updates the per-appointment
+record, and stale heap entries are skipped when they surface. Due reminders are
+handed to a channel sender in batches and the due time of the last dispatched
+batch is persisted as a watermark after every batch, so a restart reloads only
+what is still pending. A batch the sender fails on goes back on the schedule,
+minus the reminders cancelled or rescheduled while it was being sent.
+
+An appointment booked less than the reminder lead time ahead is reminded
+right away rather than skipped, and so is a pending reminder whose due time
+moved into the past (reminderTime was raised). Naive datetimes are UTC, as
+everywhere else in the backend.
+
+Run it in exactly one process, either with REMINDERS_ENABLED=true on a single
+API worker or standalone with `python reminders.py`.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Appointment, Configuration, ReminderState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REMINDER_MINUTES = 60
+ACTIVE_STATUSES = ("scheduled", "confirmed")
+# Re-read a little before the last sync so slow commits from other workers are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+class Reminder:
+    __slots__ = ("appointment_id", "organization_id", "due", "appointment_date",
+                 "customer_name", "customer_phone", "channel")
+
+    def __init__(self, appointment_id, organization_id, due, appointment_date,
+                 customer_name, customer_phone, channel):
+        self.appointment_id = appointment_id
+        self.organization_id = organization_id
+        self.due = due
+        self.appointment_date = appointment_date
+        self.customer_name = customer_name
+        self.customer_phone = customer_phone
+        self.channel = channel
+
+class LocalStubSender:
+    """Channel sender that logs reminders and keeps them in memory."""
+
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.sent: List[Reminder] = []
+
+    def send_batch(self, reminders: List[Reminder]) -> None:
+        if self.keep:
+            self.sent.extend(reminders)
+        logger.info("Sent %d appointment reminders", len(reminders))
+
+def reminder_minutes(appointment_settings: Optional[dict]) -> Optional[int]:
+    """Minutes before the appointment to remind, or None when reminders are off."""
+    settings = appointment_settings or {}
+    if not settings.get("reminderNotifications", True):
+        return None
+    return int(settings.get("reminderTime", DEFAULT_REMINDER_MINUTES))
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class ReminderScheduler:
+    def __init__(self, sender=None, batch_size: int = 500, session_factory=SessionLocal):
+        self.sender = sender or LocalStubSender()
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.watermark = 0.0
+        self.synced_at: Optional[datetime] = None
+        self.dispatched = 0
+        self._heap: list = []
+        self._pending: Dict[int, Reminder] = {}
+        self._org_minutes: Dict[int, Optional[int]] = {}
+        # Appointment id -> appointment timestamp of reminders already sent, so updates do not resend them
+        self._reminded: Dict[int, float] = {}
+        # Organizations whose reminder settings changed and whose appointments need re-tracking
+        self._stale_orgs: set = set()
+        # Popped reminders being sent; rescheduling or cancelling one drops it here
+        self._in_flight: Dict[int, Reminder] = {}
+        # Guards the schedule and the state above; track_appointment takes it around schedule/cancel
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # Keeping the schedule in sync
+    def schedule(self, reminder: Reminder) -> None:
+        with self._lock:
+            self._pending[reminder.appointment_id] = reminder
+            self._in_flight.pop(reminder.appointment_id, None)
+            heapq.heappush(self._heap, (reminder.due, reminder.appointment_id))
+            self._compact()
+
+    def cancel(self, appointment_id: int) -> None:
+        with self._lock:
+            self._pending.pop(appointment_id, None)
+            self._in_flight.pop(appointment_id, None)
+            self._compact()
+
+    def _compact(self) -> None:
+        # Drop stale heap entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._pending) + 1024:
+            self._heap = [(r.due, r.appointment_id) for r in self._pending.values()]
+            heapq.heapify(self._heap)
+
+    def set_org_settings(self, org_id: int, appointment_settings: Optional[dict]) -> bool:
+        """Record an organization's reminder settings; True when its appointments need re-tracking."""
+        minutes = reminder_minutes(appointment_settings)
+        with self._lock:
+            if org_id in self._org_minutes and self._org_minutes[org_id] != minutes:
+                self._stale_orgs.add(org_id)
+            self._org_minutes[org_id] = minutes
+            return org_id in self._stale_orgs
+
+    def track_appointment(self, appointment, loading: bool = False) -> None:
+        """Schedule, reschedule or cancel the reminder for an appointment row or entity."""
+        with self._lock:
+            self._track(appointment, loading)
+
+    def _track(self, appointment, loading: bool) -> None:
+        minutes = self._org_minutes.get(appointment.organization_id, DEFAULT_REMINDER_MINUTES)
+        starts = _timestamp(appointment.appointment_date)
+        now = time.time()
+        if appointment.status not in ACTIVE_STATUSES or minutes is None or starts <= now:
+            self.cancel(appointment.id)
+            return
+        due = starts - minutes * 60
+        if due <= self.watermark:
+            # The reminder time has passed. Send it now if it never went out: the
+            # reminder was still pending, or the appointment was booked inside the
+            # lead time (on a reload: after the last dispatch).
+            created_at = getattr(appointment, "created_at", None)
+            booked = _timestamp(created_at) if created_at is not None else None
+            late = booked is not None and booked > due and (not loading or booked > self.watermark)
+            if self._reminded.get(appointment.id) == starts or not (late or appointment.id in self._pending):
+                self.cancel(appointment.id)
+                if loading:
+                    self._reminded[appointment.id] = starts
+                return
+            due = now
+        self.schedule(Reminder(
+            appointment.id, appointment.organization_id, due, appointment.appointment_date,
+            appointment.customer_name, appointment.customer_phone, appointment.channel
+        ))
+
+    # Loading and incremental sync
+    def _load_org_settings(self, db: Session) -> None:
+        for org_id, settings in db.execute(
+            select(Configuration.organization_id, Configuration.appointment_settings)
+        ):
+            self.set_org_settings(org_id, settings)
+
+    def _appointment_rows(self, db: Session, *criteria):
+        return db.execute(
+            select(Appointment.id, Appointment.organization_id, Appointment.appointment_date,
+                   Appointment.status, Appointment.customer_name, Appointment.customer_phone,
+                   Appointment.channel, Appointment.created_at).where(*criteria).execution_options(yield_per=10000)
+        )
+
+    def load(self, db: Session) -> int:
+        """Rebuild the schedule from the database after the persisted watermark."""
+        state = db.get(ReminderState, 1)
+        self.watermark = _timestamp(state.watermark) if state and state.watermark else time.time()
+        self.synced_at = datetime.utcnow()
+        self._load_org_settings(db)
+        with self._lock:
+            self._stale_orgs.clear()
+        # A reminder is due before its appointment, so anything at or before the
+        # watermark has already been reminded
+        horizon = datetime.utcfromtimestamp(self.watermark)
+        for row in self._appointment_rows(
+            db, Appointment.status.in_(ACTIVE_STATUSES), Appointment.appointment_date > horizon
+        ):
+            self.track_appointment(row, loading=True)
+        return len(self)
+
+    def retrack_organization(self, db: Session, org_id: int) -> int:
+        """Recompute an organization's reminders after its reminder settings changed."""
+        with self._lock:
+            self._stale_orgs.discard(org_id)
+        count = 0
+        for row in self._appointment_rows(
+            db, Appointment.organization_id == org_id, Appointment.status.in_(ACTIVE_STATUSES),
+            Appointment.appointment_date > datetime.utcnow()
+        ):
+            self.track_appointment(row)
+            count += 1
+        return count
+
+    def sync_changes(self, db: Session) -> int:
+        """Pick up appointments written by other processes since the last sync."""
+        since, self.synced_at = self.synced_at, datetime.utcnow()
+        if since is None:
+            return self.load(db)
+        self._load_org_settings(db)
+        changed = 0
+        with self._lock:
+            stale = list(self._stale_orgs)
+        for org_id in stale:
+            changed += self.retrack_organization(db, org_id)
+        since -= SYNC_OVERLAP
+        for row in self._appointment_rows(
+            db, or_(Appointment.created_at >= since, Appointment.updated_at >= since)
+        ):
+            self.track_appointment(row)
+            changed += 1
+        return changed
+
+    # Dispatch
+    def pop_due(self, now: float, limit: int) -> List[Reminder]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                ts, appointment_id = heapq.heappop(self._heap)
+                reminder = self._pending.get(appointment_id)
+                if reminder is None or reminder.due != ts:
+                    continue  # cancelled or rescheduled
+                del self._pending[appointment_id]
+                self._in_flight[appointment_id] = reminder
+                due.append(reminder)
+        return due
+
+    def _requeue(self, batch: List[Reminder]) -> None:
+        # Back on the schedule unless cancelled or rescheduled while the batch was out
+        with self._lock:
+            for reminder in batch:
+                if self._in_flight.pop(reminder.appointment_id, None) is reminder:
+                    self._pending[reminder.appointment_id] = reminder
+                    heapq.heappush(self._heap, (reminder.due, reminder.appointment_id))
+
+    def dispatch_due(self, now: Optional[float] = None, persist: bool = True) -> int:
+        """Send every reminder due at `now` in batches; returns how many were sent.
+
+        A failed batch is rescheduled and the error re-raised; batches sent
+        before it stay sent and their watermark is saved.
+        """
+        now = time.time() if now is None else now
+        sent = 0
+        while True:
+            batch = self.pop_due(now, self.batch_size)
+            if not batch:
+                break
+            try:
+                self.sender.send_batch(batch)
+            except Exception:
+                self._requeue(batch)
+                raise
+            sent += len(batch)
+            self.dispatched += len(batch)
+            with self._lock:
+                self.watermark = max(self.watermark, batch[-1].due)
+                for reminder in batch:
+                    self._in_flight.pop(reminder.appointment_id, None)
+                    self._reminded[reminder.appointment_id] = _timestamp(reminder.appointment_date)
+                if len(self._reminded) > 2 * len(self._pending) + 1024:
+                    self._reminded = {key: starts for key, starts in self._reminded.items() if starts > now}
+            if persist:
+                self.save_watermark()
+        return sent
+
+    def save_watermark(self) -> None:
+        db = self.session_factory()
+        try:
+            state = db.get(ReminderState, 1) or ReminderState(id=1)
+            state.watermark = datetime.utcfromtimestamp(self.watermark)
+            db.add(state)
+            db.commit()
+        finally:
+            db.close()
+
+    # Background loop
+    def run(self, tick: float = 1.0, sync_interval: float = 30.0) -> None:
+        db = self.session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+        next_sync = time.monotonic() + sync_interval
+        while not self._stop.wait(tick):
+            try:
+                if time.monotonic() >= next_sync:
+                    db = self.session_factory()
+                    try:
+                        self.sync_changes(db)
+                    finally:
+                        db.close()
+                    next_sync = time.monotonic() + sync_interval
+                self.dispatch_due()
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+
+    def start(self, **kwargs) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, kwargs=kwargs, name="reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+# Process-wide scheduler; crud write paths keep it current when it is running here
+reminder_scheduler = ReminderScheduler()
+
+def on_appointment_changed(appointment) -> None:
+    if reminder_scheduler.running:
+        reminder_scheduler.track_appointment(appointment)
+
+def on_configuration_changed(org_id: int, appointment_settings: Optional[dict]) -> None:
+    if reminder_scheduler.running:
+        if reminder_scheduler.set_org_settings(org_id, appointment_settings):
+            db = reminder_scheduler.session_factory()
+            try:
+                reminder_scheduler.retrack_organization(db, org_id)
+            finally:
+                db.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    reminder_scheduler.run(
+        tick=float(os.getenv("REMINDER_TICK_SECONDS", 1)),
+        sync_interval=float(os.getenv("REMINDER_SYNC_SECONDS", 30))
+    )
@@ -1,13 +1,94 @@
-import uvicorn
+import argparse
 import os
+import subprocess
+import sys
+
+import uvicorn
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def migrate_database():
+    """Bring the schema up to date once, before any worker imports the app."""
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import inspect
+    from database import engine, SQLALCHEMY_DATABASE_URL
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+
+    tables = inspect(engine).get_table_names()
+    if "organizations" in tables and "alembic_version" not in tables:
+        # Databases created with create_all before migrations existed
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
+    engine.dispose()
+
+def profile_imports(module: str = "main", top: int = 25) -> float:
+    """Print the slowest imports of a module and return the total import time in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    rows = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative_us), int(self_us), name))
+        # Top-level imports are not indented; their cumulative times add up to the total
+        if not line.split("|")[2].startswith("  "):
+            total_us += int(cumulative_us)
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"Total import time for '{module}': {total_us / 1000:.1f} ms")
+    return total_us / 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI Appointment Assistant API")
+    parser.add_argument("--production", action="store_true",
+                        default=os.getenv("APP_ENV", "development") == "production",
+                        help="multi-worker serving with uvloop/httptools and no reload")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8000)))
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="print an import-time report for main.py and exit")
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        profile_imports()
+        return
+
+    if args.production:
+        migrate_database()
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop",
+            http="httptools",
+            proxy_headers=True,
+            access_log=os.getenv("ACCESS_LOG", "false").lower() == "true"
+        )
+    else:
+        from database import init_db
+        init_db()
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=True
+        )
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host=os.getenv("API_HOST", "0.0.0.0"),
-        port=int(os.getenv("API_PORT", 8000)),
-        reload=True
-    )
\ No newline at end of file
+    main()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, model_validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from enum import Enum
@@ -26,6 +26,11 @@ class DocumentStatus(str, Enum):
     PROCESSED = "processed"
     ERROR = "error"
 
+class OutboundChannel(str, Enum):
+    # Channels the outbound provider serves; the value is part of its URL
+    WHATSAPP = "whatsapp"
+    TELEGRAM = "telegram"
+
 # Base schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -83,6 +88,7 @@ class ConfigurationBase(BaseModel):
     telegram_config: Dict[str, Any] = {}
     ai_config: Dict[str, Any] = {}
     appointment_settings: Dict[str, Any] = {}
+    calendar_config: Dict[str, Any] = {}
 
 class ConfigurationCreate(ConfigurationBase):
     organization_id: int
@@ -161,16 +167,56 @@ class AppointmentUpdate(BaseModel):
     status: Optional[AppointmentStatus] = None
     notes: Optional[str] = None
 
+BULK_UPDATE_MAX_IDS = 1000
+
+class AppointmentBulkUpdate(AppointmentUpdate):
+    # Either explicit ids, or every appointment in [start, end) (optionally only those in current_status)
+    ids: Optional[List[int]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    current_status: Optional[AppointmentStatus] = None
+    shift_minutes: Optional[int] = None  # move appointments by this much instead of to appointment_date
+
+    @model_validator(mode="after")
+    def check_selection_and_changes(self):
+        if self.ids is None and (self.start is None or self.end is None):
+            raise ValueError("give ids, or a start and end window")
+        if self.ids is not None and len(self.ids) > BULK_UPDATE_MAX_IDS:
+            raise ValueError(f"at most {BULK_UPDATE_MAX_IDS} ids per request")
+        if self.appointment_date is not None and self.shift_minutes:
+            raise ValueError("appointment_date and shift_minutes are mutually exclusive")
+        if self.status is None and self.notes is None and self.appointment_date is None and not self.shift_minutes:
+            raise ValueError("nothing to update")
+        return self
+
+class AppointmentBulkUpdateResult(BaseModel):
+    requested: int
+    rows_affected: int
+    outcomes: Dict[int, str]  # updated or not_found
+
 class AppointmentResponse(AppointmentBase):
     id: int
     organization_id: int
     service_type_id: int
     status: str
+    customer_id: Optional[int] = None  # Customer directory entry
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class AppointmentBucket(BaseModel):
+    period: str  # first day of the bucket, YYYY-MM-DD
+    total: int
+    by_status: Dict[str, int]
+    by_service_type: Dict[str, int]
+
+class AppointmentCalendarResponse(BaseModel):
+    start: datetime
+    end: datetime
+    granularity: str
+    buckets: List[AppointmentBucket]
+
 # Message schemas
 class MessageBase(BaseModel):
     customer_id: str
@@ -182,24 +228,157 @@ class MessageCreate(MessageBase):
     organization_id: Optional[int] = None
     is_from_customer: bool = True
     response_time: Optional[float] = None
+    external_id: Optional[str] = None
 
 class MessageResponse(MessageBase):
     id: int
     organization_id: int
     is_from_customer: bool
     response_time: Optional[float]
+    external_id: Optional[str] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class MessageSearchResult(MessageResponse):
+    rank: float
+    snippet: str
+
+class MessageSearchResponse(BaseModel):
+    results: List[MessageSearchResult]
+    limit: int
+    offset: int
+    has_more: bool
+
+class OutboundMessageCreate(BaseModel):
+    customer_id: str
+    channel: OutboundChannel
+    content: str
+    message_type: str = "text"
+
+# Calendar schemas
+class BusyInterval(BaseModel):
+    start: datetime
+    end: datetime
+
+class FreeBusyResponse(BaseModel):
+    start: datetime
+    end: datetime
+    busy: List[BusyInterval]
+
 # Analytics schemas
 class AnalyticsData(BaseModel):
     total_messages: int
     total_appointments: int
     active_users: int
     avg_response_time: float
+    response_time_percentiles: Dict[str, Any] = {}
+    unique_customers: Dict[str, Any] = {}
     channel_breakdown: Dict[str, int]
     appointment_status_breakdown: Dict[str, int]
     daily_activity: List[Dict[str, Any]]
-    monthly_trends: List[Dict[str, Any]]
\ No newline at end of file
+    monthly_trends: List[Dict[str, Any]]
+
+class ResponseTimeSummary(BaseModel):
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    mean: Optional[float] = None
+    count: int
+
+class DailyResponseTime(ResponseTimeSummary):
+    date: str
+
+class ResponseTimeReport(BaseModel):
+    start: str
+    end: str  # exclusive
+    overall: ResponseTimeSummary
+    by_channel: Dict[str, ResponseTimeSummary]
+    daily: List[DailyResponseTime]
+
+class UniqueCustomerBucket(BaseModel):
+    period: str  # first day of the bucket, YYYY-MM-DD
+    unique_customers: int
+
+class UniqueCustomersReport(BaseModel):
+    start: str
+    end: str  # exclusive
+    granularity: str
+    unique_customers: int  # HyperLogLog estimate, ~1.6% standard error
+    by_channel: Dict[str, int]
+    buckets: List[UniqueCustomerBucket]
+
+# Customer directory schemas
+class CustomerHandleResponse(BaseModel):
+    channel: str
+    handle: str
+
+class CustomerResponse(BaseModel):
+    id: int
+    organization_id: int
+    name: Optional[str] = None
+    phone: Optional[str] = None  # Normalized, e.g. +919876543210
+    email: Optional[str] = None
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class CustomerDetail(CustomerResponse):
+    handles: List[CustomerHandleResponse]
+    appointments: List[AppointmentResponse]  # Newest first
+
+# Intent routing schemas
+class IntentClassifyRequest(BaseModel):
+    messages: List[str]
+
+class IntentResult(BaseModel):
+    intent: Optional[str] = None  # None: needs the model
+    routed: bool
+    keywords: List[str]
+    scores: Dict[str, int]
+
+class IntentClassifyResponse(BaseModel):
+    results: List[IntentResult]
+    routed: int
+    total: int
+
+class QueuedMessageIntent(IntentResult):
+    message_id: int
+
+class IntentQueueResponse(BaseModel):
+    results: List[QueuedMessageIntent]
+    routed: int
+    total: int
+    last_id: int  # pass as after_id for the next batch
+# Job queue schemas
+class JobCreate(BaseModel):
+    kind: str
+    payload: Dict[str, Any] = {}
+    organization_id: Optional[int] = None
+    priority: int = 100  # Lower runs first
+    run_at: Optional[datetime] = None  # Default: now
+    max_attempts: int = 5
+    unique_key: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    organization_id: Optional[int] = None
+    payload: Optional[Dict[str, Any]] = None
+    priority: int
+    status: str  # queued, running, done, failed
+    run_at: datetime  # UTC
+    attempts: int
+    max_attempts: int
+    locked_by: Optional[str] = None
+    locked_until: Optional[datetime] = None
+    unique_key: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,126 @@
+"""Full-text search over message content.
+
+SQLite: an FTS5 index over `messages` (external content, so text is not stored
+twice) kept in sync by triggers. The organization id is indexed as a second
+column so tenant scoping is part of the full-text match instead of a filter
+over every tenant's hits. Postgres: a generated tsvector column with a GIN index.
+The 'simple' configuration / unicode61 tokenizer are used because most of the
+traffic is Hinglish, which language stemmers would mangle.
+"""
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, organization_id, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, organization_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, organization_id)
+        VALUES ('delete', old.id, old.content, old.organization_id);
+        INSERT INTO messages_fts(rowid, content, organization_id)
+        VALUES (new.id, new.content, new.organization_id);
+    END""",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TABLE IF EXISTS messages_fts",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING GIN (content_tsv)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_messages_content_tsv",
+    "ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv",
+]
+
+RESULT_COLUMNS = ("m.id, m.organization_id, m.customer_id, m.channel, m.message_type, m.content, "
+                  "m.is_from_customer, m.response_time, m.external_id, m.created_at")
+
+def install_search_index(connection) -> None:
+    """Create the search index for the connection's dialect and index existing rows."""
+    if connection.dialect.name == "sqlite":
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        )).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    elif connection.dialect.name == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+def drop_search_index(connection) -> None:
+    statements = SQLITE_DROP if connection.dialect.name == "sqlite" else POSTGRES_DROP
+    for statement in statements:
+        connection.execute(text(statement))
+
+def fts_query(query: str) -> str:
+    """Turn user input into an FTS5 expression: every word must match; a trailing * is a prefix."""
+    terms = re.findall(r"\w+\*?", query, flags=re.UNICODE)
+    return " ".join(f'"{term.rstrip("*")}"' + ("*" if term.endswith("*") else "") for term in terms)
+
+def search_messages(db: Session, org_id: int, query: str, channel: Optional[str] = None,
+                    customer_id: Optional[str] = None, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, limit: int = 20, offset: int = 0) -> dict:
+    """Ranked, paginated search over one tenant's messages."""
+    params = {"org_id": org_id, "limit": limit + 1, "offset": offset}
+    filters = ["m.organization_id = :org_id"]
+    for column, value in (("channel", channel), ("customer_id", customer_id)):
+        if value is not None:
+            filters.append(f"m.{column} = :{column}")
+            params[column] = value
+    if start is not None:
+        filters.append("m.created_at >= :start")
+        params["start"] = start
+    if end is not None:
+        filters.append("m.created_at < :end")
+        params["end"] = end
+
+    if db.bind.dialect.name == "sqlite":
+        match = fts_query(query)
+        if not match:
+            return {"results": [], "limit": limit, "offset": offset, "has_more": False}
+        params["match"] = f'organization_id : "{org_id}" AND content : ({match})'
+        statement = f"""
+            SELECT {RESULT_COLUMNS}, bm25(messages_fts, 1.0, 0.0) AS rank,
+                   snippet(messages_fts, 0, '[', ']', '...', 12) AS snippet
+            FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH :match AND {' AND '.join(filters)}
+            ORDER BY rank, m.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        params["query"] = query
+        statement = f"""
+            SELECT {RESULT_COLUMNS}, -ts_rank(m.content_tsv, q) AS rank,
+                   ts_headline('simple', m.content, q, 'StartSel=[, StopSel=], MaxWords=24') AS snippet
+            FROM messages m, plainto_tsquery('simple', :query) q
+            WHERE m.content_tsv @@ q AND {' AND '.join(filters)}
+            ORDER BY rank, m.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    rows = db.execute(text(statement), params).mappings().all()
+    results: List[dict] = [dict(row) for row in rows[:limit]]
+    return {"results": results, "limit": limit, "offset": offset, "has_more": len(rows) > limit}
@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import Base, Organization, User, ServiceType, Appointment, Message, Analytics
 from crud import create_user, create_organization
+from sketches import sketch_recorder
+from customers import backfill_customers
 from schemas import UserCreate, OrganizationCreate, UserRole
 from auth import get_password_hash
 from datetime import datetime, timedelta
@@ -119,6 +121,7 @@ def create_seed_data():
                 )
                 db.add(msg)
                 db.commit()
+                sketch_recorder.record_messages([msg])
 
             # Analytics
             for metric, value in METRICS:
@@ -132,6 +135,8 @@ def create_seed_data():
                 db.add(analytics)
                 db.commit()
 
+        sketch_recorder.flush()
+        backfill_customers(db, [org.id for org in db.query(Organization).all()])
         print("Indian-flavored seed data created successfully!")
     except Exception as e:
         print(f"Error creating seed data: {e}")
@@ -0,0 +1,144 @@
+from contextvars import ContextVar
+from datetime import date, datetime
+from fastapi import Response
+from starlette.datastructures import Headers, MutableHeaders
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type
+import json
+import os
+
+try:
+    import msgpack
+except ImportError:  # Optional: pip install msgpack
+    msgpack = None
+
+# Opt-in: encode list responses straight to bytes with pydantic-core's compiled
+# serializer instead of FastAPI's validate -> dict -> jsonable_encoder -> json.dumps path.
+# The output parses to the same values, with two differences in float fields (see encode_list)
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Set per request by ContentNegotiationMiddleware from the Accept header
+msgpack_requested: ContextVar[bool] = ContextVar("msgpack_requested", default=False)
+# Per-request flag the encoders set when the representation depended on Accept
+_negotiated: ContextVar[Optional[list]] = ContextVar("negotiated", default=None)
+
+_list_adapters: Dict[type, TypeAdapter] = {}
+_adapters: Dict[type, TypeAdapter] = {}
+
+def wants_msgpack() -> bool:
+    """Whether to encode this response as MessagePack; the response will carry Vary: Accept either way."""
+    negotiated = _negotiated.get()
+    if negotiated is not None and not negotiated:
+        negotiated.append(True)
+    return msgpack_requested.get()
+
+def list_adapter(schema: Type) -> TypeAdapter:
+    """Return the cached TypeAdapter for a list of the given response schema."""
+    adapter = _list_adapters.get(schema)
+    if adapter is None:
+        adapter = _list_adapters[schema] = TypeAdapter(List[schema])
+    return adapter
+
+def encode_list(schema: Type, rows: Sequence[Any]) -> bytes:
+    """Encode ORM objects or rows as a JSON array of the response schema.
+
+    Floats differ from FastAPI's encoder in two ways: exponents are written
+    without sign padding (1e16, 1e-7 rather than 1e+16, 1e-07, the same
+    numbers to any JSON parser), and NaN and infinity become null where
+    FastAPI's JSONResponse raises and the request fails.
+    """
+    adapter = list_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True), by_alias=True)
+
+def list_response(schema: Type, rows: Sequence[Any]):
+    """Return rows for the endpoint's response_model, or pre-encoded JSON on the fast path."""
+    if wants_msgpack():
+        adapter = list_adapter(schema)
+        data = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json", by_alias=True)
+        return Response(content=msgpack.packb(data), media_type=MSGPACK_MEDIA_TYPES[0])
+    if not FAST_JSON_RESPONSES:
+        return rows
+    return Response(content=encode_list(schema, rows), media_type="application/json")
+
+def accepts_msgpack(accept: str) -> bool:
+    """Whether an Accept header ranks MessagePack at least as high as JSON (and msgpack is installed)."""
+    if msgpack is None or "msgpack" not in accept:
+        return False
+    weights: Dict[str, float] = {}
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[media_type.strip().lower()] = weight
+    packed = max(weights.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    plain = weights.get("application/json", weights.get("application/*", weights.get("*/*", 0.0)))
+    return packed > 0 and packed >= plain
+
+class ContentNegotiationMiddleware:
+    """ASGI middleware recording whether the request's Accept header asks for MessagePack.
+
+    Responses whose encoder consulted wants_msgpack() get Vary: Accept, in
+    their JSON form too, so caches keep the two apart. Kept apart from
+    compression so that COMPRESSION_ENABLED=false does not also turn
+    MessagePack off.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        negotiated: list = []
+
+        async def send_varied(message):
+            if message["type"] == "http.response.start" and negotiated:
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept")
+            await send(message)
+
+        token = msgpack_requested.set(accepts_msgpack(Headers(scope=scope).get("accept", "")))
+        negotiated_token = _negotiated.set(negotiated)
+        try:
+            await self.app(scope, receive, send_varied)
+        finally:
+            _negotiated.reset(negotiated_token)
+            msgpack_requested.reset(token)
+
+def model_response(data: Any, schema: Optional[Type] = None):
+    """Return data for the endpoint to serialize as JSON, or as MessagePack when the client asked for it."""
+    if not wants_msgpack():
+        return data
+    if schema is None:
+        encoded = jsonable_encoder(data)
+    else:
+        adapter = _adapters.get(schema)
+        if adapter is None:
+            adapter = _adapters[schema] = TypeAdapter(schema)
+        encoded = adapter.dump_python(adapter.validate_python(data, from_attributes=True), mode="json", by_alias=True)
+    return Response(content=msgpack.packb(encoded), media_type=MSGPACK_MEDIA_TYPES[0])
+
+def _isoformat(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def encode_records(records: Iterable[dict]) -> Iterator[bytes]:
+    """A record stream as NDJSON lines, or as consecutive MessagePack maps when the client asked for them."""
+    # Decided now: the stream is consumed later, in a worker thread outside the request's context
+    if wants_msgpack():
+        packer = msgpack.Packer(default=_isoformat)
+        return (packer.pack(record) for record in records)
+    return ((json.dumps(record, default=_isoformat, ensure_ascii=False) + "\n").encode() for record in records)
+
+def records_media_type() -> str:
+    return MSGPACK_MEDIA_TYPES[0] if wants_msgpack() else "application/x-ndjson"
@@ -0,0 +1,599 @@
+"""Mergeable metric sketches per organization, channel and day.
+
+Response-time percentiles are kept in DDSketches instead of being recomputed
+from raw rows. A DDSketch counts values in logarithmic buckets whose width is
+set by the relative accuracy. With the default of 1%, any quantile it reports
+is within 1% of a value actually observed at that rank. Two sketches merge by
+adding bucket counts, so a date range, a channel breakdown or the platform
+view is the merge of the stored day sketches. Response times between 10 ms
+and an hour span about 640 buckets, i.e. at most a few KB per stored row.
+
+Distinct customers are kept in HyperLogLog sketches of the customer ids.
+Unions are register-wise maxima and lose nothing, so a month, a date range
+or all tenants together are estimated from the union of the day sketches.
+With the default precision of 12 (4096 registers, at most 4 KB per row):
+
+- The standard error is 1.04 / sqrt(4096), about 1.6%. About 95% of
+  estimates fall within 3.3% of the exact count and 99.7% within 5%.
+- Below about 10,000 distinct ids the estimate uses linear counting over
+  empty registers, which is typically well under 1% off for small sets.
+- The error does not grow with the number of sketches unioned.
+- A customer id seen on two channels or at two tenants counts once in
+  their union.
+
+Rows live in `metric_sketches`, keyed by (metric, organization_id, channel,
+day). Writes go into per-process pending sketches and a background thread,
+started by the first write, merges them into the table every FLUSH_SECONDS,
+so the message write path neither contends on the hot row of the day nor
+waits for a flush. Reads merge the stored rows with this process's pending
+sketches.
+
+Rebuild the stored sketches from both message tiers with
+
+    python sketches.py --backfill [--org-id 1]
+"""
+import argparse
+import hashlib
+import logging
+import math
+import operator
+import os
+import struct
+import threading
+from array import array
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import MetricSketch
+
+logger = logging.getLogger(__name__)
+
+RELATIVE_ACCURACY = 0.01
+MAX_BINS = 2048
+FLUSH_SECONDS = float(os.getenv("SKETCH_FLUSH_SECONDS", 5))
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+HLL_PRECISION = 12
+
+class DDSketch:
+    """Quantile sketch with relative-error guarantees (Masson et al., VLDB 2019).
+
+    Bucket counts are a dense list starting at bucket key `offset`, so merging
+    and (de)serializing run over whole lists rather than per bucket in Python.
+    """
+
+    __slots__ = ("relative_accuracy", "gamma", "_log_gamma", "min_indexable", "offset", "counts",
+                 "zero_count", "count", "sum", "min", "max")
+
+    _HEADER = struct.Struct("<BdQQdddiI")
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_indexable = 1e-9
+        self.offset = 0
+        self.counts: List[int] = []
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: int = 1) -> None:
+        """Record a non-negative value."""
+        if value < 0:
+            raise ValueError("DDSketch only records non-negative values")
+        if value < self.min_indexable:
+            self.zero_count += weight
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            index = key - self.offset
+            if 0 <= index < len(self.counts):
+                self.counts[index] += weight
+            else:
+                self._extend(key, key)
+                self.counts[max(key - self.offset, 0)] += weight
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _extend(self, low: int, high: int) -> None:
+        """Grow the bucket range to cover keys low..high."""
+        if not self.counts:
+            self.offset, self.counts = low, [0] * (high - low + 1)
+        else:
+            if low < self.offset:
+                self.counts[:0] = [0] * (self.offset - low)
+                self.offset = low
+            top = self.offset + len(self.counts) - 1
+            if high > top:
+                self.counts.extend([0] * (high - top))
+        if len(self.counts) > MAX_BINS:
+            # Fold the lowest buckets together to stay within MAX_BINS
+            excess = len(self.counts) - MAX_BINS
+            self.counts[:excess + 1] = [sum(self.counts[:excess + 1])]
+            self.offset += excess
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.counts:
+            self._extend(other.offset, other.offset + len(other.counts) - 1)
+            start = max(other.offset - self.offset, 0)
+            skip = max(self.offset - other.offset, 0)
+            if skip:
+                # Buckets of `other` below a collapsed range fold into the lowest one
+                self.counts[0] += sum(other.counts[:skip])
+            window = self.counts[start:start + len(other.counts) - skip]
+            self.counts[start:start + len(window)] = map(operator.add, window, other.counts[skip:])
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        value = self.max
+        for index, weight in enumerate(self.counts):
+            seen += weight
+            if seen > rank:
+                value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+                break
+        return min(max(value, self.min), self.max)
+
+    def summary(self) -> dict:
+        """p50/p90/p99, mean and count, rounded for API responses."""
+        result = {name: _round(self.quantile(q)) for name, q in PERCENTILES.items()}
+        result["mean"] = _round(self.sum / self.count) if self.count else None
+        result["count"] = self.count
+        return result
+
+    def to_bytes(self) -> bytes:
+        """Header plus one uint32 count per bucket between the lowest and highest key."""
+        return self._HEADER.pack(1, self.relative_accuracy, self.count, self.zero_count, self.sum,
+                                 self.min if self.count else 0.0, self.max if self.count else 0.0,
+                                 self.offset, len(self.counts)) + array("I", self.counts).tobytes()
+
+    @classmethod
+    def from_counts(cls, offset: int, counts: List[int], zero_count: int, total: float, low: float,
+                    high: float, relative_accuracy: float = RELATIVE_ACCURACY) -> "DDSketch":
+        """Sketch from bucket counts computed elsewhere, e.g. vectorized over a column."""
+        buckets = cls(relative_accuracy)
+        buckets.offset, buckets.counts = offset, list(counts)
+        buckets.zero_count = zero_count
+        buckets.count = zero_count + sum(buckets.counts)
+        buckets.sum, buckets.min, buckets.max = total, low, high
+        # Merging into an empty sketch applies the MAX_BINS limit
+        return cls(relative_accuracy).merge(buckets)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        _, accuracy, count, zero_count, total, low_value, high_value, offset, length = cls._HEADER.unpack_from(data)
+        sketch = cls(accuracy)
+        counts = array("I")
+        counts.frombytes(data[cls._HEADER.size:cls._HEADER.size + 4 * length])
+        sketch.offset = offset
+        sketch.counts = counts.tolist()
+        sketch.zero_count = zero_count
+        sketch.count = count
+        sketch.sum = total
+        if count:
+            sketch.min, sketch.max = low_value, high_value
+        return sketch
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+class HyperLogLog:
+    """Distinct-count sketch (Flajolet et al. 2007) over 64-bit blake2b hashes.
+
+    Small sketches keep their non-zero registers in a dict and are stored as
+    (index, rank) pairs. Past m/4 registers they switch to a dense bytearray.
+    Dense unions take the lane-wise maximum of the registers packed into one
+    integer, so a union costs a handful of big-integer operations instead of
+    a Python loop over 4096 registers.
+    """
+
+    __slots__ = ("precision", "m", "sparse", "registers", "count")
+
+    _HEADER = struct.Struct("<BBBQ")
+    _LANES: Dict[int, Tuple[int, int]] = {}
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.sparse: Optional[Dict[int, int]] = {}
+        self.registers: Optional[bytearray] = None
+        self.count = 0
+
+    def add(self, value) -> None:
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        bits = 64 - self.precision
+        self._update(hashed >> bits, bits - (hashed & ((1 << bits) - 1)).bit_length() + 1)
+        self.count += 1
+
+    def _update(self, index: int, rank: int) -> None:
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        elif rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            if len(self.sparse) > self.m // 4:
+                self._densify()
+
+    def _densify(self) -> None:
+        registers = bytearray(self.m)
+        for index, rank in self.sparse.items():
+            registers[index] = rank
+        self.registers, self.sparse = registers, None
+
+    def _lanes(self) -> Tuple[int, int]:
+        """Masks with 0x80 and 0xFF in every byte lane, cached per precision."""
+        lanes = self._LANES.get(self.m)
+        if lanes is None:
+            lanes = self._LANES[self.m] = (int.from_bytes(b"\x80" * self.m, "little"),
+                                           int.from_bytes(b"\xff" * self.m, "little"))
+        return lanes
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        if other.registers is None:
+            for index, rank in other.sparse.items():
+                self._update(index, rank)
+        else:
+            if self.registers is None:
+                self._densify()
+            # Ranks are below 0x80, so (a | 0x80) - b never borrows across lanes and
+            # keeps the lane's top bit exactly where a >= b
+            high, full = self._lanes()
+            a = int.from_bytes(self.registers, "little")
+            b = int.from_bytes(other.registers, "little")
+            keep_a = ((((a | high) - b) & high) >> 7) * 0xFF
+            merged = (a & keep_a) | (b & (full ^ keep_a))
+            self.registers = bytearray(merged.to_bytes(self.m, "little"))
+        self.count += other.count
+        return self
+
+    def cardinality(self) -> int:
+        """Estimated number of distinct values added."""
+        if self.registers is None:
+            zeros = self.m - len(self.sparse)
+            inverse_sum = zeros + sum(2.0 ** -rank for rank in self.sparse.values())
+        else:
+            zeros = self.registers.count(0)
+            inverse_sum = sum(self.registers.count(rank) * 2.0 ** -rank
+                              for rank in range(max(self.registers) + 1))
+        estimate = 0.7213 / (1 + 1.079 / self.m) * self.m * self.m / inverse_sum
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """Header plus uint32 (index << 8 | rank) pairs, or the 2**precision raw registers."""
+        if self.registers is not None:
+            return self._HEADER.pack(1, self.precision, 1, self.count) + bytes(self.registers)
+        pairs = array("I", sorted(index << 8 | rank for index, rank in self.sparse.items()))
+        return self._HEADER.pack(1, self.precision, 0, self.count) + pairs.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        _, precision, dense, count = cls._HEADER.unpack_from(data)
+        sketch = cls(precision)
+        sketch.count = count
+        payload = data[cls._HEADER.size:]
+        if dense:
+            sketch.registers, sketch.sparse = bytearray(payload), None
+        else:
+            pairs = array("I")
+            pairs.frombytes(payload)
+            sketch.sparse = {pair >> 8: pair & 0xFF for pair in pairs}
+        return sketch
+
+# Sketch type per metric name; every type offers add/merge/to_bytes/from_bytes and .count
+SKETCH_TYPES = {"response_time": DDSketch, "unique_customers": HyperLogLog}
+
+# Message field each metric sketches
+METRIC_FIELDS = {"response_time": "response_time", "unique_customers": "customer_id"}
+
+SketchKey = Tuple[str, int, str, date]  # (metric, organization_id, channel, day)
+
+def _insert(db: Session):
+    return (postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert)(MetricSketch)
+
+def merge_into_table(db: Session, sketches: Dict[SketchKey, object]) -> None:
+    """Add sketches to their stored rows, creating missing rows; commits."""
+    groups: Dict[Tuple[str, int], Dict[Tuple[str, date], object]] = {}
+    for (metric, org_id, channel, day), sketch in sketches.items():
+        groups.setdefault((metric, org_id), {})[(channel, day)] = sketch
+    now = datetime.utcnow()
+    for (metric, org_id), items in sorted(groups.items()):
+        sketch_type = SKETCH_TYPES[metric]
+        # Insert first: on SQLite this takes the write lock before the read, on
+        # Postgres the rows then exist for FOR UPDATE. Either way no merge is lost.
+        empty = sketch_type().to_bytes()
+        db.execute(_insert(db).on_conflict_do_nothing(), [
+            {"metric": metric, "organization_id": org_id, "channel": channel, "day": day, "count": 0, "data": empty}
+            for channel, day in items
+        ])
+        days = [day for _, day in items]
+        stored = db.execute(
+            select(MetricSketch.id, MetricSketch.channel, MetricSketch.day, MetricSketch.data).where(
+                MetricSketch.metric == metric, MetricSketch.organization_id == org_id,
+                MetricSketch.day >= min(days), MetricSketch.day <= max(days),
+            ).with_for_update()
+        ).all()
+        updates = []
+        for row in stored:
+            sketch = items.get((row.channel, row.day))
+            if sketch is not None:
+                merged = sketch_type.from_bytes(row.data).merge(sketch)
+                updates.append({"id": row.id, "count": merged.count, "data": merged.to_bytes(), "updated_at": now})
+        db.execute(update(MetricSketch), updates)
+    db.commit()
+
+class SketchRecorder:
+    """Per-process pending sketches, merged into `metric_sketches` every flush_interval by a background thread."""
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = FLUSH_SECONDS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self._pending: Dict[SketchKey, object] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, metric: str, org_id: int, channel: str, value, when: Optional[datetime] = None) -> None:
+        day = (when or datetime.utcnow()).date()
+        with self._lock:
+            sketch = self._pending.get((metric, org_id, channel, day))
+            if sketch is None:
+                sketch = self._pending[(metric, org_id, channel, day)] = SKETCH_TYPES[metric]()
+            sketch.add(value)
+            if self._thread is None:
+                # Every process that records needs its own flusher; the first write starts it
+                self.start()
+
+    def record_messages(self, messages: Iterable) -> None:
+        """Message rows or entities were stored; add them to every metric they carry."""
+        for message in messages:
+            for metric, field in METRIC_FIELDS.items():
+                value = getattr(message, field)
+                if value is not None:
+                    self.record(metric, message.organization_id, message.channel, value, message.created_at)
+
+    def flush(self) -> int:
+        """Merge everything pending into the table; returns the number of rows touched."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            db = self.session_factory()
+            try:
+                merge_into_table(db, pending)
+            except BaseException:
+                db.rollback()
+                self._restore(pending)
+                raise
+            finally:
+                db.close()
+            return len(pending)
+
+    def _restore(self, pending: Dict[SketchKey, object]) -> None:
+        with self._lock:
+            for key, sketch in pending.items():
+                current = self._pending.get(key)
+                self._pending[key] = sketch if current is None else sketch.merge(current)
+
+    def pending(self) -> Dict[SketchKey, object]:
+        """Copies of the sketches not yet flushed."""
+        with self._lock:
+            return {key: SKETCH_TYPES[key[0]]().merge(sketch) for key, sketch in self._pending.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending = {}
+
+    # Background flushes
+    def run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # The values stay pending; the next interval retries the flush
+                logger.exception("Flushing metric sketches failed")
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="sketch-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and flush what is still pending."""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            thread.join()
+        self.flush()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+# Shared by every write path of this process
+sketch_recorder = SketchRecorder()
+# A forked worker inherits the flag but not the thread; its first write starts its own
+os.register_at_fork(after_in_child=lambda: setattr(sketch_recorder, "_thread", None))
+
+# Reading
+def iter_sketches(db: Session, metric: str, org_id: Optional[int] = None, start: Optional[date] = None,
+                  end: Optional[date] = None, channel: Optional[str] = None) -> Iterator[Tuple[tuple, object]]:
+    """((organization_id, channel, day), sketch) for days in [start, end), stored and
+    pending in this process. org_id=None is the platform view."""
+    criteria = [MetricSketch.metric == metric]
+    if org_id is not None:
+        criteria.append(MetricSketch.organization_id == org_id)
+    if channel is not None:
+        criteria.append(MetricSketch.channel == channel)
+    if start is not None:
+        criteria.append(MetricSketch.day >= start)
+    if end is not None:
+        criteria.append(MetricSketch.day < end)
+    from_bytes = SKETCH_TYPES[metric].from_bytes
+    for row in db.execute(select(MetricSketch.organization_id, MetricSketch.channel, MetricSketch.day,
+                                 MetricSketch.data).where(*criteria)):
+        yield (row.organization_id, row.channel, row.day), from_bytes(row.data)
+    for (pending_metric, pending_org, pending_channel, day), sketch in sketch_recorder.pending().items():
+        if (pending_metric == metric and (org_id is None or pending_org == org_id)
+                and (channel is None or pending_channel == channel)
+                and (start is None or day >= start) and (end is None or day < end)):
+            yield (pending_org, pending_channel, day), sketch
+
+GROUP_POSITIONS = {"organization_id": 0, "channel": 1, "day": 2}
+
+def load_sketches(db: Session, metric: str, org_id: Optional[int] = None, start: Optional[date] = None,
+                  end: Optional[date] = None, channel: Optional[str] = None,
+                  group_by: Optional[str] = None) -> Dict[object, object]:
+    """Merged sketches keyed by `group_by` (organization_id, channel or day), or under None."""
+    position = GROUP_POSITIONS.get(group_by)
+    merged: Dict[object, object] = {}
+    for key, sketch in iter_sketches(db, metric, org_id, start, end, channel):
+        group = key[position] if position is not None else None
+        if group in merged:
+            merged[group].merge(sketch)
+        else:
+            merged[group] = sketch
+    return merged
+
+def response_time_report(db: Session, org_id: Optional[int], start: date, end: date,
+                         channel: Optional[str] = None) -> dict:
+    """Response-time percentiles over [start, end): overall, per channel and per day."""
+    by_channel: Dict[str, DDSketch] = {}
+    by_day: Dict[date, DDSketch] = {}
+    # One pass over the rows; each decoded sketch is merged into its channel and day
+    for (_, channel_name, day), sketch in iter_sketches(db, "response_time", org_id, start, end, channel):
+        if channel_name in by_channel:
+            by_channel[channel_name].merge(sketch)
+        else:
+            by_channel[channel_name] = DDSketch(sketch.relative_accuracy).merge(sketch)
+        if day in by_day:
+            by_day[day].merge(sketch)
+        else:
+            by_day[day] = sketch
+    overall = DDSketch()
+    for sketch in by_channel.values():
+        overall.merge(sketch)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "overall": overall.summary(),
+        "by_channel": {name: sketch.summary() for name, sketch in sorted(by_channel.items())},
+        "daily": [{"date": day.isoformat(), **by_day[day].summary()} for day in sorted(by_day)],
+    }
+
+def unique_customer_counts(db: Session, org_id: Optional[int], windows: Sequence[Tuple[date, date]],
+                           channel: Optional[str] = None) -> List[int]:
+    """Estimated distinct customers over each [start, end) window, from one read of the days they span."""
+    if not windows:
+        return []
+    by_day = load_sketches(db, "unique_customers", org_id, min(start for start, _ in windows),
+                           max(end for _, end in windows), channel, group_by="day")
+    counts = []
+    for start, end in windows:
+        union = None
+        for day, sketch in by_day.items():
+            if start <= day < end:
+                union = (union or HyperLogLog(sketch.precision)).merge(sketch)
+        counts.append(union.cardinality() if union is not None else 0)
+    return counts
+
+def unique_customers_report(db: Session, org_id: Optional[int], start: date, end: date,
+                            granularity: str = "day", channel: Optional[str] = None) -> dict:
+    """Estimated distinct customers over [start, end): in total, per channel and per day or month."""
+    total = HyperLogLog()
+    by_channel: Dict[str, HyperLogLog] = {}
+    by_period: Dict[str, HyperLogLog] = {}
+    for (_, channel_name, day), sketch in iter_sketches(db, "unique_customers", org_id, start, end, channel):
+        period = day.isoformat() if granularity == "day" else day.replace(day=1).isoformat()
+        for groups, key in ((by_channel, channel_name), (by_period, period)):
+            if key in groups:
+                groups[key].merge(sketch)
+            else:
+                groups[key] = HyperLogLog(sketch.precision).merge(sketch)
+        total.merge(sketch)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "unique_customers": total.cardinality(),
+        "by_channel": {name: sketch.cardinality() for name, sketch in sorted(by_channel.items())},
+        "buckets": [{"period": period, "unique_customers": by_period[period].cardinality()}
+                    for period in sorted(by_period)],
+    }
+
+# Backfill
+def backfill_sketches(db: Session, org_ids: List[int], until: date) -> int:
+    """Rebuild every metric's sketches for days before `until` from both message tiers.
+
+    Days from `until` on are left to the live write path, so run this with the
+    default (today) while writes keep flowing. Returns the number of rows written.
+    """
+    from archive import iter_messages
+
+    written = 0
+    for org_id in org_ids:
+        sketches: Dict[SketchKey, object] = {}
+        for record in iter_messages(db, org_id, end=datetime.combine(until, datetime.min.time())):
+            if record["created_at"] is None:
+                continue
+            day = record["created_at"].date()
+            for metric, field in METRIC_FIELDS.items():
+                if record[field] is None:
+                    continue
+                key = (metric, org_id, record["channel"], day)
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = SKETCH_TYPES[metric]()
+                sketch.add(record[field])
+        db.execute(delete(MetricSketch).where(
+            MetricSketch.metric.in_(list(METRIC_FIELDS)), MetricSketch.organization_id == org_id,
+            MetricSketch.day < until))
+        merge_into_table(db, sketches)
+        written += len(sketches)
+    return written
+
+if __name__ == "__main__":
+    from models import Organization
+
+    parser = argparse.ArgumentParser(description="Rebuild metric sketches from stored messages")
+    parser.add_argument("--backfill", action="store_true", help="rebuild response-time and customer sketches")
+    parser.add_argument("--org-id", type=int, action="append", help="organization to rebuild (default: all)")
+    parser.add_argument("--until", type=date.fromisoformat, default=datetime.utcnow().date(),
+                        help="rebuild days before this date (default: today)")
+    args = parser.parse_args()
+    if args.backfill:
+        db = SessionLocal()
+        try:
+            org_ids = args.org_id or list(db.execute(select(Organization.id)).scalars())
+            print(f"Wrote {backfill_sketches(db, org_ids, args.until)} sketches")
+        finally:
+            db.close()
@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
 from main import app
 
@@ -63,3 +64,318 @@ def test_get_organization_analytics():
         assert "total_messages" in response.json()
     else:
         pytest.skip("No organizations found to test analytics.")
+
+def test_sqlite_engine_profile(tmp_path):
+    from sqlalchemy import text
+    from database import build_engine
+    engine = build_engine(f"sqlite:///{tmp_path / 'profile.db'}", "sqlite")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 15000
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    engine.dispose()
+
+def test_default_profile_follows_the_url_backend():
+    from database import ENGINE_PROFILES, default_profile
+    assert default_profile("sqlite:///./ai_assistant.db") == "sqlite"
+    assert default_profile("postgresql://app@db/app") == default_profile("postgresql+psycopg2://db/app") == "postgres"
+    for url in ("mysql+pymysql://app@db/app", "mssql+pyodbc://db/app"):
+        assert default_profile(url) == "server"
+    assert "connect_args" not in ENGINE_PROFILES["server"]
+
+def test_health():
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+def test_fast_json_list_responses_match(monkeypatch):
+    import serialization
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    org_id = client.get("/api/organizations", headers=headers).json()[0]["id"]
+    for path in ["/api/organizations", f"/api/organizations/{org_id}/messages",
+                 f"/api/organizations/{org_id}/appointments", f"/api/organizations/{org_id}/service-types"]:
+        monkeypatch.setattr(serialization, "FAST_JSON_RESPONSES", False)
+        slow = client.get(path, headers=headers)
+        monkeypatch.setattr(serialization, "FAST_JSON_RESPONSES", True)
+        fast = client.get(path, headers=headers)
+        assert fast.status_code == 200
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.content == slow.content
+
+def test_fast_json_float_edge_values():
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from schemas import MessageResponse
+    from serialization import encode_list
+    row = {"id": 1, "organization_id": 1, "customer_id": "c", "channel": "whatsapp", "message_type": "text",
+           "content": "Hi", "is_from_customer": True, "created_at": "2026-10-01T10:00:00"}
+    rows = [dict(row, response_time=value) for value in (1e16, 1e-7, 2.5, None)]
+    fast = encode_list(MessageResponse, rows)
+    slow = json.dumps(jsonable_encoder([MessageResponse.model_validate(r) for r in rows])).encode()
+    assert b'"response_time":1e16' in fast and b'"response_time": 1e+16' in slow
+    # Only the exponent formatting differs
+    assert json.loads(fast) == json.loads(slow)
+    # NaN and infinity, which FastAPI's JSONResponse refuses to encode, become null
+    for value in (float("nan"), float("inf")):
+        assert json.loads(encode_list(MessageResponse, [dict(row, response_time=value)]))[0]["response_time"] is None
+
+def test_projected_rows_serialize_like_orm_entities(monkeypatch):
+    import main
+    import serialization
+    from models import Appointment, Message
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    # The ORM-entity reads these routes used before they were projected onto response_columns
+    orm_reads = {
+        "list_organization_appointments": lambda db, org_id, start=None, end=None, since=None:
+            db.query(Appointment).filter(Appointment.organization_id == org_id).order_by(Appointment.id).all(),
+        "list_organization_messages": lambda db, org_id:
+            db.query(Message).filter(Message.organization_id == org_id).order_by(Message.id).all(),
+    }
+    paths = {"list_organization_appointments": "appointments", "list_organization_messages": "messages"}
+    for fast_json in (False, True):
+        monkeypatch.setattr(serialization, "FAST_JSON_RESPONSES", fast_json)
+        for org_id in (1, 2, 3):
+            for name, path in paths.items():
+                url = f"/api/organizations/{org_id}/{path}"
+                projected = client.get(url, headers=headers)
+                with monkeypatch.context() as patch:
+                    patch.setattr(main, name, orm_reads[name])
+                    entities = client.get(url, headers=headers)
+                assert projected.status_code == entities.status_code == 200
+                assert projected.json(), url
+                assert projected.content == entities.content, (url, fast_json)
+
+def test_create_round_trips():
+    from sqlalchemy import event
+    from database import SessionLocal, engine
+    from crud import create_organization, create_service_type, create_appointment, create_message
+    from schemas import OrganizationCreate, ServiceTypeCreate, AppointmentCreate, MessageCreate
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        org = create_organization(db, OrganizationCreate(
+            name="Pune Dental Care", admin_email="admin@punedental.in",
+            admin_name="Neha Kulkarni", admin_password="password"
+        ))
+        # Organization and admin user: one INSERT ... RETURNING each, one transaction
+        assert len(statements) == 2
+        assert all("RETURNING" in statement for statement in statements)
+        assert org.id and org.created_at and org.subscription_status == "active"
+
+        counts = {}
+        statements.clear()
+        service = create_service_type(db, ServiceTypeCreate(
+            organization_id=org.id, name="Cleaning", duration=30, price=800.0
+        ))
+        counts["service_type"], statements[:] = len(statements), []
+        appointment = create_appointment(db, AppointmentCreate(
+            organization_id=org.id, service_type_id=service.id, customer_name="Rohit Patil",
+            appointment_date=datetime.utcnow() + timedelta(days=1)
+        ))
+        counts["appointment"], statements[:] = len(statements), []
+        # A first-time sender is also added to the customer directory...
+        create_message(db, MessageCreate(
+            organization_id=org.id, customer_id="9876543210", channel="whatsapp",
+            content="Namaste, mujhe appointment book karni hai."
+        ))
+        statements.clear()
+        # ...after which their messages resolve from the lookup cache
+        message = create_message(db, MessageCreate(
+            organization_id=org.id, customer_id="9876543210", channel="whatsapp",
+            content="Kal subah 10 baje ka slot milega?"
+        ))
+        counts["message"] = len(statements)
+        # Service types and appointments also bump their collection's change version (changes.py)
+        assert counts == {"service_type": 2, "appointment": 2, "message": 1}
+        assert appointment.status == "scheduled" and appointment.created_at
+        assert message.id and message.created_at
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        db.close()
+
+def test_expensive_routes_are_rate_limited_per_tenant():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    statuses = [client.get("/api/organizations/999/analytics", headers=headers).status_code for _ in range(8)]
+    assert 429 in statuses
+    limited = client.get("/api/organizations/999/analytics", headers=headers)
+    assert limited.status_code == 429 and int(limited.headers["retry-after"]) >= 1
+    # Other tenants keep their own budget
+    assert client.get("/api/organizations/998/analytics", headers=headers).status_code != 429
+
+    counters = client.get("/api/admin/admission", headers=headers).json()
+    assert counters["999"]["rate_limited"] >= 2
+
+def test_message_export_and_customer_thread():
+    import json
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    org_id = client.get("/api/organizations", headers=headers).json()[0]["id"]
+    messages = client.get(f"/api/organizations/{org_id}/messages", headers=headers).json()
+
+    export = client.get(f"/api/organizations/{org_id}/messages/export", headers=headers)
+    assert export.status_code == 200
+    assert export.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in export.text.splitlines()]
+    assert {m["id"] for m in exported} >= {m["id"] for m in messages}
+
+    customer_id = messages[0]["customer_id"]
+    thread = client.get(f"/api/organizations/{org_id}/customers/{customer_id}/messages", headers=headers)
+    assert thread.status_code == 200
+    assert all(m["customer_id"] == customer_id for m in thread.json())
+
+def test_message_search_is_ranked_and_scoped():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    for org_id, content in ((1, "Kal ka refund status kya hai? refund chahiye"),
+                            (1, "Mera refund abhi tak nahi aaya"),
+                            (2, "refund please")):
+        resp = client.post(f"/api/organizations/{org_id}/messages", headers=headers, json={
+            "organization_id": org_id, "customer_id": f"search-{org_id}", "channel": "whatsapp",
+            "message_type": "text", "content": content
+        })
+        assert resp.status_code == 200
+
+    found = client.get("/api/organizations/1/messages/search", params={"q": "refund", "limit": 1}, headers=headers)
+    assert found.status_code == 200
+    page = found.json()
+    assert page["has_more"] and len(page["results"]) == 1
+    assert page["results"][0]["organization_id"] == 1
+    assert "[refund]" in page["results"][0]["snippet"].lower()
+
+    both = client.get("/api/organizations/1/messages/search", params={"q": "refund nahi"}, headers=headers).json()
+    assert [m["content"] for m in both["results"]] == ["Mera refund abhi tak nahi aaya"]
+    assert client.get("/api/organizations/1/messages/search", params={"q": "refund", "channel": "telegram"},
+                      headers=headers).json()["results"] == []
+    prefix = client.get("/api/organizations/2/messages/search", params={"q": "ref*"}, headers=headers).json()
+    assert [m["customer_id"] for m in prefix["results"]] == ["search-2"]
+
+def test_appointment_calendar_window_and_buckets():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    service_id = client.get("/api/organizations/2/service-types", headers=headers).json()[0]["id"]
+    monday = datetime(2031, 3, 3, 10)
+    for days in (0, 0, 1, 7):
+        resp = client.post("/api/organizations/2/appointments", headers=headers, json={
+            "service_type_id": service_id, "customer_name": "Calendar View",
+            "appointment_date": (monday + timedelta(days=days)).isoformat()
+        })
+        assert resp.status_code == 200
+
+    window = {"start": monday.replace(hour=0).isoformat(), "end": (monday + timedelta(days=14)).isoformat()}
+    listed = client.get("/api/organizations/2/appointments", params=window, headers=headers).json()
+    assert [a["appointment_date"][:10] for a in listed] == ["2031-03-03", "2031-03-03", "2031-03-04", "2031-03-10"]
+
+    days = client.get("/api/organizations/2/appointments/calendar", params=window, headers=headers).json()
+    assert [(b["period"], b["total"]) for b in days["buckets"]] == [
+        ("2031-03-03", 2), ("2031-03-04", 1), ("2031-03-10", 1)]
+    assert days["buckets"][0]["by_status"] == {"scheduled": 2}
+    assert days["buckets"][0]["by_service_type"] == {str(service_id): 2}
+
+    weeks = client.get("/api/organizations/2/appointments/calendar", params={**window, "granularity": "week"},
+                       headers=headers).json()
+    assert [(b["period"], b["total"]) for b in weeks["buckets"]] == [("2031-03-03", 3), ("2031-03-10", 1)]
+    assert client.get("/api/organizations/2/appointments/calendar", params={**window, "granularity": "month"},
+                      headers=headers).status_code == 400
+
+    # Bounds with and without an offset are both read as UTC
+    mixed = {"start": window["start"], "end": (monday + timedelta(days=7, hours=5, minutes=30)).isoformat() + "+05:30"}
+    mixed_days = client.get("/api/organizations/2/appointments/calendar", params=mixed, headers=headers)
+    assert mixed_days.status_code == 200
+    assert [(b["period"], b["total"]) for b in mixed_days.json()["buckets"]] == [("2031-03-03", 2), ("2031-03-04", 1)]
+    listed = client.get("/api/organizations/2/appointments", params=mixed, headers=headers).json()
+    assert [a["appointment_date"][:10] for a in listed] == ["2031-03-03", "2031-03-03", "2031-03-04"]
+
+def test_bulk_update_appointments_is_tenant_scoped():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    day = datetime(2031, 5, 6, 9, 30)
+    ids = {}
+    for org_id in (1, 2):
+        service_id = client.get(f"/api/organizations/{org_id}/service-types", headers=headers).json()[0]["id"]
+        ids[org_id] = [client.post(f"/api/organizations/{org_id}/appointments", headers=headers, json={
+            "service_type_id": service_id, "customer_name": "Bulk Update",
+            "appointment_date": (day + timedelta(hours=i)).isoformat()
+        }).json()["id"] for i in range(3)]
+
+    # Org 2's appointment is reported as not found and left alone
+    resp = client.post("/api/organizations/1/appointments/bulk-update", headers=headers, json={
+        "ids": ids[1][:2] + [ids[2][0]], "status": "confirmed", "notes": "confirmed by phone"
+    })
+    assert resp.status_code == 200
+    result = resp.json()
+    assert result["requested"] == 3 and result["rows_affected"] == 2
+    assert result["outcomes"] == {str(ids[1][0]): "updated", str(ids[1][1]): "updated", str(ids[2][0]): "not_found"}
+
+    # Close the day: move every confirmed booking in the window by a week
+    window = {"start": day.replace(hour=0).isoformat(), "end": (day + timedelta(days=1)).replace(hour=0).isoformat()}
+    resp = client.post("/api/organizations/1/appointments/bulk-update", headers=headers, json={
+        **window, "current_status": "confirmed", "shift_minutes": 7 * 24 * 60
+    })
+    assert resp.json()["rows_affected"] == 2
+    moved = client.get("/api/organizations/1/appointments", headers=headers, params={
+        "start": (day + timedelta(days=7)).replace(hour=0).isoformat(), "end": (day + timedelta(days=8)).isoformat()
+    }).json()
+    assert [(a["id"], a["status"], a["appointment_date"][:19]) for a in moved] == [
+        (ids[1][0], "confirmed", "2031-05-13T09:30:00"), (ids[1][1], "confirmed", "2031-05-13T10:30:00")]
+    org2 = client.get("/api/organizations/2/appointments", headers=headers, params=window).json()
+    assert {a["status"] for a in org2 if a["id"] in ids[2]} == {"scheduled"}
+
+    assert client.post("/api/organizations/1/appointments/bulk-update", headers=headers,
+                       json={"ids": ids[1]}).status_code == 422
+    assert client.post("/api/organizations/1/appointments/bulk-update", headers=headers,
+                       json={"ids": list(range(1, 1002)), "status": "cancelled"}).status_code == 422
+
+def test_bulk_update_window_is_batched_and_utc(monkeypatch):
+    import crud
+    monkeypatch.setattr(crud, "BULK_UPDATE_BATCH_SIZE", 2)
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    day = datetime(2031, 6, 3, 9, 0)
+    service_id = client.get("/api/organizations/3/service-types", headers=headers).json()[0]["id"]
+    ids = [client.post("/api/organizations/3/appointments", headers=headers, json={
+        "service_type_id": service_id, "customer_name": "Window Batch",
+        "appointment_date": (day + timedelta(hours=i)).isoformat()
+    }).json()["id"] for i in range(5)]
+
+    # 14:30-17:30 IST is 09:00-12:00 UTC: the first three bookings, over two batches
+    resp = client.post("/api/organizations/3/appointments/bulk-update", headers=headers, json={
+        "start": "2031-06-03T14:30:00+05:30", "end": "2031-06-03T17:30:00+05:30",
+        "appointment_date": "2031-06-10T15:30:00+05:30"
+    })
+    assert resp.status_code == 200 and resp.json()["rows_affected"] == 3
+    moved = client.get("/api/organizations/3/appointments", headers=headers, params={
+        "start": "2031-06-10T00:00:00", "end": "2031-06-11T00:00:00"}).json()
+    assert sorted((a["id"], a["appointment_date"][:19]) for a in moved) == [
+        (appointment_id, "2031-06-10T10:00:00") for appointment_id in ids[:3]]
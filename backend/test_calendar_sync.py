@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from calendar_sync import BusyIndex, CalendarSync, HttpCalendarProvider
+from database import SessionLocal
+from fake_providers import FakeCalendarProvider
+from models import CalendarBusyInterval, CalendarSyncState, Configuration
+
+def test_busy_index_merges_overlaps():
+    t = datetime(2026, 11, 2, 9)
+    index = BusyIndex([(t, t + timedelta(hours=1)), (t + timedelta(minutes=30), t + timedelta(hours=2)),
+                       (t + timedelta(hours=4), t + timedelta(hours=5))])
+    assert len(index) == 2
+    assert index.is_busy(t + timedelta(hours=1, minutes=45), t + timedelta(hours=3))
+    assert not index.is_busy(t + timedelta(hours=2), t + timedelta(hours=4))
+    assert index.busy_between(t + timedelta(hours=1), t + timedelta(hours=4, minutes=30)) == [
+        (t + timedelta(hours=1), t + timedelta(hours=2)), (t + timedelta(hours=4), t + timedelta(hours=4, minutes=30))]
+
+def test_incremental_sync_mirrors_changes():
+    org_id = 3
+    day = datetime(2026, 11, 3, 9)
+    db = SessionLocal()
+    db.add(Configuration(organization_id=org_id,
+                         calendar_config={"enabled": True, "calendarIds": ["primary", "clinic"]}))
+    db.commit()
+    try:
+        with FakeCalendarProvider(page_size=3) as fake:
+            events = [fake.add_event("primary", day + timedelta(hours=i), day + timedelta(hours=i, minutes=30))
+                      for i in range(8)]
+            fake.add_event("clinic", day + timedelta(hours=20), day + timedelta(hours=21), transparent=True)
+            sync = CalendarSync(HttpCalendarProvider(fake.url), index_ttl=0)
+
+            results = sync.sync_organization(org_id)
+            assert [r["full"] for r in results] == [True, True]
+            assert len(sync.free_busy(org_id, day, day + timedelta(days=1))) == 8
+            assert not sync.is_busy(org_id, day + timedelta(hours=20), day + timedelta(hours=21))
+
+            # Only the changes travel on the next sync
+            fake.cancel_event("primary", events[0])
+            fake.move_event("primary", events[1], day + timedelta(hours=12), day + timedelta(hours=13))
+            results = sync.sync_organization(org_id)
+            assert results[0] == {"calendar_id": "primary", "full": False, "changed": 2, "busy": 1}
+            assert not sync.is_busy(org_id, day, day + timedelta(hours=1, minutes=30))
+            assert sync.is_busy(org_id, day + timedelta(hours=12, minutes=15), day + timedelta(hours=12, minutes=20))
+
+            # An expired sync token falls back to a full resync
+            fake.expire_sync_tokens()
+            assert sync.sync_organization(org_id)[0]["full"] is True
+            assert db.query(CalendarBusyInterval).filter(
+                CalendarBusyInterval.organization_id == org_id).count() == 7
+    finally:
+        db.query(CalendarBusyInterval).filter(CalendarBusyInterval.organization_id == org_id).delete()
+        db.query(CalendarSyncState).filter(CalendarSyncState.organization_id == org_id).delete()
+        db.query(Configuration).filter(Configuration.organization_id == org_id).delete()
+        db.commit()
+        db.close()
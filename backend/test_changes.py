@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from fastapi.testclient import TestClient
+
+from changes import ConditionalGetMiddleware, bump, collection_version
+from database import SessionLocal
+from main import app
+
+client = TestClient(app)
+
+def auth_headers():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    return {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+
+def test_bump_advances_versions_per_tenant_and_collection():
+    db = SessionLocal()
+    try:
+        before = collection_version(db, 3, "service_types").version
+        assert bump(db, 3, "service_types") == before + 1
+        assert bump(db, 3, "service_types", deleted=True) == before + 2
+        db.commit()
+        current = collection_version(db, 3, "service_types")
+        assert (current.version, current.reset_version) == (before + 2, before + 2)
+        assert current.delta_since(before + 1) is None and current.delta_since(before + 2) == before + 2
+        assert current.delta_since(before + 3) is None
+        assert collection_version(db, 4, "service_types").etag != current.etag
+    finally:
+        db.close()
+
+def test_documents_revalidate_and_return_deltas():
+    headers = auth_headers()
+    url = "/api/organizations/2/documents"
+    first = client.get(url, headers=headers)
+    etag, version = first.headers["etag"], int(first.headers["x-collection-version"])
+    assert first.headers["cache-control"] == "private, no-cache"
+    unchanged = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+
+    created = client.post(url, headers=headers, json={"name": "Price list", "type": "url",
+                                                      "url": "https://example.com/prices"}).json()
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    delta = client.get(url, headers=headers, params={"since": version})
+    assert delta.headers["x-delta-since"] == str(version)
+    assert [doc["id"] for doc in delta.json()] == [created["id"]]
+
+    # A delete cannot be expressed as a delta: older versions get the full list
+    assert client.delete(f"{url}/{created['id']}", headers=headers).status_code == 200
+    after_delete = client.get(url, headers=headers, params={"since": version})
+    assert "x-delta-since" not in after_delete.headers
+    assert created["id"] not in [doc["id"] for doc in after_delete.json()]
+    latest = int(after_delete.headers["x-collection-version"])
+    assert client.get(url, headers=headers, params={"since": latest}).json() == []
+
+def test_appointment_updates_show_up_in_deltas():
+    headers = auth_headers()
+    url = "/api/organizations/3/appointments"
+    full = client.get(url, headers=headers)
+    version = int(full.headers["x-collection-version"])
+    picked = full.json()[0]["id"]
+    assert client.post(f"{url}/bulk-update", headers=headers,
+                       json={"ids": [picked], "notes": "Moved by phone"}).status_code == 200
+    delta = client.get(url, headers=headers, params={"since": version})
+    assert [row["id"] for row in delta.json()] == [picked]
+    assert delta.json()[0]["notes"] == "Moved by phone"
+
+def test_config_changes_within_one_second_are_not_hidden():
+    headers = auth_headers()
+    url = "/api/organizations/2/config"
+    client.put(url, headers=headers, json={"ai_config": {"tone": "friendly"}})
+    first = client.get(url, headers=headers)
+    # Sent for information; it is never used to answer 304
+    assert first.headers["last-modified"].endswith(" GMT")
+    # A second write in the same second must still invalidate the client's copy
+    client.put(url, headers=headers, json={"ai_config": {"tone": "formal"}})
+    now = format_datetime(datetime.now(timezone.utc), usegmt=True)
+    for validators in ({"If-None-Match": first.headers["etag"]}, {"If-Modified-Since": now},
+                       {"If-Modified-Since": first.headers["last-modified"]}):
+        response = client.get(url, headers={**headers, **validators})
+        assert response.status_code == 200 and response.json()["ai_config"] == {"tone": "formal"}
+
+def test_untracked_gets_get_body_etags():
+    headers = auth_headers()
+    url = "/api/organizations/2/analytics"
+    first = client.get(url, headers=headers)
+    assert first.headers["etag"].startswith('W/"')
+    repeat = client.get(url, headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert client.get(url, headers={**headers, "If-None-Match": 'W/"stale"'}).status_code == 200
+
+def test_chunked_bodies_are_not_tagged():
+    sent = []
+
+    async def chunked_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", b"6")]})
+        await send({"type": "http.response.body", "body": b"[1,", "more_body": True})
+        await send({"type": "http.response.body", "body": b"2]", "more_body": False})
+
+    async def send(message):
+        sent.append(message)
+
+    # Even a client that guessed the first chunk's hash gets the full body
+    scope = {"type": "http", "method": "GET", "headers": [(b"if-none-match", b"*")]}
+    asyncio.run(ConditionalGetMiddleware(chunked_app)(scope, None, send))
+    assert sent[0]["status"] == 200 and b"etag" not in dict(sent[0]["headers"])
+    assert b"".join(message.get("body", b"") for message in sent[1:]) == b"[1,2]"
@@ -0,0 +1,183 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, CompressionStats, compressible, select_encoding
+from main import app
+from serialization import ContentNegotiationMiddleware, accepts_msgpack, list_response, msgpack
+
+stats = CompressionStats()
+demo = FastAPI()
+demo.add_middleware(CompressionMiddleware, min_bytes=1024, thread_bytes=4096, stats=stats)
+
+@demo.get("/rows")
+async def rows():
+    return [{"id": i, "content": f"Appointment confirmed for slot {i}"} for i in range(200)]
+
+@demo.get("/small")
+async def small():
+    return {"ok": True}
+
+@demo.get("/export")
+async def export():
+    return StreamingResponse((f'{{"n": {i}, "pad": "{"x" * 100}"}}\n' for i in range(500)),
+                             media_type="application/x-ndjson", headers={"ETag": '"v1"'})
+
+@demo.get("/events")
+async def events():
+    return StreamingResponse(iter(["data: " + "y" * 2000 + "\n\n"]), media_type="text/event-stream")
+
+@demo.get("/encoded")
+async def encoded():
+    return PlainTextResponse("z" * 4000, headers={"Content-Encoding": "identity-ish"})
+
+client = TestClient(demo)
+
+def get(path, encoding="gzip"):
+    # Raw bytes, so the test sees what went over the wire
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_large_json_is_gzipped():
+    response, body = get("/rows")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert len(json.loads(gzip.decompress(body))) == 200
+    assert stats.snapshot()["gzip"]["bytes_out"] < stats.snapshot()["gzip"]["bytes_in"]
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    response, body = get("/rows", encoding="gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert len(json.loads(brotli.decompress(body))) == 200
+    response, body = get("/export", encoding="br")
+    assert response.headers["content-encoding"] == "br"
+    assert len(brotli.decompress(body).decode().splitlines()) == 500
+
+def test_small_and_unaccepted_bodies_are_left_alone():
+    response, body = get("/small")
+    assert "content-encoding" not in response.headers and json.loads(body) == {"ok": True}
+    response, body = get("/rows", encoding="identity")
+    assert "content-encoding" not in response.headers and len(json.loads(body)) == 200
+    response, _ = get("/rows", encoding="gzip;q=0")
+    assert "content-encoding" not in response.headers
+
+def test_streamed_export_is_compressed_incrementally():
+    response, body = get("/export")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.headers["etag"] == 'W/"v1"'
+    lines = gzip.decompress(body).decode().splitlines()
+    assert len(lines) == 500 and json.loads(lines[-1])["n"] == 499
+
+def test_event_streams_and_encoded_bodies_pass_through():
+    response, body = get("/events")
+    assert "content-encoding" not in response.headers and body.startswith(b"data: ")
+    response, body = get("/encoded")
+    assert response.headers["content-encoding"] == "identity-ish" and body == b"z" * 4000
+
+def test_negotiation_helpers():
+    assert select_encoding("gzip, deflate") == "gzip"
+    assert select_encoding("deflate") is None
+    assert select_encoding("*") in ("br", "gzip")
+    assert select_encoding("gzip;q=0, *;q=0.5") in ("br", None)
+    assert compressible("application/json; charset=utf-8") and compressible("application/problem+json")
+    assert not compressible("text/event-stream") and not compressible("image/png")
+
+    expected = msgpack is not None
+    assert accepts_msgpack("application/msgpack") is expected
+    assert accepts_msgpack("application/json;q=0.9, application/x-msgpack") is expected
+    assert accepts_msgpack("application/json, application/msgpack;q=0.5") is False
+    assert accepts_msgpack("application/json") is False
+
+def test_app_lists_fall_back_to_json_without_msgpack():
+    api = TestClient(app)
+    login_resp = api.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}", "Accept": "application/msgpack"}
+    response = api.get("/api/organizations", headers=headers)
+    assert response.status_code == 200
+    if msgpack is None:
+        assert response.headers["content-type"].startswith("application/json")
+    else:
+        assert response.headers["content-type"] == "application/msgpack"
+    stats = api.get("/api/admin/compression", headers=headers).json()
+    assert "gzip" in stats and "identity" in stats
+
+def test_negotiated_responses_vary_on_accept():
+    api = TestClient(app)
+    login_resp = api.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    # Org 3, so the expensive-route budget of org 2 is left for the MessagePack test
+    for url in ("/api/organizations/3/appointments", "/api/organizations/3/analytics",
+                "/api/organizations/3/messages/export"):
+        response = api.get(url, headers=headers)
+        assert response.status_code == 200
+        assert "Accept" in [value.strip() for value in response.headers["vary"].split(",")], url
+    # Responses that do not depend on Accept say nothing about it
+    untouched = api.get("/api/admin/compression", headers=headers)
+    assert "Accept" not in [value.strip() for value in untouched.headers.get("vary", "").split(",")]
+
+def test_msgpack_does_not_depend_on_compression():
+    pytest.importorskip("msgpack")
+    plain = FastAPI()
+    plain.add_middleware(ContentNegotiationMiddleware)
+
+    @plain.get("/rows")
+    async def plain_rows():
+        return list_response(dict, [{"id": 1}, {"id": 2}])
+
+    response = TestClient(plain).get("/rows", headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == [{"id": 1}, {"id": 2}]
+
+def test_event_stream_headers_are_not_held():
+    sent = []
+
+    async def stream_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        # The client must see the headers before the first event exists
+        assert [message["type"] for message in sent] == ["http.response.start"]
+        await send({"type": "http.response.body", "body": b"data: hi\n\n", "more_body": False})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(stream_app, stats=CompressionStats())(scope, None, send))
+    assert sent[-1]["body"] == b"data: hi\n\n"
+
+def test_app_serves_msgpack_for_lists_analytics_and_exports():
+    pytest.importorskip("msgpack")
+    api = TestClient(app)
+    login_resp = api.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    packed = {**headers, "Accept": "application/msgpack"}
+    for url in ("/api/organizations/2/appointments", "/api/organizations/2/analytics"):
+        response = api.get(url, headers=packed)
+        assert response.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content) == api.get(url, headers=headers).json()
+
+    response = api.get("/api/organizations/2/messages/export", headers=packed)
+    assert response.headers["content-type"] == "application/msgpack"
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(response.content)
+    records = list(unpacker)
+    # Exports are tightly rate limited, so the stream is checked on its own rather than against a JSON export
+    assert records and all(record["organization_id"] == 2 for record in records)
+    assert isinstance(records[0]["created_at"], str)
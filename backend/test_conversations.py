@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conversations import ConversationStore, _entry_bytes
+from main import app
+
+client = TestClient(app)
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def test_booking_flow_state_and_ttl():
+    clock = Clock()
+    store = ConversationStore(ttl=600, clock=clock)
+    assert store.get(1, "whatsapp", "919800000001") is None
+    store.update(1, "whatsapp", "919800000001", stage="slot", service_type_id=3)
+    clock.now += 300
+    state = store.update(1, "whatsapp", "919800000001", stage="confirm", slot_start=1_700_100_000)
+    assert (state.stage, state.service_type_id, state.slot_start) == ("confirm", 3, 1_700_100_000)
+    # Same customer id on another channel or tenant is another conversation
+    assert store.get(1, "telegram", "919800000001") is None
+    assert store.get(2, "whatsapp", "919800000001") is None
+
+    clock.now += 601
+    assert store.get(1, "whatsapp", "919800000001") is None
+    assert store.update(1, "whatsapp", "919800000001").stage == "service"
+    assert store.discard(1, "whatsapp", "919800000001")
+    assert len(store) == 0 and store.stats()["estimated_bytes"] == 0
+    assert store.stats()["expired"] == 1
+
+def test_memory_budget_evicts_least_recently_updated():
+    clock = Clock()
+    store = ConversationStore(ttl=600, max_bytes=10 ** 9, clock=clock)
+    for i in range(10):
+        clock.now += 1
+        store.update(1, "sms", f"cust-{i}", stage="slot")
+    store.update(1, "sms", "cust-0", service_type_id=7)
+    store.update(1, "sms", "cust-10")
+    store.max_bytes = sum(_entry_bytes(key, state) for key, state in list(store._states.items())[-5:])
+    store.expire()
+    assert sorted(key[2] for key in store._states) == ["cust-0", "cust-10", "cust-7", "cust-8", "cust-9"]
+    assert store.stats()["evicted"] == 6
+    assert store.stats()["estimated_bytes"] == sum(_entry_bytes(k, s) for k, s in store._states.items())
+
+def test_snapshot_round_trip_skips_expired():
+    clock = Clock()
+    path = os.path.join(tempfile.mkdtemp(), "conversations.snapshot")
+    store = ConversationStore(ttl=600, snapshot_path=path, clock=clock)
+    store.update(1, "whatsapp", "old", stage="slot")
+    clock.now += 400
+    store.update(2, "telegram", "new", stage="confirm", service_type_id=5, slot_start=1_700_050_000,
+                 customer_name="Asha")
+    assert store.snapshot() == 2
+
+    clock.now += 300  # "old" expired while the process was down
+    restored = ConversationStore(ttl=600, snapshot_path=path, clock=clock)
+    assert restored.load_snapshot() == 1
+    assert restored.get(2, "telegram", "new").as_dict() == store.get(2, "telegram", "new").as_dict()
+    assert restored.get(1, "whatsapp", "old") is None
+
+    with open(path, "wb") as f:
+        f.write(b"not a snapshot")
+    assert ConversationStore(snapshot_path=path).load_snapshot() == 0
+
+def test_failed_snapshot_keeps_writes_pending():
+    path = os.path.join(tempfile.mkdtemp(), "missing-dir", "conversations.snapshot")
+    store = ConversationStore(snapshot_path=path)
+    store.update(1, "whatsapp", "9876500001", stage="slot")
+    with pytest.raises(OSError):
+        store.snapshot()
+    # The background loop retries on its next tick instead of thinking the state is saved
+    assert store.stats()["unsaved_writes"] == 1
+    os.makedirs(os.path.dirname(path))
+    assert store.snapshot() == 1 and store.stats()["unsaved_writes"] == 0
+
+def test_conversation_stats_endpoint():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    stats = client.get("/api/admin/conversations", headers=headers).json()
+    assert {"conversations", "estimated_bytes", "max_bytes", "expired", "evicted"} <= set(stats)
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, select
+
+import crud
+from crud import create_appointment, create_message
+from customers import (backfill_customers, customer_cache, find_customer_id, normalize_email, normalize_phone,
+                       resolve_customer)
+from database import SessionLocal, engine
+from main import app
+from models import Appointment, Customer, CustomerHandle, Message, ServiceType
+from schemas import AppointmentCreate, MessageCreate
+
+client = TestClient(app)
+
+def test_normalization():
+    assert normalize_phone("98765 43210") == normalize_phone("+91-98765-43210") == "+919876543210"
+    assert normalize_phone("09876543210") == normalize_phone("0091 9876543210") == "+919876543210"
+    assert normalize_phone("919876543210") == "+919876543210"
+    assert normalize_phone("4821") is None and normalize_phone(None) is None
+    assert normalize_email("  Sneha.Desai@Example.COM ") == "sneha.desai@example.com"
+    assert normalize_email("not an email") is None
+
+def test_whatsapp_sender_resolves_to_the_customer_who_booked():
+    customer_cache.clear()
+    db = SessionLocal()
+    try:
+        service_id = db.execute(select(ServiceType.id).where(ServiceType.organization_id == 2)).scalars().first()
+        appointment = create_appointment(db, AppointmentCreate(
+            organization_id=2, service_type_id=service_id, customer_name="Kavya Iyer",
+            customer_phone="98400 12345", customer_email="Kavya.Iyer@example.com",
+            appointment_date=datetime.utcnow() + timedelta(days=2), channel="whatsapp"))
+        assert appointment.customer_id is not None
+
+        # The WhatsApp sender id is the international number without the plus
+        create_message(db, MessageCreate(organization_id=2, customer_id="919840012345", channel="whatsapp",
+                                         content="Mera appointment confirm hai?"))
+        create_message(db, MessageCreate(organization_id=2, customer_id="kavya_tg", channel="telegram",
+                                         content="Namaste"))
+        assert find_customer_id(db, 2, "whatsapp", "+91 98400 12345") == appointment.customer_id
+        assert find_customer_id(db, 2, email="kavya.iyer@EXAMPLE.com") == appointment.customer_id
+        # The same number is a different customer in another tenant
+        assert find_customer_id(db, 3, "whatsapp", "919840012345") is None
+
+        telegram_id = find_customer_id(db, 2, "telegram", "kavya_tg")
+        assert telegram_id not in (None, appointment.customer_id)
+        # Telling us the phone later does not merge two existing customers
+        assert resolve_customer(db, 2, "telegram", "kavya_tg", phone="9840012345") == telegram_id
+        assert db.get(Customer, telegram_id).phone is None
+
+        customer_cache.clear()
+        assert resolve_customer(db, 2, "whatsapp", "919840012345") == appointment.customer_id
+        handles = db.execute(select(CustomerHandle.channel).where(
+            CustomerHandle.customer_id == appointment.customer_id)).scalars().all()
+        assert handles == ["whatsapp"]
+        assert customer_cache.stats()["size"] >= 2
+    finally:
+        db.close()
+
+def test_booking_resolves_the_customer_in_its_own_transaction(monkeypatch):
+    customer_cache.clear()
+    db = SessionLocal()
+    try:
+        service_id = db.execute(select(ServiceType.id).where(ServiceType.organization_id == 3)).scalars().first()
+        booking = lambda: AppointmentCreate(
+            organization_id=3, service_type_id=service_id, customer_name="Farhan Sheikh",
+            customer_phone="98200 44556", appointment_date=datetime.utcnow() + timedelta(days=3))
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("write failed")
+
+        # A booking that fails after the customer was resolved leaves no customer behind
+        with monkeypatch.context() as patch:
+            patch.setattr(crud, "bump", fail)
+            try:
+                create_appointment(db, booking())
+            except RuntimeError:
+                db.rollback()
+        assert find_customer_id(db, 3, phone="9820044556") is None
+
+        first = create_appointment(db, booking())
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            second = create_appointment(db, booking())
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        # The named customer comes from the cache: no customer queries, just the booking itself
+        assert second.customer_id == first.customer_id
+        assert [statement.split()[2] for statement in statements] == ["change_versions", "appointments"]
+    finally:
+        db.close()
+
+def test_message_and_new_sender_commit_together():
+    customer_cache.clear()
+    db = SessionLocal()
+    commits = []
+    record = lambda session: commits.append(session)
+    event.listen(db, "after_commit", record)
+    try:
+        message = create_message(db, MessageCreate(organization_id=3, customer_id="rohit_tg", channel="telegram",
+                                                   content="Kal ka slot free hai?", external_id="tg.sender-1"))
+        assert len(commits) == 1
+        assert find_customer_id(db, 3, "telegram", "rohit_tg") is not None
+        assert db.get(Message, message.id) is not None
+    finally:
+        event.remove(db, "after_commit", record)
+        db.close()
+
+def test_backfill_links_existing_rows():
+    db = SessionLocal()
+    try:
+        service_id = db.execute(select(ServiceType.id).where(ServiceType.organization_id == 4)).scalars().first()
+        when = datetime.utcnow() + timedelta(days=3)
+        db.execute(insert(Appointment), [
+            {"organization_id": 4, "service_type_id": service_id, "customer_name": "Arjun Rao",
+             "customer_phone": phone, "appointment_date": when, "status": "scheduled"}
+            for phone in ("+91 90000 11111", "9000011111", "90000-22222")])
+        db.execute(insert(Message), [
+            {"organization_id": 4, "customer_id": "919000011111", "channel": "whatsapp", "content": "Hi"},
+            {"organization_id": 4, "customer_id": "arjun", "channel": "telegram", "content": "Hi"}])
+        db.commit()
+
+        backfill_customers(db, [4])
+        linked = db.execute(select(Appointment.customer_phone, Appointment.customer_id)
+                            .where(Appointment.organization_id == 4, Appointment.customer_name == "Arjun Rao")).all()
+        by_phone = {phone: customer_id for phone, customer_id in linked}
+        assert by_phone["+91 90000 11111"] == by_phone["9000011111"] != by_phone["90000-22222"]
+        assert find_customer_id(db, 4, "whatsapp", "919000011111") == by_phone["9000011111"]
+        assert find_customer_id(db, 4, "telegram", "arjun") is not None
+        # Rerunning finds nothing new to create
+        count = len(db.execute(select(Customer.id).where(Customer.organization_id == 4)).all())
+        backfill_customers(db, [4])
+        assert len(db.execute(select(Customer.id).where(Customer.organization_id == 4)).all()) == count
+    finally:
+        db.close()
+
+def test_customer_lookup_endpoint():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    client.post("/api/organizations/1/messages", headers=headers, json={
+        "organization_id": 1, "customer_id": "917700112233", "channel": "whatsapp", "content": "Hello"})
+    service_id = client.get("/api/organizations/1/service-types", headers=headers).json()[0]["id"]
+    booked = client.post("/api/organizations/1/appointments", headers=headers, json={
+        "customer_name": "Meera Nair", "customer_phone": "+91 77001 12233", "service_type_id": service_id,
+        "appointment_date": (datetime.utcnow() + timedelta(days=1)).isoformat()}).json()
+
+    response = client.get("/api/organizations/1/customers/lookup?channel=whatsapp&handle=917700112233",
+                          headers=headers)
+    assert response.status_code == 200
+    customer = response.json()
+    assert customer["phone"] == "+917700112233" and customer["name"] == "Meera Nair"
+    assert customer["handles"] == [{"channel": "whatsapp", "handle": "+917700112233"}]
+    assert [appointment["id"] for appointment in customer["appointments"]] == [booked["id"]]
+    assert booked["customer_id"] == customer["id"]
+
+    assert client.get("/api/organizations/1/customers/lookup?phone=7700000000",
+                      headers=headers).status_code == 404
+    assert client.get("/api/organizations/1/customers/lookup?channel=whatsapp", headers=headers).status_code == 400
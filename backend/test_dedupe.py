@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import archive
+from crud import create_message
+from database import SessionLocal
+from dedupe import RecentIdFilter, recent_message_ids
+from models import ArchivedMessageKey, Message
+from schemas import MessageCreate
+
+def test_recent_id_filter_evicts_least_recently_seen():
+    seen = RecentIdFilter(capacity=2)
+    seen.add("a", 1)
+    seen.add("b", 2)
+    assert seen.get("a") == 1
+    seen.add("c", 3)
+    assert seen.get("b") is None and seen.get("a") == 1 and len(seen) == 2
+    assert seen.stats()["memory_hits"] == 2
+
+def test_retried_deliveries_are_stored_once():
+    recent_message_ids.clear()
+    message = MessageCreate(organization_id=3, customer_id="dedupe-cust", channel="whatsapp",
+                            content="Namaste, kal slot milega?", external_id="wamid.dedupe-1")
+    db = SessionLocal()
+    try:
+        first = create_message(db, message)
+        # Retry answered from the recent-id filter
+        assert create_message(db, message).id == first.id
+        # Retry after the key was evicted (or went to another worker) hits the unique index
+        recent_message_ids.clear()
+        assert create_message(db, message).id == first.id
+        # The same provider id on another channel is a different message
+        other = create_message(db, message.model_copy(update={"channel": "telegram"}))
+        assert other.id != first.id
+
+        stored = db.query(Message).filter(Message.external_id == "wamid.dedupe-1").count()
+        assert stored == 2
+        stats = recent_message_ids.stats()
+        assert stats["database_hits"] == 1 and stats["memory_hits"] == 0
+    finally:
+        db.close()
+
+def test_retry_after_original_left_the_hot_table():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    payload = {"organization_id": 3, "customer_id": "dedupe-gone", "channel": "whatsapp",
+               "content": "Slot confirm karo", "external_id": "wamid.dedupe-gone"}
+    first = client.post("/api/organizations/3/messages", headers=headers, json=payload)
+    assert first.status_code == 200
+    db = SessionLocal()
+    try:
+        # Deleted while its id is still in the recent-id filter
+        db.query(Message).filter(Message.id == first.json()["id"]).delete()
+        db.commit()
+        retry = client.post("/api/organizations/3/messages", headers=headers, json=payload)
+        assert retry.status_code == 200 and retry.json()["content"] == "Slot confirm karo"
+        assert db.query(Message).filter(Message.external_id == "wamid.dedupe-gone").count() == 1
+    finally:
+        db.close()
+
+def test_retry_of_an_archived_original_is_not_stored_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    recent_message_ids.clear()
+    message = MessageCreate(organization_id=3, customer_id="dedupe-archived", channel="telegram",
+                            content="Purana message", external_id="tg.dedupe-archived")
+    db = SessionLocal()
+    try:
+        first = create_message(db, message)
+        first.created_at = datetime(2020, 1, 15)
+        db.commit()
+        assert archive.archive_organization_month(db, 3, "2020-01") == 1
+        assert db.get(ArchivedMessageKey, (3, "telegram", "tg.dedupe-archived")).message_id == first.id
+
+        # From the recent-id filter, then from the archived key
+        for _ in range(2):
+            retry = create_message(db, message)
+            assert retry.id == first.id and retry.content == "Purana message"
+            recent_message_ids.clear()
+        assert db.query(Message).filter(Message.external_id == "tg.dedupe-archived").count() == 0
+    finally:
+        db.close()
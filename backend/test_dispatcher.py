@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from customers import resolve_customer
+from database import SessionLocal
+from dispatcher import OutboundDispatcher, HttpChannelProvider, ReminderChannelSender
+from fake_providers import FakeChannelProvider
+from main import app
+from models import Message, OutboundDeadLetter
+from reminders import Reminder
+
+def count_outgoing(content_prefix):
+    db = SessionLocal()
+    try:
+        return db.query(Message).filter(
+            Message.is_from_customer == False, Message.content.like(f"{content_prefix}%")
+        ).count()
+    finally:
+        db.close()
+
+def test_dispatch_respects_provider_limits_and_records_messages():
+    with FakeChannelProvider(rate_per_second=200, failure_rate=0.1) as fake:
+        dispatcher = OutboundDispatcher(HttpChannelProvider(fake.url), default_rate=200,
+                                        max_batch=20, max_attempts=20, base_backoff=0.01)
+        for i in range(150):
+            dispatcher.enqueue(1 + i % 2, "whatsapp", f"98765{i:05d}", f"dispatch-test {i}")
+        # Coalesced: identical to a message that is still waiting
+        assert dispatcher.enqueue(1, "whatsapp", "9876500000", "dispatch-test 0") is False
+        assert dispatcher.drain(timeout=30)
+        dispatcher.stop()
+
+    assert len(fake.delivered) == 150
+    assert dispatcher.stats["sent"] == 150
+    assert dispatcher.stats["coalesced"] == 1
+    assert count_outgoing("dispatch-test") == 150
+
+def test_exhausted_retries_go_to_dead_letters():
+    with FakeChannelProvider(failure_rate=1.0) as fake:
+        dispatcher = OutboundDispatcher(HttpChannelProvider(fake.url), max_attempts=3, base_backoff=0.001)
+        dispatcher.enqueue(2, "telegram", "@sneha", "dead-letter-test")
+        assert dispatcher.drain(timeout=10)
+        dispatcher.stop()
+
+    assert dispatcher.stats["dead_lettered"] == 1
+    assert count_outgoing("dead-letter-test") == 0
+    db = SessionLocal()
+    try:
+        letter = db.query(OutboundDeadLetter).filter(OutboundDeadLetter.content == "dead-letter-test").one()
+        assert letter.attempts == 3
+    finally:
+        db.close()
+
+def test_outbound_channel_must_be_a_known_channel():
+    client = TestClient(app)
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    for channel in ("../admin", "whatsapp/../../v2", "sms"):
+        response = client.post("/api/organizations/2/outbound", headers=headers,
+                               json={"customer_id": "919876543210", "channel": channel, "content": "Hi"})
+        assert response.status_code == 422, channel
+
+def test_dispatcher_rejects_unknown_channels():
+    dispatcher = OutboundDispatcher(provider=None)
+    for channel in ("../admin", "sms", "walk-in"):
+        with pytest.raises(ValueError):
+            dispatcher.enqueue(2, channel, "919876543210", "Hi")
+    assert dispatcher.pending() == 0
+
+class ShortProvider:
+    """Answers the first batch with one result too few."""
+
+    def __init__(self):
+        self.batches = []
+
+    def send_batch(self, organization_id, channel, credentials, messages):
+        self.batches.append([m.content for m in messages])
+        return [None] * (len(messages) - (len(self.batches) == 1))
+
+def test_messages_without_a_provider_result_are_retried():
+    provider = ShortProvider()
+    dispatcher = OutboundDispatcher(provider, base_backoff=0.001)
+    for i in range(3):
+        dispatcher.enqueue(2, "whatsapp", "919876543210", f"short-result-test {i}")
+    assert dispatcher.drain(timeout=10)
+    dispatcher.stop()
+    assert provider.batches[1:] == [["short-result-test 2"]]
+    assert dispatcher.stats["sent"] == 3 and dispatcher.stats["retried"] == 1
+    assert count_outgoing("short-result-test") == 3
+
+def test_reminders_go_to_the_channel_handle():
+    db = SessionLocal()
+    try:
+        resolve_customer(db, 2, channel="telegram", handle="5512340099", phone="98111 22334")
+    finally:
+        db.close()
+    dispatcher = OutboundDispatcher(provider=None)
+    when = datetime.utcnow() + timedelta(hours=1)
+    reminder = lambda id, channel, phone: Reminder(id, 2, 0, when, "Ananya Rao", phone, channel)
+    ReminderChannelSender(dispatcher).send_batch([
+        reminder(1, "telegram", "+91 98111 22334"),
+        reminder(2, "whatsapp", "+91 98111 22334"),
+        reminder(3, "telegram", "98000 00000"),  # no Telegram handle known
+        reminder(4, "walk-in", "98111 22334"),
+    ])
+    queued = {channel: [m.customer_id for m in queue] for (_, channel), queue in dispatcher._queues.items()}
+    assert queued == {"telegram": ["5512340099"], "whatsapp": ["+91 98111 22334"]}
+    dispatcher.stop()
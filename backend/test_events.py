@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from crud import create_message
+from database import SessionLocal
+from events import EventHub, event_hub
+from main import app
+from schemas import MessageCreate
+
+def read_events(chunk: bytes):
+    events = []
+    for block in chunk.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_hub_fans_out_and_evicts_slow_consumers():
+    async def scenario():
+        hub = EventHub(max_buffer=3)
+        fast, slow, other_org = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+        stream = hub.stream(fast, heartbeat=0.05)
+        assert await stream.__anext__() == b"retry: 3000\n: connected\n\n"
+        assert await stream.__anext__() == b": heartbeat\n\n"
+
+        for i in range(4):
+            hub.publish(1, "message", {"op": "created", "items": [{"id": i}]})
+            if i < 2:
+                # The fast consumer keeps up; the slow one never reads
+                assert [data["items"][0]["id"] for _, data in read_events(await stream.__anext__())] == [i]
+        assert slow.closed and slow.evicted and not other_org.buffer
+        slow_events = [event async for event in hub.stream(slow)]
+        assert read_events(slow_events[-1]) == [("evicted", {})]
+        assert hub.stats()["evicted"] == 1 and hub.stats()["subscribers"] == 2
+        await stream.aclose()
+        assert hub.stats()["subscribers"] == 1
+    asyncio.run(scenario())
+
+def test_crud_writes_publish_compact_deltas():
+    async def scenario():
+        subscription = event_hub.subscribe(4)
+        try:
+            db = SessionLocal()
+            try:
+                message = create_message(db, MessageCreate(
+                    organization_id=4, customer_id="live-cust", channel="telegram", content="Slot available?"))
+            finally:
+                db.close()
+            [(event, data)] = read_events(b"".join(subscription.buffer))
+            assert event == "message" and data["items"][0]["id"] == message.id
+            assert "content" not in data["items"][0]
+            assert data["counters"] == {"total_messages": 1, "channel_breakdown": {"telegram": 1}}
+        finally:
+            event_hub.unsubscribe(subscription)
+    asyncio.run(scenario())
+
+def test_event_stream_requires_a_valid_token():
+    client = TestClient(app)
+    assert client.get("/api/organizations/1/events").status_code == 401
+    assert client.get("/api/organizations/1/events", params={"token": "not-a-jwt"}).status_code == 401
@@ -0,0 +1,93 @@
+from fastapi.testclient import TestClient
+
+from crud import create_configuration, create_message, get_organization_config, update_configuration
+from database import SessionLocal
+from intents import DEFAULT_KEYWORDS, IntentRouter, KeywordMatcher, intent_router, normalize
+from main import app
+from schemas import ConfigurationCreate, ConfigurationUpdate, MessageCreate
+
+client = TestClient(app)
+
+def test_routes_routine_messages_and_leaves_the_rest_to_the_model():
+    matcher = KeywordMatcher(DEFAULT_KEYWORDS)
+    expected = {
+        "Namaste, mujhe appointment book karni hai.": "booking",
+        "Kya aap mujhe kal ka slot de sakte hain?": "booking",
+        "Main thoda LATE ho jaunga!!": "reschedule",
+        "I want to cancel my booking": "cancel",
+        "Can't come tomorrow": "cancel",
+        "Aapki fees kitni hai?": "faq",
+        "Kya aap mujhe prescription bhej sakte hain?": "faq",
+        # Unknown, handed off or negated: the model answers
+        "Dhanyavaad! Appointment confirm ho gayi.": None,
+        "Doctor se baat karni hai, urgent": None,
+        "Cancel nahi karna, bas time change karo": None,
+        "Our facebook page": None,
+    }
+    assert {text: matcher.classify(text).intent for text in expected} == expected
+    assert normalize("  Please   BOOK_kar-do!! ") == normalize("please book kar do") == "please book kar do"
+    assert normalize("Café का SLOT?") == "café का slot"
+
+def test_aho_corasick_matches_overlapping_keywords_at_word_starts():
+    matcher = KeywordMatcher({"a": ["he", "she", "hers"], "b": ["his"]})
+    found = sorted(matcher.patterns[i][1] for i in matcher.scan(normalize("ushers he his")))
+    # "she"/"hers" are inside "ushers", not at a word start
+    assert found == ["he", "his"]
+    assert sorted(matcher.patterns[i][1] for i in matcher.scan("she hers")) == ["he", "hers", "she"]
+
+def test_tenant_keywords_from_ai_config():
+    db = SessionLocal()
+    try:
+        before = intent_router.classify(1, "Parking milegi?").intent
+        config = get_organization_config(db, 1) or create_configuration(db, ConfigurationCreate(organization_id=1))
+        ai_config = dict(config.ai_config or {})
+        ai_config["intents"] = {"keywords": {"faq": ["parking milegi"], "billing": ["gst invoice"]}}
+        update_configuration(db, 1, ConfigurationUpdate(ai_config=ai_config))
+        assert intent_router.classify(1, "GST invoice bhej do").intent == "billing"
+        assert intent_router.classify(1, "Kal ka slot hai?").intent == "booking"
+        assert intent_router.classify(2, "GST invoice bhej do").intent is None
+
+        ai_config["intents"] = {"enabled": False}
+        update_configuration(db, 1, ConfigurationUpdate(ai_config=ai_config))
+        assert intent_router.classify(1, "Kal ka slot hai?").intent is None
+        ai_config.pop("intents")
+        update_configuration(db, 1, ConfigurationUpdate(ai_config=ai_config))
+        assert intent_router.classify(1, "Parking milegi?").intent == before
+    finally:
+        db.close()
+
+def test_intent_counts_do_not_collide_with_totals():
+    router = IntentRouter()
+    router._matchers[1] = (KeywordMatcher({"classified": ["invoice"], "routed": ["receipt"]}), float("inf"))
+    router.classify_batch(1, ["invoice please", "receipt bhejo", "hello"])
+    stats = router.stats()
+    assert (stats["classified"], stats["routed"]) == (3, 2)
+    assert stats["by_intent"] == {"classified": 1, "routed": 1}
+
+def test_classify_endpoints():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    response = client.post("/api/organizations/2/intents/classify", headers=headers,
+                           json={"messages": ["appointment cancel karna hai", "Aap kaise ho?"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["intent"] for result in body["results"]] == ["cancel", None]
+    assert (body["routed"], body["total"]) == (1, 2)
+
+    db = SessionLocal()
+    try:
+        first = create_message(db, MessageCreate(organization_id=2, customer_id="intent-cust", channel="telegram",
+                                                 content="Kal subah ka slot milega?"))
+        create_message(db, MessageCreate(organization_id=2, customer_id="intent-cust", channel="telegram",
+                                         content="Ji, aapka slot confirm hai", is_from_customer=False))
+    finally:
+        db.close()
+    queued = client.get(f"/api/organizations/2/intents/pending?after_id={first.id - 1}", headers=headers).json()
+    assert [(result["message_id"], result["intent"]) for result in queued["results"]] == [(first.id, "booking")]
+    assert queued["last_id"] == first.id
+    stats = client.get("/api/admin/intents", headers=headers).json()
+    assert stats["classified"] >= 3 and 0 < stats["routed_rate"] <= 1
+    assert stats["by_intent"]["booking"] >= 1 and "booking" not in stats
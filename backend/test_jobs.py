@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+from jobs import (FAILED, JobError, JobWorker, claim_jobs, complete_jobs, enqueue, extend_leases,
+                  queue_metrics, requeue_expired)
+from main import app
+from models import Job
+
+client = TestClient(app)
+
+def test_claims_by_priority_and_due_time():
+    db = SessionLocal()
+    try:
+        later = enqueue(db, "test.order", {"n": 1}, run_at=datetime.utcnow() + timedelta(hours=1), priority=0)
+        low = enqueue(db, "test.order", {"n": 2}, priority=200)
+        normal = enqueue(db, "test.order", {"n": 3})
+        high = enqueue(db, "test.order", {"n": 4}, priority=0)
+        claimed = claim_jobs(db, "w1", ["test.order"], limit=10, tenant_concurrency=0)
+        assert [job.id for job in claimed] == [high, normal, low]
+        assert claimed[0].payload == {"n": 4} and claimed[0].attempts == 1
+        assert claim_jobs(db, "w2", ["test.order"], limit=10) == []
+
+        complete_jobs(db, "w1", [job.id for job in claimed])
+        db.commit()
+        assert {db.get(Job, job.id).status for job in claimed} == {"done"}
+        assert db.get(Job, later).status == "queued"
+        assert queue_metrics(db)["scheduled"] >= 1
+    finally:
+        db.close()
+
+def test_tenant_concurrency_cap():
+    db = SessionLocal()
+    try:
+        first, second = enqueue(db, "test.capped", organization_id=2), enqueue(db, "test.capped", organization_id=2)
+        other = enqueue(db, "test.capped", organization_id=3)
+        platform = enqueue(db, "test.capped")
+        claimed = claim_jobs(db, "w1", ["test.capped"], limit=10, tenant_concurrency=1)
+        assert [job.id for job in claimed] == [first, other, platform]
+        # Organization 2 is at its cap until its running job finishes
+        assert claim_jobs(db, "w2", ["test.capped"], limit=10, tenant_concurrency=1) == []
+        complete_jobs(db, "w1", [first])
+        db.commit()
+        assert [job.id for job in claim_jobs(db, "w2", ["test.capped"], tenant_concurrency=1)] == [second]
+        complete_jobs(db, "w1", [other, platform])
+        complete_jobs(db, "w2", [second])
+        db.commit()
+    finally:
+        db.close()
+
+def test_expired_lease_is_reclaimed_and_late_ack_ignored():
+    db = SessionLocal()
+    try:
+        job_id = enqueue(db, "test.lease", max_attempts=2)
+        assert [job.id for job in claim_jobs(db, "dead-worker", ["test.lease"], visibility_timeout=-1)] == [job_id]
+        assert extend_leases(db, "other-worker", [job_id]) == 0
+        # Done by every worker's maintenance loop
+        assert requeue_expired(db) == 1
+        reclaimed = claim_jobs(db, "w2", ["test.lease"])
+        assert [(job.id, job.attempts) for job in reclaimed] == [(job_id, 2)]
+        complete_jobs(db, "dead-worker", [job_id])
+        db.commit()
+        db.expire_all()
+        assert db.get(Job, job_id).status == "running"
+
+        # Out of attempts once this lease expires too
+        db.execute(Job.__table__.update().where(Job.id == job_id).values(locked_until=datetime.utcnow()))
+        db.commit()
+        requeue_expired(db)
+        db.expire_all()
+        assert db.get(Job, job_id).status == FAILED
+    finally:
+        db.close()
+
+def test_retries_with_backoff_then_fails():
+    calls = []
+
+    def flaky(db, job):
+        calls.append(job.attempts)
+        raise RuntimeError("provider down")
+
+    def broken(db, job):
+        raise JobError("bad payload", retryable=False)
+
+    worker = JobWorker(handlers={"test.flaky": flaky, "test.broken": broken}, threads=1)
+    db = SessionLocal()
+    try:
+        flaky_id = enqueue(db, "test.flaky", max_attempts=2)
+        broken_id = enqueue(db, "test.broken")
+        assert worker.run_once() == 1 and worker.run_once() == 1
+        db.expire_all()
+        retry = db.get(Job, flaky_id)
+        assert retry.status == "queued" and retry.run_at > datetime.utcnow()
+        assert "provider down" in retry.last_error
+        assert db.get(Job, broken_id).status == FAILED
+
+        retry.run_at = datetime.utcnow()
+        db.commit()
+        assert worker.run_once() == 1
+        db.expire_all()
+        assert db.get(Job, flaky_id).status == FAILED and calls == [1, 2]
+        assert worker.stats()["retried"] == 1 and worker.stats()["failed"] == 2
+    finally:
+        db.close()
+
+def test_unique_key_deduplicates():
+    db = SessionLocal()
+    try:
+        first = enqueue(db, "test.unique", unique_key="platform-2026-10-18")
+        assert enqueue(db, "test.unique", unique_key="platform-2026-10-18") == first
+        assert enqueue(db, "test.unique", unique_key="platform-2026-10-19") != first
+    finally:
+        db.close()
+
+def test_worker_threads_drain_the_queue():
+    ran = []
+    worker = JobWorker(handlers={"test.pool": lambda db, job: ran.append(job.payload["n"])},
+                       threads=3, poll_interval=0.01, tenant_concurrency=1)
+    db = SessionLocal()
+    try:
+        ids = [enqueue(db, "test.pool", {"n": n}, organization_id=2 + n % 3) for n in range(20)]
+        worker.start()
+        deadline = time.monotonic() + 10
+        while len(ran) < 20 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        worker.stop()
+        db.expire_all()
+        assert sorted(ran) == list(range(20))
+        assert {db.get(Job, job_id).status for job_id in ids} == {"done"}
+        stats = worker.stats()
+        assert stats["succeeded"] == 20 and stats["run_seconds"]["count"] == 20
+    finally:
+        db.close()
+
+def test_job_endpoints():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    assert client.post("/api/admin/jobs", headers=headers, json={"kind": "no.such.kind"}).status_code == 400
+    response = client.post("/api/admin/jobs", headers=headers, json={
+        "kind": "uploads.gc", "run_at": "2099-01-01T00:00:00+05:30", "unique_key": "test-endpoint"})
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == "queued" and job["run_at"] == "2098-12-31T18:30:00"
+    assert client.get(f"/api/admin/jobs/{job['id']}", headers=headers).json()["id"] == job["id"]
+    assert client.get("/api/admin/jobs/999999", headers=headers).status_code == 404
+    stats = client.get("/api/admin/jobs", headers=headers).json()
+    assert stats["queue"]["scheduled"] >= 1 and "wait_seconds" in stats["worker"]
@@ -0,0 +1,111 @@
+import asyncio
+
+import ratelimit
+from auth import create_access_token
+from ratelimit import AdmissionController, RoutePolicy, TenantAdmissionMiddleware, TokenBucket
+
+TOKEN = create_access_token({"sub": "1"})
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 0.1
+    assert bucket.acquire_up_to(5) == 0
+
+async def call(app, path, client="127.0.0.1", token=TOKEN):
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b""}
+    async def send(message):
+        sent.append(message)
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    await app({"type": "http", "path": path, "method": "GET", "headers": headers, "client": (client, 50000)},
+              receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+def test_concurrency_cap_queues_then_sheds():
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    controller = AdmissionController(policies={
+        "default": RoutePolicy(rate=1000, burst=1000, max_concurrency=2, max_queue=2, queue_timeout=0.5),
+        "expensive": RoutePolicy(rate=1000, burst=1000, max_concurrency=1, max_queue=0, queue_timeout=0.01),
+    })
+    app = TenantAdmissionMiddleware(slow_app, controller)
+
+    async def scenario():
+        noisy = [call(app, "/api/organizations/1/messages") for _ in range(6)]
+        quiet = [call(app, "/api/organizations/2/messages")]
+        return await asyncio.gather(*noisy, *quiet)
+
+    results = asyncio.run(scenario())
+    statuses = [status for status, _ in results]
+    # Tenant 1: two run, two wait in the queue, two are shed; tenant 2 is unaffected
+    assert statuses[:6].count(200) == 4
+    assert statuses[:6].count(503) == 2
+    assert statuses[6] == 200
+    assert all(b"retry-after" in headers for status, headers in results if status == 503)
+    assert controller.snapshot()["1"]["shed"] == 2
+
+def test_login_flood_from_one_client_spares_others():
+    async def slow_login(scope, receive, send):
+        await asyncio.sleep(0.05)  # bcrypt
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    controller = AdmissionController(policies={
+        **AdmissionController().policies,
+        "auth": RoutePolicy(rate=5, burst=5, max_concurrency=2, max_queue=1, queue_timeout=0.01),
+    })
+    app = TenantAdmissionMiddleware(slow_login, controller)
+
+    async def scenario():
+        flood = [call(app, "/api/auth/login", client="203.0.113.7") for _ in range(20)]
+        tenant_b = [call(app, "/api/auth/login", client="198.51.100.2"),
+                    call(app, "/api/admin/jobs", client="198.51.100.2")]
+        return await asyncio.gather(*flood, *tenant_b)
+
+    results = asyncio.run(scenario())
+    statuses = [status for status, _ in results]
+    assert statuses[:20].count(200) <= 5 and set(statuses[:20]) >= {429}
+    # Tenant B's admin logs in and reaches the admin routes while A is flooding
+    assert statuses[20:] == [200, 200]
+    assert controller.snapshot()["clients"]["rate_limited"] >= 15
+
+def test_tenants_are_charged_only_for_verified_tokens():
+    controller = AdmissionController()
+    assert controller.classify("/api/organizations/1/messages", "203.0.113.7", TOKEN) == ("1", "default")
+    for token in (None, "forged.token.value", TOKEN[:-2]):
+        assert controller.classify("/api/organizations/1/analytics", "203.0.113.7", token) == \
+            ("client:203.0.113.7", "expensive")
+
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    app = TenantAdmissionMiddleware(ok, controller)
+
+    async def scenario():
+        # Anonymous requests to tenant 1's expensive route use up only their own client's budget
+        flood = [await call(app, "/api/organizations/1/analytics", client="203.0.113.7", token=None)
+                 for _ in range(10)]
+        return flood, await call(app, "/api/organizations/1/analytics")
+
+    flood, tenant = asyncio.run(scenario())
+    assert 429 in [status for status, _ in flood]
+    assert tenant[0] == 200
+    assert controller.snapshot()["1"]["admitted"] == 1
+
+def test_states_and_counters_stay_bounded(monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_STATES", 10)
+    controller = AdmissionController()
+    policy = controller.policies["default"]
+    for i in range(50):
+        controller.state((str(i), "default"), policy)
+        controller.tenant_counters(str(i))["admitted"] += 1
+    assert len(controller._states) <= 10
+    assert len(controller.counters) <= 11 and controller.counters["other"]["admitted"] == 40
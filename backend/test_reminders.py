@@ -0,0 +1,137 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database import SessionLocal
+from reminders import ReminderScheduler, LocalStubSender
+
+def appointment(id, minutes_ahead, status="scheduled", org_id=1, created_at=None):
+    return SimpleNamespace(
+        id=id, organization_id=org_id, status=status, customer_name="Sneha Desai",
+        customer_phone="9123456780", channel="whatsapp", created_at=created_at,
+        appointment_date=datetime.utcnow() + timedelta(minutes=minutes_ahead)
+    )
+
+def test_reschedule_cancel_and_batches():
+    sender = LocalStubSender()
+    scheduler = ReminderScheduler(sender=sender, batch_size=2)
+    scheduler.watermark = time.time()
+    scheduler.set_org_settings(1, {"reminderNotifications": True, "reminderTime": 30})
+    for i in range(5):
+        scheduler.track_appointment(appointment(i, 120))
+    scheduler.track_appointment(appointment(1, 600))               # rescheduled later
+    scheduler.track_appointment(appointment(2, 120, "cancelled"))  # cancelled
+    assert len(scheduler) == 4
+
+    sent = scheduler.dispatch_due(time.time() + 91 * 60, persist=False)
+    assert sent == 3
+    assert sorted(r.appointment_id for r in sender.sent) == [0, 3, 4]
+    assert scheduler.dispatch_due(time.time() + 91 * 60, persist=False) == 0
+    assert len(scheduler) == 1
+
+def test_disabled_reminders_are_not_scheduled():
+    scheduler = ReminderScheduler(sender=LocalStubSender())
+    scheduler.set_org_settings(7, {"reminderNotifications": False})
+    scheduler.track_appointment(appointment(1, 120, org_id=7))
+    assert len(scheduler) == 0
+
+def test_bookings_inside_the_lead_time_are_reminded_once():
+    sender = LocalStubSender()
+    scheduler = ReminderScheduler(sender=sender)
+    scheduler.watermark = time.time()
+    scheduler.set_org_settings(1, {"reminderTime": 60})
+    booked = appointment(1, 20, created_at=datetime.utcnow())
+    scheduler.track_appointment(booked)
+    scheduler.track_appointment(appointment(2, 20))  # known before its reminder time: already reminded
+    assert scheduler.dispatch_due(persist=False) == 1
+    assert [r.appointment_id for r in sender.sent] == [1]
+    # A later update of the same appointment does not resend it
+    booked.status = "confirmed"
+    scheduler.track_appointment(booked)
+    assert len(scheduler) == 0
+
+def test_reminder_time_changes_retrack_pending_reminders():
+    scheduler = ReminderScheduler(sender=LocalStubSender())
+    scheduler.watermark = time.time()
+    scheduler.set_org_settings(1, {"reminderTime": 30})
+    upcoming = appointment(1, 90)
+    scheduler.track_appointment(upcoming)
+    scheduler.set_org_settings(1, {"reminderTime": 120})
+    assert scheduler._stale_orgs == {1}
+    # Re-tracking (what retrack_organization does per row) sends the now overdue reminder right away
+    scheduler.track_appointment(upcoming)
+    assert scheduler.dispatch_due(persist=False) == 1
+
+class FlakySender(LocalStubSender):
+    """Fails the batches whose number is in `failing`, counting from 1."""
+
+    def __init__(self, failing, during=None):
+        super().__init__()
+        self.failing = failing
+        self.during = during
+        self.calls = 0
+
+    def send_batch(self, reminders):
+        self.calls += 1
+        if self.calls in self.failing:
+            if self.during:
+                self.during()
+            raise ConnectionError("provider unavailable")
+        super().send_batch(reminders)
+
+def test_failed_batches_go_back_on_the_schedule():
+    scheduler = ReminderScheduler(batch_size=2)
+    scheduler.watermark = time.time()
+    scheduler.set_org_settings(1, {"reminderTime": 30})
+    for i in range(4):
+        scheduler.track_appointment(appointment(i, 60 + i))
+    saved = []
+    scheduler.save_watermark = lambda: saved.append(scheduler.watermark)
+    # The second batch fails and its first reminder is cancelled while it is out
+    scheduler.sender = FlakySender({2}, during=lambda: scheduler.cancel(2))
+    try:
+        scheduler.dispatch_due(time.time() + 60 * 60)
+    except ConnectionError:
+        pass
+    assert [r.appointment_id for r in scheduler.sender.sent] == [0, 1]
+    # The first batch's watermark was saved before the failure
+    assert len(saved) == 1 and saved[0] == scheduler.watermark
+    assert len(scheduler) == 1
+    assert scheduler.dispatch_due(time.time() + 60 * 60) == 1
+    assert [r.appointment_id for r in scheduler.sender.sent] == [0, 1, 3]
+    assert len(saved) == 2
+
+def test_watermark_is_stored_as_utc():
+    scheduler = ReminderScheduler(sender=LocalStubSender())
+    db = SessionLocal()
+    try:
+        scheduler.load(db)
+        scheduler.watermark = time.time()
+        scheduler.save_watermark()
+        restored = ReminderScheduler(sender=LocalStubSender())
+        restored.load(db)
+    finally:
+        db.close()
+    assert abs(restored.watermark - scheduler.watermark) < 1
+
+def test_restart_recovers_from_watermark():
+    # Seeded appointments are 1-10 days ahead; reminders default to 60 minutes before
+    first = ReminderScheduler(sender=LocalStubSender())
+    db = SessionLocal()
+    try:
+        pending = first.load(db)
+    finally:
+        db.close()
+    assert pending > 0
+    cutoff = sorted(r.due for r in first._pending.values())[pending // 2]
+    first.dispatch_due(cutoff)
+
+    second = ReminderScheduler(sender=LocalStubSender())
+    db = SessionLocal()
+    try:
+        second.load(db)
+    finally:
+        db.close()
+    assert len(second) == len(first)
+    second.dispatch_due(time.time() + 30 * 24 * 3600, persist=False)
+    assert not {r.appointment_id for r in second.sender.sent} & {r.appointment_id for r in first.sender.sent}
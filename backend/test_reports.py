@@ -0,0 +1,57 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SessionLocal
+from models import Message, Organization
+from reports import _prepare_checkpoints, _run_chunk, generate_report
+
+def report_window():
+    end = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    return end - timedelta(days=2), end
+
+def test_report_matches_database_and_is_identical_in_parallel(tmp_path):
+    start, end = report_window()
+    serial = generate_report(start, end, str(tmp_path / "serial.json"), workers=1, chunk_size=2)
+    parallel = generate_report(start, end, str(tmp_path / "parallel.json"), workers=2, chunk_size=2)
+    assert serial["organizations"] == parallel["organizations"]
+    assert json.loads((tmp_path / "serial.json").read_text())["totals"] == serial["totals"]
+    assert not os.path.exists(tmp_path / "serial.json.parts")
+
+    db = SessionLocal()
+    try:
+        assert serial["totals"]["organizations"] == db.query(Organization).count()
+        for row in serial["organizations"]:
+            in_window = db.query(Message).filter(Message.organization_id == row["organization_id"],
+                                                 Message.created_at >= start, Message.created_at < end)
+            assert row["messages"]["total"] == in_window.count()
+            assert row["messages"]["inbound"] == in_window.filter(Message.is_from_customer == True).count()
+            assert row["response_time"]["count"] == in_window.filter(Message.response_time.isnot(None)).count()
+    finally:
+        db.close()
+
+def test_report_resumes_from_checkpoints(tmp_path):
+    start, end = report_window()
+    output = str(tmp_path / "report.json")
+    db = SessionLocal()
+    try:
+        org_ids = [org.id for org in db.query(Organization).order_by(Organization.id)]
+    finally:
+        db.close()
+    checkpoint_dir = output + ".parts"
+    _prepare_checkpoints(checkpoint_dir, start, end, 2, org_ids, fresh=False)
+    _run_chunk(0, org_ids[:2], start, end, checkpoint_dir)
+    # Mark the finished chunk so we can tell it was reused rather than rebuilt
+    path = os.path.join(checkpoint_dir, "chunk-00000.json")
+    part = json.loads(open(path).read())
+    part["organizations"][0]["revenue"] = -1.0
+    with open(path, "w") as f:
+        json.dump(part, f)
+
+    with pytest.raises(ValueError):
+        generate_report(start, end - timedelta(days=1), output, chunk_size=2)
+    report = generate_report(start, end, output, chunk_size=2)
+    assert report["organizations"][0]["revenue"] == -1.0
+    assert len(report["organizations"]) == len(org_ids)
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from crud import create_message
+from database import SessionLocal
+from main import app
+from models import MetricSketch
+from schemas import MessageCreate
+from sketches import (DDSketch, HyperLogLog, SketchRecorder, backfill_sketches, response_time_report,
+                      sketch_recorder, unique_customer_counts, unique_customers_report)
+
+client = TestClient(app)
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+def test_ddsketch_quantiles_merge_and_round_trip():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20_000)]
+    left, right, whole = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+        whole.add(value)
+    merged = DDSketch.from_bytes(left.to_bytes()).merge(DDSketch.from_bytes(right.to_bytes()))
+
+    assert merged.count == whole.count == len(values)
+    assert (merged.offset, merged.counts) == (whole.offset, whole.counts)
+    for q in (0.5, 0.9, 0.99):
+        exact = exact_quantile(values, q)
+        assert abs(merged.quantile(q) - exact) <= 0.01 * exact
+    assert len(whole.to_bytes()) < 4096
+
+def test_hyperloglog_union_and_error_bound():
+    for n in (40, 5_000, 100_000):
+        ids = [f"+91{9000000000 + i}" for i in range(n)]
+        left, right = HyperLogLog(), HyperLogLog()
+        for i, customer_id in enumerate(ids):
+            # Overlapping halves: the union must not double count
+            (left if i % 3 else right).add(customer_id)
+            if i % 5 == 0:
+                (right if i % 3 else left).add(customer_id)
+        union = HyperLogLog.from_bytes(left.to_bytes()).merge(HyperLogLog.from_bytes(right.to_bytes()))
+        # Three standard errors of 1.04 / sqrt(4096)
+        assert abs(union.cardinality() - n) <= 0.05 * n
+        assert len(union.to_bytes()) <= 4096 + 16
+
+def test_flushes_run_off_the_request_thread():
+    flushed_on = []
+
+    def session_factory():
+        flushed_on.append(threading.current_thread().name)
+        return SessionLocal()
+
+    recorder = SketchRecorder(session_factory=session_factory, flush_interval=0.05)
+    try:
+        recorder.record("unique_customers", 4, "flush-test", "cust-1")
+        time.sleep(0.1)
+        # A write after the interval only records; the background thread does the flush
+        recorder.record("unique_customers", 4, "flush-test", "cust-2")
+        assert threading.current_thread().name not in flushed_on
+        deadline = time.monotonic() + 2
+        while recorder.pending() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert recorder.pending() == {} and set(flushed_on) == {"sketch-flush"}
+    finally:
+        recorder.stop()
+    assert not recorder.running
+
+def test_unique_customers_follow_message_writes():
+    sketch_recorder.clear()
+    db = SessionLocal()
+    try:
+        for customer_id in ["hll-a", "hll-b", "hll-a", "hll-c", "hll-b"]:
+            for channel in ("hll-whatsapp", "hll-telegram"):
+                create_message(db, MessageCreate(organization_id=3, customer_id=customer_id, channel=channel,
+                                                 content="Appointment confirm karna hai"))
+        today = datetime.utcnow().date()
+        report = unique_customers_report(db, 3, today, today + timedelta(days=1), channel="hll-whatsapp")
+        assert report["unique_customers"] == 3
+        assert report["buckets"] == [{"period": today.isoformat(), "unique_customers": 3}]
+
+        sketch_recorder.flush()
+        monthly = unique_customers_report(db, None, today, today + timedelta(days=1), granularity="month")
+        assert monthly["by_channel"]["hll-telegram"] == 3
+        assert monthly["buckets"][0]["period"] == today.replace(day=1).isoformat()
+        # Overlapping windows come from one read of the sketches
+        windows = [(today, today + timedelta(days=1)), (today - timedelta(days=30), today), (today, today)]
+        assert unique_customer_counts(db, 3, windows, channel="hll-whatsapp") == [3, 0, 0]
+    finally:
+        db.close()
+
+def test_response_time_percentiles_follow_message_writes():
+    sketch_recorder.clear()
+    db = SessionLocal()
+    try:
+        times = {"sketch-web": [1.0, 2.0, 3.0, 4.0, 100.0], "sketch-sms": [10.0, 20.0]}
+        for channel, values in times.items():
+            for value in values:
+                create_message(db, MessageCreate(organization_id=2, customer_id="sketch-cust", channel=channel,
+                                                 content="Kya main slot book kar sakta hoon?",
+                                                 response_time=value))
+        today = datetime.utcnow().date()
+        window = (today - timedelta(days=1), today + timedelta(days=1))
+
+        # Unflushed writes are already visible to this process
+        report = response_time_report(db, 2, *window, channel="sketch-web")
+        assert report["overall"]["count"] == 5 and report["overall"]["p50"] == pytest.approx(3.0, rel=0.01)
+        assert report["overall"]["p99"] == pytest.approx(4.0, rel=0.01)
+
+        sketch_recorder.flush()
+        stored = db.query(MetricSketch).filter(MetricSketch.metric == "response_time",
+                                               MetricSketch.channel.like("sketch-%")).all()
+        assert sorted((row.channel, row.count) for row in stored) == [("sketch-sms", 2), ("sketch-web", 5)]
+        report = response_time_report(db, 2, *window)
+        assert report["by_channel"]["sketch-sms"]["count"] == 2
+        assert report["daily"][-1]["date"] == today.isoformat()
+        platform = response_time_report(db, None, *window, channel="sketch-sms")
+        assert platform["overall"]["count"] == 2 and platform["overall"]["mean"] == 15.0
+
+        # A rebuild from the message tables gives the same sketches
+        backfill_sketches(db, [2], today + timedelta(days=1))
+        assert response_time_report(db, 2, *window)["by_channel"] == report["by_channel"]
+    finally:
+        db.close()
+
+def test_response_time_report_endpoint():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    response = client.get("/api/organizations/1/analytics/response-times", headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()["overall"]) == {"p50", "p90", "p99", "mean", "count"}
+    response = client.get("/api/analytics/platform/response-times?start=2026-01-01&end=2025-01-01",
+                          headers=headers)
+    assert response.status_code == 400
+    platform = client.get("/api/analytics/platform", headers=headers).json()
+    assert "response_time_percentiles" in platform and "unique_customers" in platform
+    response = client.get("/api/organizations/1/analytics/unique-customers?granularity=month", headers=headers)
+    assert response.status_code == 200 and response.json()["granularity"] == "month"
+    response = client.get("/api/analytics/platform/unique-customers?granularity=week", headers=headers)
+    assert response.status_code == 400
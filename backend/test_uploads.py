@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import uploads
+from database import SessionLocal
+from main import app
+
+client = TestClient(app)
+
+def auth_headers():
+    login_resp = client.post("/api/auth/login", json={
+        "email": "admin@saas.com",
+        "password": "password"
+    })
+    return {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+
+def test_upload_streams_into_deduplicated_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    headers = auth_headers()
+    content = os.urandom(300_000)
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    documents = []
+    for org_id in (1, 2):
+        resp = client.post(f"/api/organizations/{org_id}/documents/upload", headers=headers,
+                           files={"file": ("Price List.pdf", content, "application/pdf")},
+                           data={"name": f"Price list {org_id}"})
+        assert resp.status_code == 200
+        documents.append(resp.json())
+
+    assert [d["name"] for d in documents] == ["Price list 1", "Price list 2"]
+    assert {d["type"] for d in documents} == {"pdf"}
+    assert {d["size"] for d in documents} == {len(content)}
+    assert documents[0]["file_path"] == documents[1]["file_path"] == uploads.object_path(sha256)
+    with open(uploads.object_path(sha256), "rb") as stored:
+        assert stored.read() == content
+    assert os.listdir(tmp_path / "tmp") == []
+
+    # Still referenced by org 2's document after org 1 deletes its own
+    assert client.delete(f"/api/organizations/1/documents/{documents[0]['id']}", headers=headers).status_code == 200
+    kept = client.post("/api/organizations/3/documents/upload", headers=headers,
+                       files={"file": ("Menu.txt", b"kept", "text/plain")}).json()
+    db = SessionLocal()
+    try:
+        assert uploads.collect_garbage(db, grace_seconds=0) == 0
+        client.delete(f"/api/organizations/2/documents/{documents[1]['id']}", headers=headers)
+        assert uploads.collect_garbage(db, grace_seconds=0) == 1
+        assert os.path.exists(kept["file_path"])
+    finally:
+        client.delete(f"/api/organizations/3/documents/{kept['id']}", headers=headers)
+        db.close()
+
+def test_gc_matches_objects_by_content_address(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path / "old"))
+    headers = auth_headers()
+    doc = client.post("/api/organizations/1/documents/upload", headers=headers,
+                      files={"file": ("Hours.txt", b"open 9-5", "text/plain")}).json()
+    # The store moves (relative ./uploads to an absolute path, say) without rewriting rows
+    os.rename(tmp_path / "old", tmp_path / "new")
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path / "new"))
+    db = SessionLocal()
+    try:
+        assert uploads.collect_garbage(db, grace_seconds=0) == 0
+        assert os.path.exists(uploads.object_path(os.path.basename(doc["file_path"])))
+
+        client.delete(f"/api/organizations/1/documents/{doc['id']}", headers=headers)
+        with pytest.raises(RuntimeError):
+            # Nothing references anything: refuse rather than empty the store
+            uploads.collect_garbage(db, grace_seconds=0)
+        assert os.path.exists(uploads.object_path(os.path.basename(doc["file_path"])))
+    finally:
+        db.close()
+
+def test_upload_rejects_non_multipart_and_missing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    headers = auth_headers()
+    assert client.post("/api/organizations/1/documents/upload", headers=headers,
+                       json={"name": "x"}).status_code == 415
+    assert client.post("/api/organizations/1/documents/upload", headers=headers,
+                       files={"name": (None, "no file")}).status_code == 400
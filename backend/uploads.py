@@ -0,0 +1,213 @@
+"""Streaming document uploads into content-addressed storage.
+
+The multipart body is parsed incrementally as it arrives (python-multipart's
+low-level parser), so nothing is buffered beyond one network chunk. The file
+part is written to a temporary file with aiofiles and hashed while streaming,
+then moved to
+
+    {UPLOAD_DIR}/objects/{sha256[:2]}/{sha256}
+
+Identical files, from any tenant, are stored once. Each upload still gets its
+own Document row pointing at the shared object. Objects no Document refers to
+any more are removed by `python uploads.py --gc`, not on delete, so a
+concurrent upload of the same content can never lose its file.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from typing import Dict, Optional, Set
+
+import aiofiles
+import aiofiles.os
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Document
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 1024 ** 3))
+MAX_FIELD_BYTES = 64 * 1024
+GC_GRACE_SECONDS = 3600
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StoredUpload:
+    __slots__ = ("filename", "fields", "sha256", "size", "path", "deduplicated")
+
+    def __init__(self, filename, fields, sha256, size, path, deduplicated):
+        self.filename = filename
+        self.fields = fields
+        self.sha256 = sha256
+        self.size = size
+        self.path = path
+        self.deduplicated = deduplicated
+
+def object_path(sha256: str) -> str:
+    return os.path.join(UPLOAD_DIR, "objects", sha256[:2], sha256)
+
+class _FormState:
+    """Collects parser callbacks; file bytes are queued for the async writer."""
+
+    def __init__(self):
+        self.header_field = b""
+        self.header_value = b""
+        self.headers: Dict[bytes, bytes] = {}
+        self.field_name: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.in_file = False
+        self.seen_file = False
+        self.field_value = bytearray()
+        self.fields: Dict[str, str] = {}
+        self.pending = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+        self.field_value = bytearray()
+
+    def on_header_field(self, data, start, end):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        self.field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self.in_file = filename is not None and not self.seen_file
+        if self.in_file:
+            self.filename = os.path.basename(filename.decode("utf-8", "replace"))
+
+    def on_part_data(self, data, start, end):
+        if self.in_file:
+            self.pending.append(bytes(data[start:end]))
+        else:
+            self.field_value += data[start:end]
+            if len(self.field_value) > MAX_FIELD_BYTES:
+                raise UploadError("Form field too large", 413)
+
+    def on_part_end(self):
+        if self.in_file:
+            self.in_file = False
+            self.seen_file = True
+        elif self.field_name:
+            self.fields[self.field_name] = self.field_value.decode("utf-8", "replace")
+
+async def store_upload(content_type: str, chunks) -> StoredUpload:
+    """Stream a multipart/form-data body with one file part into the object store."""
+    mime, options = parse_options_header(content_type or "")
+    boundary = options.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected multipart/form-data with a boundary", 415)
+
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    state = _FormState()
+    parser = MultipartParser(boundary, state.callbacks())
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as tmp:
+            async for chunk in chunks:
+                parser.write(chunk)
+                if state.pending:
+                    data = b"".join(state.pending)
+                    state.pending.clear()
+                    size += len(data)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise UploadError("File too large", 413)
+                    digest.update(data)
+                    await tmp.write(data)
+            parser.finalize()
+            await tmp.flush()
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, tmp.fileno())
+        if not state.seen_file:
+            raise UploadError("No file part in the upload")
+
+        sha256 = digest.hexdigest()
+        path = object_path(sha256)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            await aiofiles.os.remove(tmp_path)
+            # Refresh mtime so garbage collection's grace period starts over
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            await aiofiles.os.replace(tmp_path, path)
+        return StoredUpload(state.filename, state.fields, sha256, size, path, deduplicated)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def document_type(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return extension or "file"
+
+def collect_garbage(db: Session, grace_seconds: float = GC_GRACE_SECONDS) -> int:
+    """Delete stored objects no Document refers to and not touched within the grace period.
+
+    Objects are matched by content address (the sha256 file name), not by the
+    stored path, so rows written under another UPLOAD_DIR or working directory
+    still protect their objects. Refuses to run if no document references any
+    object while objects exist: that points at a wrong database, not garbage.
+    """
+    objects_dir = os.path.join(UPLOAD_DIR, "objects")
+    if not os.path.isdir(objects_dir):
+        return 0
+    referenced: Set[str] = {
+        os.path.basename(path) for path in db.execute(
+            select(Document.file_path).where(Document.file_path.isnot(None))
+        ).scalars()
+    }
+    stored = [(root, name) for root, _, files in os.walk(objects_dir) for name in files]
+    if stored and not referenced:
+        raise RuntimeError(f"No document references any of the {len(stored)} objects in {objects_dir}; "
+                           "refusing to delete them all. Check DATABASE_URL, or remove them by hand.")
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for root, name in stored:
+        path = os.path.join(root, name)
+        if name not in referenced and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Upload store maintenance")
+    parser.add_argument("--gc", action="store_true", help="remove objects no document refers to")
+    args = parser.parse_args()
+    if args.gc:
+        db = SessionLocal()
+        try:
+            print(f"Removed {collect_garbage(db)} unreferenced objects")
+        except RuntimeError as exc:
+            raise SystemExit(str(exc))
+        finally:
+            db.close()